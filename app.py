@@ -3,7 +3,6 @@ import pandas as pd
 import os
 from dotenv import load_dotenv
 import io
-import pickle
 import numpy as np
 import secrets
 import hashlib
@@ -15,15 +14,26 @@ from datetime import datetime
 from dateutil.relativedelta import relativedelta
 
 # Import database connection and queries
-from config.database import db, MemberQueries, ProductQueries, ShipmentQueries, PredictionQueries
+from config.settings import SHIPMENT_SUMMARY_MONTHS
+from config.database import db, product_cache, MemberQueries, ProductQueries, ShipmentQueries, PredictionQueries, AlertQueries, MailQueries
 from utils.calculations import get_inventory_status, calculate_stockout_date
 from utils.email_alerts import EmailAlertSystem
 from utils.notification_scheduler import NotificationScheduler
-from utils.order_timing import calculate_reorder_point, calculate_demand_trend, batch_calculate_reorder_points
+from utils.order_timing import batch_calculate_reorder_points
+from utils.alert_engine import EMAIL_ALERT_TYPES, evaluate_alerts, alert_records
+from utils.alert_worker import get_alert_worker
+from utils.excel_handler import excel_sheet_names
+from utils.order_planning import DEFAULT_ORDER_COST, DEFAULT_HOLDING_COST, plan_orders, next_purchase_orders
+from utils.stock_movements import build_movements_from_upload, apply_stock_movements
+from utils.forecast_store import load_forecasts, EMPTY_FORECASTS
+from utils.bom import load_component_forecasts
 
 # Load environment variables
 load_dotenv()
 
+# Keep shared product/prediction caches consistent with writes from other sessions and processes
+db.start_change_listener()
+
 # Page configuration
 st.set_page_config(
     page_title="PLAYAUTO - AI 재고 관리 시스템",
@@ -173,6 +183,12 @@ def main():
         
         return
     
+    # One product snapshot per rerun; writes invalidate it immediately
+    with product_cache.request_scope():
+        render_page()
+
+
+def render_page():
     # Show sidebar
     sidebar_navigation()
     
@@ -419,28 +435,25 @@ def show_shipment_quantity():
     st.title("📊 출고량 통계")
     # tabs = st.tabs(["출고량 확인", "-"])
     
-    st.subheader("지난 6개월간 출고량")
-    st.info("지난 6개월간의 상품별 월간 출고량입니다.")
+    summary_months = SHIPMENT_SUMMARY_MONTHS
+    st.subheader(f"지난 {summary_months}개월간 출고량")
+    st.info(f"지난 {summary_months}개월간의 상품별 월간 출고량입니다.")
     
     try:
         # 월간 출고량 불러오기
-        shipment_data = ShipmentQueries.get_monthly_shipment_summary()
+        shipment_data = ShipmentQueries.get_monthly_shipment_summary(summary_months)
         
         if shipment_data:
             df_shipment = pd.DataFrame(shipment_data)
             
             # Reorder columns for display
-            display_columns = [
-                '마스터_sku', '상품명',
-                '출고량_5개월전', '출고량_4개월전', '출고량_3개월전', 
-                '출고량_2개월전', '출고량_1개월전', '출고량_현재월'
-            ]
+            display_columns = ['마스터_sku', '상품명'] + ShipmentQueries.monthly_summary_columns(summary_months)
             df_display = df_shipment[display_columns]
             
             # 현재 시간 기준으로 월 변경
             current_date = datetime.now()
             month_names = []
-            for i in range(5, -1, -1):  # 6 months ago to 1 month ago
+            for i in range(summary_months - 1, -1, -1):  # oldest month to current month
                 target_date = current_date - relativedelta(months=i)
                 month_name = f"{str(target_date.year)[2:]}년_{target_date.month}월"
                 month_names.append(month_name)
@@ -510,39 +523,32 @@ def show_shipment_quantity():
             # 제품별 출고량 추이
             st.subheader("최근 1년간 출고량 추이 다운로드")
 
-            # Get all shipment data for the last year
-            all_shipments = ShipmentQueries.get_all_inv_out()
+            # Latest day with shipments (rollup table: one row per SKU and day)
+            shipment_range = ShipmentQueries.get_shipment_date_range()
             
-            if all_shipments:
-                # Convert to DataFrame
-                df_all_shipments = pd.DataFrame(all_shipments)
-                
-                # Convert 시점 to datetime
-                df_all_shipments['시점'] = pd.to_datetime(df_all_shipments['시점'])
-                
+            if shipment_range['last_day']:
                 # Filter data for last 1 year
                 end_date = datetime.now().date()
                 start_date = end_date - relativedelta(years=1)
                 
                 # If no data for today, use the latest available date
-                latest_date = df_all_shipments['시점'].max().date()
+                latest_date = shipment_range['last_day']
                 if latest_date < end_date:
                     end_date = latest_date
                     start_date = end_date - relativedelta(years=1)
                 
-                # Filter data within the date range
-                df_filtered = df_all_shipments[
-                    (df_all_shipments['시점'].dt.date > start_date) & 
-                    (df_all_shipments['시점'].dt.date <= end_date)
-                ].copy()
+                # Daily totals within the date range
+                daily_shipments = ShipmentQueries.get_daily_shipments(start_date + dt.timedelta(days=1), end_date)
+                df_filtered = pd.DataFrame(daily_shipments, columns=['마스터_sku', 'day', 'in_qty', 'out_qty'])
+                df_filtered = df_filtered[df_filtered['out_qty'] > 0].copy()
                 
                 if not df_filtered.empty:
-                    # Group by product and date (daily)
-                    df_filtered['날짜'] = df_filtered['시점'].dt.date
+                    # Pivot by product and date (daily)
+                    df_filtered['날짜'] = df_filtered['day']
                     pivot_data = df_filtered.pivot_table(
                         index='마스터_sku',
                         columns='날짜',
-                        values='수량',
+                        values='out_qty',
                         aggfunc='sum',
                         fill_value=0
                     )
@@ -571,11 +577,11 @@ def show_shipment_quantity():
                         
                         # Add summary sheet with monthly totals
                         df_monthly = df_filtered.copy()
-                        df_monthly['년월'] = df_monthly['시점'].dt.to_period('M')
+                        df_monthly['년월'] = pd.to_datetime(df_monthly['day']).dt.to_period('M')
                         monthly_summary = df_monthly.pivot_table(
                             index='마스터_sku',
                             columns='년월',
-                            values='수량',
+                            values='out_qty',
                             aggfunc='sum',
                             fill_value=0
                         )
@@ -609,7 +615,7 @@ def show_shipment_quantity():
             
         else:
             st.warning("출고 데이터가 없습니다.")
-            st.info("playauto_shipment_receipt 테이블에 데이터를 추가해주세요.")
+            st.info("playauto_copy_shipment_receipt 테이블에 데이터를 추가해주세요.")
             
     except Exception as e:
         st.error(f"데이터 로드 중 오류 발생: {str(e)}")
@@ -967,6 +973,38 @@ def show_product_management():
             # del st.session_state.product_success_message
     
 # Inventory Management page
+# 입출고 내역 수정: rows per page of the edit grid
+INV_EDIT_PAGE_SIZE = 200
+
+def load_inv_inout_page(direction: str, key: str, filters: dict):
+    """Current page of the edit grid for one direction (paging state kept in session_state)"""
+    state_key = f"{key}_paging"
+    state = st.session_state.get(state_key)
+    if state is None or state['filters'] != filters:
+        # New filters start again from the newest rows
+        state = {'filters': dict(filters), 'cursors': [None]}
+        st.session_state[state_key] = state
+    
+    page = ShipmentQueries.get_inv_inout_page(
+        direction, after=state['cursors'][-1], limit=INV_EDIT_PAGE_SIZE, **filters
+    )
+    total, is_exact = ShipmentQueries.count_inv_inout(direction, **filters)
+    
+    page_no = len(state['cursors'])
+    col_prev, col_info, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("◀ 이전", key=f"{key}_prev", disabled=page_no == 1, use_container_width=True):
+            state['cursors'].pop()
+            st.rerun()
+    with col_info:
+        st.caption(f"{page_no}페이지 · {'' if is_exact else '약 '}{total:,}건 (최신순)")
+    with col_next:
+        if st.button("다음 ▶", key=f"{key}_next", disabled=page['next_cursor'] is None, use_container_width=True):
+            state['cursors'].append(page['next_cursor'])
+            st.rerun()
+    
+    return pd.DataFrame(page['rows']), page_no
+
 def show_inventory():
     st.title("📦 재고 관리")
     
@@ -1069,19 +1107,20 @@ def show_inventory():
                     errors = []
                     success_count = 0
                     
-                    for idx in range(len(inventory_df)):
-                        # Get the master SKU (primary key)
-                        master_sku = inventory_df.iloc[idx]['마스터 SKU']
-                        is_set = inventory_df.iloc[idx]['세트 유무']
-                        multiple = int(inventory_df.iloc[idx]['배수']) if pd.notna(inventory_df.iloc[idx]['배수']) else 0
-                        
-                        # Check if inventory changes were made
-                        incoming_qty = int(edited_df.iloc[idx]['입고량'])
-                        outgoing_qty = int(edited_df.iloc[idx]['출고량'])
-                        
-                        # Process incoming inventory if > 0
-                        if incoming_qty > 0:
-                            try:
+                    # Stock updates and receipts are saved in one transaction (all or nothing)
+                    with db.transaction():
+                        for idx in range(len(inventory_df)):
+                            # Get the master SKU (primary key)
+                            master_sku = inventory_df.iloc[idx]['마스터 SKU']
+                            is_set = inventory_df.iloc[idx]['세트 유무']
+                            multiple = int(inventory_df.iloc[idx]['배수']) if pd.notna(inventory_df.iloc[idx]['배수']) else 0
+                            
+                            # Check if inventory changes were made
+                            incoming_qty = int(edited_df.iloc[idx]['입고량'])
+                            outgoing_qty = int(edited_df.iloc[idx]['출고량'])
+                            
+                            # Process incoming inventory if > 0
+                            if incoming_qty > 0:
                                 result = ProductQueries.process_inventory_in(master_sku, incoming_qty)
                                 if result > 0:
                                     # Record in shipment receipt table
@@ -1093,12 +1132,9 @@ def show_inventory():
                                         )
                                     changes_made = True
                                     success_count += 1
-                            except Exception as e:
-                                errors.append(f"입고 처리 실패 - {master_sku}: {str(e)}")
-                        
-                        # Process outgoing inventory if > 0
-                        if outgoing_qty > 0:
-                            try:
+                            
+                            # Process outgoing inventory if > 0
+                            if outgoing_qty > 0:
                                 # Apply multiple for 세트 products
                                 actual_outgoing_qty = outgoing_qty
                                 if is_set == '세트' and multiple > 0:
@@ -1120,8 +1156,6 @@ def show_inventory():
                                         )
                                     changes_made = True
                                     success_count += 1
-                            except Exception as e:
-                                errors.append(f"출고 처리 실패 - {master_sku}: {str(e)}")
                     
                     # Show results
                     if errors:
@@ -1136,7 +1170,7 @@ def show_inventory():
                         st.info("변경된 입출고 수량이 없습니다.")
                             
             except Exception as e:
-                st.error(f"업데이트 중 오류 발생: {str(e)}")
+                st.error(f"업데이트 중 오류 발생 (변경 사항이 저장되지 않았습니다): {str(e)}")
         else:
             # Use current datetime if checkbox is not checked
             invinout_datetime = datetime.now()
@@ -1226,52 +1260,15 @@ def show_inventory():
                     with col1_1:
                         if st.button("✅ 확인", use_container_width=True):
                             try:
-                                # 입출고 테이블에 데이터 올리기
-                                success_count = 0
-                                error_count = 0
-                                errors = []
+                                # 입출고 테이블에 데이터 올리기 (한 번의 트랜잭션으로 일괄 반영)
+                                parsed = build_movements_from_upload(df, excel_datetime)
+                                movements = parsed['movements']
+                                result = apply_stock_movements(movements, st.session_state.user_id)
                                 
-                                for _, row in df.iterrows():
-                                    try:
-                                        # Extract data from row
-                                        master_sku = str(row['마스터 SKU'])
-                                        incoming_qty = int(row.get('입고량', 0))
-                                        outgoing_qty = int(row.get('출고량', 0))
-                                        is_set = row.get('세트 유무', '단품')
-                                        multiple = int(row.get('배수', 0)) if pd.notna(row.get('배수', 0)) else 0
-                                        
-                                        # Process incoming inventory if exists
-                                        if incoming_qty > 0:
-                                            result = ProductQueries.process_inventory_in(master_sku, incoming_qty)
-                                            if result > 0:
-                                                # Record in shipment receipt table
-                                                ShipmentQueries.insert_shipment_receipt(master_sku, '입고', incoming_qty, st.session_state.user_id, transaction_datetime=excel_datetime)
-                                        
-                                        # Process outgoing inventory if exists
-                                        if outgoing_qty > 0:
-                                            # Apply multiple for 세트 products
-                                            actual_outgoing_qty = outgoing_qty
-                                            if is_set == '세트' and multiple > 0:
-                                                actual_outgoing_qty = outgoing_qty * multiple
-                                                
-                                            result = ProductQueries.process_inventory_out(master_sku, actual_outgoing_qty)
-                                            if result == 0:
-                                                if is_set == '세트' and multiple > 0:
-                                                    errors.append(f"재고 부족: {master_sku} - 세트 상품 출고량 {outgoing_qty} x 배수 {multiple} = {actual_outgoing_qty}개가 현재 재고보다 많습니다.")
-                                                else:
-                                                    errors.append(f"재고 부족: {master_sku} (요청 수량: {actual_outgoing_qty})")
-                                                error_count += 1
-                                                continue
-                                            else:
-                                                # Record in shipment receipt table with actual quantity
-                                                ShipmentQueries.insert_shipment_receipt(master_sku, '출고', actual_outgoing_qty, st.session_state.user_id, transaction_datetime=excel_datetime)
-                                        
-                                        if incoming_qty > 0 or outgoing_qty > 0:
-                                            success_count += 1
-                                        
-                                    except Exception as e:
-                                        errors.append(f"오류 발생 (SKU: {row.get('마스터 SKU', 'Unknown')}): {str(e)}")
-                                        error_count += 1
+                                rejections = pd.concat([parsed['rejections'], result['rejections']], ignore_index=True)
+                                errors = rejections['메시지'].tolist()
+                                error_count = len(rejections)
+                                success_count = movements.loc[~movements['line_no'].isin(rejections['line_no']), 'line_no'].nunique()
                                 
                                 if success_count > 0:
                                     st.success(f"✅ 재고가 {success_count}개 성공적으로 업데이트되었습니다.")
@@ -1286,7 +1283,7 @@ def show_inventory():
                                     st.session_state.confirm_inventory_update = False
                                         
                             except Exception as e:
-                                st.error(f"처리 중 오류 발생: {str(e)}")
+                                st.error(f"처리 중 오류 발생 (변경 사항이 저장되지 않았습니다): {str(e)}")
                                 st.session_state.confirm_inventory_update = False
                     with col1_2:
                         if st.button("❌ 취소", use_container_width=True):
@@ -1303,19 +1300,16 @@ def show_inventory():
         st.info("상품별 특정 시점의 입출고 수량 및 시간을 수정할 수 있습니다. 아래 표에서 수정하고 싶은 입고 혹은 출고 내역을 찾아 수정 요청 사항을 기입하세요.")
         st.warning("⚠️ 요청하신 수정 사항은 관리자의 승인에 따라 반영됩니다.")
 
-        # Get all unique master SKUs and shipment types for filter options
-        all_inv_data = ShipmentQueries.get_all_inv_inout()
+        # First/last receipt time per direction (date filter defaults)
+        out_range = ShipmentQueries.get_inv_inout_date_range('출고')
+        in_range = ShipmentQueries.get_inv_inout_date_range('입고')
         
-        if all_inv_data:
-            all_inv_df = pd.DataFrame(all_inv_data)
-            
+        if out_range['last_time'] or in_range['last_time']:
             st.write("### 📤 출고 내역")
             # Add search filters
             col1_out, col2_out = st.columns([1, 1])
             
             with col1_out:
-                # Get unique product names
-                # product_name_options = ['전체'] + sorted(all_inv_df['상품명'].unique().tolist())
                 selected_product_out = st.text_input("상품명 검색 (출고)")
                 
             with col2_out:
@@ -1324,31 +1318,21 @@ def show_inventory():
             # Date range filter
             date_col1_out, date_col2_out = st.columns([1, 1])
             
-            # Convert 시점 column to datetime for min/max calculation
-            all_inv_df['시점'] = pd.to_datetime(all_inv_df['시점'])
             with date_col1_out:
-                min_date_out = all_inv_df['시점'].min().date() if not all_inv_df.empty else datetime.now().date()
+                min_date_out = out_range['first_time'].date() if out_range['first_time'] else datetime.now().date()
                 start_date_out = st.date_input("시작일", value=min_date_out)
         
             with date_col2_out:
-                max_date_out = all_inv_df['시점'].max().date() if not all_inv_df.empty else datetime.now().date()
+                max_date_out = out_range['last_time'].date() if out_range['last_time'] else datetime.now().date()
                 end_date_out = st.date_input("종료일", value=max_date_out)
             
-            # Filter the data for 출고 (outgoing)
-            filtered_data_out = all_inv_df[all_inv_df['입출고_여부'] == '출고'].copy()
-            
-            # Apply product name filter with partial matching for 출고
-            if selected_product_out and selected_product_out.strip():
-                filtered_data_out = filtered_data_out[filtered_data_out['상품명'].str.contains(selected_product_out, case=False, na=False)]
-            # if selected_company_out and selected_company_out.strip():
-            #     filtered_data_out = filtered_data_out[filtered_data_out['제조사'].str.contains(selected_company_out, case=False, na=False)]
-            
-            # Apply date range filter for 출고
-            start_datetime_out = pd.Timestamp.combine(start_date_out, pd.Timestamp.min.time())
-            end_datetime_out = pd.Timestamp.combine(end_date_out, pd.Timestamp.max.time())
-            filtered_data_out = filtered_data_out[(filtered_data_out['시점'] >= start_datetime_out) & (filtered_data_out['시점'] <= end_datetime_out)]
-            
-            outgoing_data = filtered_data_out
+            # Filters are applied in SQL; one page of rows is loaded at a time
+            outgoing_data, page_no_out = load_inv_inout_page('출고', 'outgoing', {
+                'product_name': selected_product_out,
+                'manufacturer': selected_company_out,
+                'start_date': start_date_out,
+                'end_date': end_date_out,
+            })
             
             # Display 출고 (Outgoing) table
             if not outgoing_data.empty:
@@ -1368,7 +1352,7 @@ def show_inventory():
                     outgoing_df,
                     use_container_width=True,
                     num_rows="fixed",
-                    key="outgoing_editor", 
+                    key=f"outgoing_editor_{page_no_out}", 
                     disabled=['inv_code', '마스터 SKU', '상품명', '제조사',  '작업자 ID'],
                     # hide_index=True,
                     column_config={
@@ -1469,8 +1453,6 @@ def show_inventory():
             col1_in, col2_in = st.columns([1, 1])
             
             with col1_in:
-                # Get unique product names
-                # product_name_options = ['전체'] + sorted(all_inv_df['상품명'].unique().tolist())
                 selected_product_in = st.text_input("상품명 검색 (입고)")
                 
             with col2_in:
@@ -1479,29 +1461,21 @@ def show_inventory():
             # Date range filter
             date_col1_in, date_col2_in = st.columns([1, 1])
             
-            # Convert 시점 column to datetime for min/max calculation
-            all_inv_df['시점'] = pd.to_datetime(all_inv_df['시점'])
             with date_col1_in:
-                min_date_in = all_inv_df['시점'].min().date() if not all_inv_df.empty else datetime.now().date()
+                min_date_in = in_range['first_time'].date() if in_range['first_time'] else datetime.now().date()
                 start_date_in = st.date_input("입고 시작일", value=min_date_in)
         
             with date_col2_in:
-                max_date_in = all_inv_df['시점'].max().date() if not all_inv_df.empty else datetime.now().date()
+                max_date_in = in_range['last_time'].date() if in_range['last_time'] else datetime.now().date()
                 end_date_in = st.date_input("입고 종료일", value=max_date_in)
             
-            # Filter the data for 입고 (incoming)
-            filtered_data_in = all_inv_df[all_inv_df['입출고_여부'] == '입고'].copy()
-            
-            # Apply product name filter with partial matching for 입고
-            if selected_product_in and selected_product_in.strip():
-                filtered_data_in = filtered_data_in[filtered_data_in['상품명'].str.contains(selected_product_in, case=False, na=False)]
-            
-            # Apply date range filter for 입고
-            start_datetime_in = pd.Timestamp.combine(start_date_in, pd.Timestamp.min.time())
-            end_datetime_in = pd.Timestamp.combine(end_date_in, pd.Timestamp.max.time())
-            filtered_data_in = filtered_data_in[(filtered_data_in['시점'] >= start_datetime_in) & (filtered_data_in['시점'] <= end_datetime_in)]
-            
-            incoming_data = filtered_data_in
+            # Filters are applied in SQL; one page of rows is loaded at a time
+            incoming_data, page_no_in = load_inv_inout_page('입고', 'incoming', {
+                'product_name': selected_product_in,
+                'manufacturer': selected_company_in,
+                'start_date': start_date_in,
+                'end_date': end_date_in,
+            })
             
             # Display 입고 (Incoming) table
             if not incoming_data.empty:
@@ -1521,7 +1495,7 @@ def show_inventory():
                     incoming_df,
                     use_container_width=True,
                     num_rows="fixed",
-                    key="incoming_editor", 
+                    key=f"incoming_editor_{page_no_in}", 
                     disabled=['inv_code', '마스터 SKU', '상품명', '제조사', '작업자 ID'],
                     # hide_index=True,
                     column_config={
@@ -1670,24 +1644,27 @@ def show_inventory():
         if st.button("재고 조정", use_container_width=True):
             if master_sku:  # if master_sku and reason.strip(): # 조정 사유가 포함되도록
                 try:
-                    # Update inventory
-                    result = ProductQueries.adjust_inventory(master_sku, actual_stock)
-                    
-                    if result > 0:
-                        # Save adjustment history
-                        history_result = ProductQueries.adjust_history(master_sku, current_stock, actual_stock, reason, st.session_state.user_info['name'], st.session_state.user_id)
+                    # Stock level, adjustment history and receipt are saved together
+                    with db.transaction():
+                        # Update inventory
+                        result = ProductQueries.adjust_inventory(master_sku, actual_stock)
                         
-                        # Record adjustment in shipment receipt if there's a difference
                         adjustment = actual_stock - current_stock
-                        if adjustment != 0:
-                            transaction_type = '입고' if adjustment > 0 else '출고'
-                            ShipmentQueries.insert_shipment_receipt(
-                                master_sku, 
-                                transaction_type,  # Just use '입고' or '출고'
-                                abs(adjustment), 
-                                st.session_state.user_id
-                            )
-                        
+                        if result > 0:
+                            # Save adjustment history
+                            history_result = ProductQueries.adjust_history(master_sku, current_stock, actual_stock, reason, st.session_state.user_info['name'], st.session_state.user_id)
+                            
+                            # Record adjustment in shipment receipt if there's a difference
+                            if adjustment != 0:
+                                transaction_type = '입고' if adjustment > 0 else '출고'
+                                ShipmentQueries.insert_shipment_receipt(
+                                    master_sku, 
+                                    transaction_type,  # Just use '입고' or '출고'
+                                    abs(adjustment), 
+                                    st.session_state.user_id
+                                )
+                    
+                    if result > 0:
                         # Store adjustment details if there's a difference
                         if adjustment != 0:
                             st.session_state.inventory_adjust_details = f"조정 내역: {current_stock}개 → {actual_stock}개 (차이: {adjustment:+d}개)"
@@ -1715,39 +1692,37 @@ def show_prediction():
         st.subheader("AI 기반 수요 예측")
         
         models_loaded = False
-        future_predictions = {}
-        model_results = {}
+        forecasts = EMPTY_FORECASTS
         
-        # First try to load improved adaptive models
+        # Normalized forecasts (re-read only when the model files change)
         try:
-            with open('./models/future_predictions.pkl', 'rb') as f:
-                future_predictions = pickle.load(f)
-            with open('./models/model_results.pkl', 'rb') as f:
-                model_results = pickle.load(f)
+            forecasts = load_forecasts(('models',))
+            if len(forecasts) == 0:
+                raise FileNotFoundError("models/future_predictions.pkl")
             models_loaded = True
             
             # Check for products with insufficient data
             insufficient_data_products = []
-            for sku, pred in future_predictions.items():
-                if pred.get('method') == 'baseline_insufficient_data' or pred.get('confidence') == 'very_low':
-                    # Find product name for this SKU
-                    for prod_name, sku_code in {
-                        '바이오밸런스': 'BIOBAL',
-                        '풍성밸런스': 'PSBAL',  # AMPLEBAL
-                        '클린밸런스': 'CLBAL',  # CLEANBAL
-                        '뉴로마스터': 'NEUROMASTER',
-                        '키네코어': 'KNCORE',  # KINECORE
-                        '다래 케어': 'DARAECARE',
-                        '선화이버': 'SF',  # SUNFIBER
-                        '영데이즈': 'YOUNGDAYS',
-                        '당당케어': 'DDCARE',
-                        '칸디다웨이': 'KDDWAY',
-                        '퓨어마그 펫': 'PMPKOR'
-                    }.items():
-                        if sku_code == sku:
-                            data_points = pred.get('category_info', {}).get('data_points', 'N/A')
-                            insufficient_data_products.append(f"{prod_name} ({data_points}개월)")
-                            break
+            low_data = forecasts.info[(forecasts.info['method'] == 'baseline_insufficient_data') | (forecasts.info['confidence'] == 'very_low')]
+            for sku, info in low_data.iterrows():
+                # Find product name for this SKU
+                for prod_name, sku_code in {
+                    '바이오밸런스': 'BIOBAL',
+                    '풍성밸런스': 'PSBAL',  # AMPLEBAL
+                    '클린밸런스': 'CLBAL',  # CLEANBAL
+                    '뉴로마스터': 'NEUROMASTER',
+                    '키네코어': 'KNCORE',  # KINECORE
+                    '다래 케어': 'DARAECARE',
+                    '선화이버': 'SF',  # SUNFIBER
+                    '영데이즈': 'YOUNGDAYS',
+                    '당당케어': 'DDCARE',
+                    '칸디다웨이': 'KDDWAY',
+                    '퓨어마그 펫': 'PMPKOR'
+                }.items():
+                    if sku_code == sku:
+                        data_points = info['data_points']
+                        insufficient_data_products.append(f"{prod_name} ({data_points}개월)")
+                        break
             
             if insufficient_data_products:
                 with st.expander("⚠️ 데이터 부족 제품 목록", expanded=False):
@@ -1798,7 +1773,7 @@ def show_prediction():
         # 예측 결과 확인
         if models_loaded and selected_sku:
             # First check if this SKU has any predictions at all
-            if selected_sku not in future_predictions:
+            if selected_sku not in forecasts:
                 # No predictions available for this product
                 st.error(f"""
                 ❌ **예측 불가**
@@ -1814,19 +1789,19 @@ def show_prediction():
                 
                 # Show historical data if available
                 try:
-                    all_shipments = ShipmentQueries.get_all_inv_out()
-                    if all_shipments:
-                        df_shipments = pd.DataFrame(all_shipments)
-                        df_shipments['시점'] = pd.to_datetime(df_shipments['시점'])
-                        df_sku = df_shipments[df_shipments['마스터_sku'] == selected_sku]
+                    monthly_shipments = ShipmentQueries.get_monthly_shipments(selected_sku)
+                    if monthly_shipments:
+                        df_sku = pd.DataFrame(monthly_shipments)
+                        df_sku = df_sku[df_sku['out_qty'] > 0]
                         
                         if not df_sku.empty:
                             st.subheader("📊 과거 데이터")
                             
-                            # Group by month
-                            df_sku['연월'] = df_sku['시점'].dt.to_period('M')
-                            monthly_summary = df_sku.groupby('연월')['수량'].sum().reset_index()
-                            monthly_summary['연월'] = monthly_summary['연월'].astype(str)
+                            # Monthly totals from the rollup
+                            monthly_summary = pd.DataFrame({
+                                '연월': pd.to_datetime(df_sku['month']).dt.strftime('%Y-%m'),
+                                '수량': df_sku['out_qty']
+                            })
                             
                             col1, col2 = st.columns(2)
                             with col1:
@@ -1845,10 +1820,10 @@ def show_prediction():
                             st.info("💡 최소 5개월의 데이터가 축적되면 자동으로 예측이 활성화됩니다.")
                 except:
                     pass
-            elif selected_sku in future_predictions:
+            elif selected_sku in forecasts:
                 # Check if using improved model structure (monthly predictions)
-                if 'forecast_months' in future_predictions.get(selected_sku, {}):
-                    predictions = future_predictions[selected_sku]
+                if 'forecast_months' in forecasts.entry(selected_sku):
+                    predictions = forecasts.entry(selected_sku)
                     updated_prediction = PredictionQueries.get_adjusted_prediction(selected_sku)  # 조정한 예측 값이 있으면 불러오기
                 
                 # Check for insufficient data warning
@@ -1878,17 +1853,9 @@ def show_prediction():
                         """)
                 
                 if predictions:
-                    # Get predictions - check for adaptive model structure first
-                    if 'predictions' in predictions:
-                        # Adaptive model structure - should have 4 values: Aug, Sep, Oct, Nov
-                        forecast_values = predictions.get('predictions', [])
-                        # Also store August prediction separately if available
-                        if 'august_full_prediction' in predictions:
-                            august_full_pred = predictions.get('august_full_prediction', None)
-                    else:
-                        # Old model structure - ARIMA predictions
-                        forecast_values = predictions.get('arima', [])
-                        august_full_pred = None
+                    # Monthly predictions (adaptive model: Aug, Sep, Oct, Nov)
+                    forecast_values = list(forecasts.monthly(selected_sku))
+                    august_full_pred = predictions.get('august_full_prediction', None)
 
                     # Check if we have adjusted predictions and use them instead
                     if updated_prediction and len(updated_prediction) > 0:
@@ -1907,34 +1874,10 @@ def show_prediction():
                         total_forecast = np.sum(forecast_values)
                     
                     # Get model performance metrics if available
-                    rmse = None
-                    mae = None
-                    mape = None
-                    if 'forecast_months' in predictions:
-                        # Check for improved model structure with direct metrics
-                        if selected_sku in model_results:
-                            # Direct access to metrics from improved model
-                            rmse = model_results[selected_sku].get('rmse', None)
-                            mae = model_results[selected_sku].get('mae', None)
-                            
-                            # Legacy structure check
-                            if rmse is None:
-                                if 'adaptive' in model_results.get(selected_sku, {}):
-                                    # Adaptive model structure
-                                    metrics = model_results[selected_sku]['adaptive'].get('metrics', {})
-                                    rmse = metrics.get('RMSE', None)
-                                    mape = metrics.get('MAPE', None)
-                                elif 'arima' in model_results.get(selected_sku, {}):
-                                    # Old improved model structure
-                                    metrics = model_results[selected_sku]['arima'].get('metrics', {})
-                                    rmse = metrics.get('RMSE', None)
-                                    mape = metrics.get('MAPE', None)
-                    else:
-                        # Old model structure
-                        if selected_sku in model_results and period_days in model_results[selected_sku]:
-                            metrics = model_results[selected_sku][period_days].get('arima', {}).get('metrics', {})
-                            rmse = metrics.get('RMSE', None)
-                            mape = metrics.get('MAPE', None)
+                    metrics = forecasts.sku_metrics(selected_sku)
+                    rmse = metrics['rmse']
+                    mae = metrics['mae']
+                    mape = metrics['mape']
                     
                     # Get product info from database
                     moq = 100  # default
@@ -1975,20 +1918,11 @@ def show_prediction():
                             # Get historical average for context
                             historical_avg = None
                             try:
-                                # Get historical shipment data for this SKU
-                                all_shipments = ShipmentQueries.get_all_inv_out()
-                                if all_shipments:
-                                    # Use column indices instead of names to avoid encoding issues
-                                    df_hist = pd.DataFrame(all_shipments)
-                                    # Column 0: 마스터_SKU, Column 1: 수량, Column 2: 시점
-                                    df_hist.columns = ['마스터_SKU', '수량', '시점']
-                                    df_sku = df_hist[df_hist['마스터_SKU'] == selected_sku].copy()
-                                    if not df_sku.empty:
-                                        df_sku['시점'] = pd.to_datetime(df_sku['시점'])
-                                        df_sku['연월'] = df_sku['시점'].dt.to_period('M')
-                                        monthly_hist = df_sku.groupby('연월')['수량'].sum()
-                                        if len(monthly_hist) > 0:
-                                            historical_avg = monthly_hist.mean()
+                                # Get monthly shipment totals for this SKU
+                                monthly_shipments = ShipmentQueries.get_monthly_shipments(selected_sku)
+                                monthly_hist = [row['out_qty'] for row in monthly_shipments if row['out_qty'] > 0]
+                                if len(monthly_hist) > 0:
+                                    historical_avg = float(np.mean(monthly_hist))
                             except Exception as e:
                                 # Debug: print error to console
                                 print(f"Error getting historical data for {selected_sku}: {e}")
@@ -2064,40 +1998,28 @@ def show_prediction():
                     
                     # 출고량 데이터 불러오기
                     try:
-                        all_shipments = ShipmentQueries.get_all_inv_out()
-                        if all_shipments:
-                            df_shipments = pd.DataFrame(all_shipments)
-                            df_shipments['시점'] = pd.to_datetime(df_shipments['시점'])
-                            
-                            df_sku = df_shipments[df_shipments['마스터_sku'] == selected_sku].copy()
-                            
-                            if not df_sku.empty:
-                                # 지난 6개월
-                                for i in range(5, 0, -1):  # 5 months ago to 1 month ago
-                                    target_date = current_date - relativedelta(months=i)
-                                    year = target_date.year
-                                    month = target_date.month
-                                    
-                                    # Filter data for this month
-                                    month_data = df_sku[
-                                        (df_sku['시점'].dt.year == year) & 
-                                        (df_sku['시점'].dt.month == month)
-                                    ]
-                                    
-                                    # Sum the quantities for this month
-                                    month_total = month_data['수량'].sum() if not month_data.empty else 0
-                                    
-                                    historical_months.append({
-                                        'date': pd.Timestamp(year, month, 1),
-                                        'value': float(month_total)
-                                    })
+                        monthly_shipments = ShipmentQueries.get_monthly_shipments(selected_sku)
+                        # 월별 출고량 (rollup, month = 1일)
+                        monthly_out = {(row['month'].year, row['month'].month): row['out_qty']
+                                       for row in monthly_shipments if row['out_qty'] > 0}
+                        
+                        if monthly_out:
+                            # 지난 6개월
+                            for i in range(5, 0, -1):  # 5 months ago to 1 month ago
+                                target_date = current_date - relativedelta(months=i)
+                                year = target_date.year
+                                month = target_date.month
                                 
-                                # 현재 달의 실제 값
-                                current_month_data = df_sku[
-                                    (df_sku['시점'].dt.year == current_year) & 
-                                    (df_sku['시점'].dt.month == current_month)
-                                ]
-                                current_month_actual = current_month_data['수량'].sum() if not current_month_data.empty else 0
+                                # Sum the quantities for this month
+                                month_total = monthly_out.get((year, month), 0)
+                                
+                                historical_months.append({
+                                    'date': pd.Timestamp(year, month, 1),
+                                    'value': float(month_total)
+                                })
+                            
+                            # 현재 달의 실제 값
+                            current_month_actual = monthly_out.get((current_year, current_month), 0)
                     except Exception as e:
                         st.warning(f"과거 데이터 로드 중 오류: {str(e)}")
                     
@@ -2400,30 +2322,12 @@ def show_prediction():
         st.subheader("안전재고 계산")
         col1, col2 = st.columns(2)
         with col1:
-            if models_loaded and selected_sku and selected_sku in future_predictions:
-                # Check if using new model structure
-                predictions_data = future_predictions[selected_sku]
-                if 'forecast_months' in predictions_data:
-                    # Check for adaptive or improved model structure
-                    if 'predictions' in predictions_data:
-                        # Adaptive model structure
-                        forecast_values = predictions_data.get('predictions', [])
-                    else:
-                        # Improved model structure
-                        forecast_values = predictions_data.get('arima', [])
-                    
-                    if len(forecast_values) > 0:
-                        monthly_forecast = int(forecast_values[0])  # First month prediction
-                    else:
-                        monthly_forecast = 0
+            if models_loaded and selected_sku and selected_sku in forecasts:
+                forecast_values = forecasts.monthly(selected_sku)
+                if len(forecast_values) > 0:
+                    monthly_forecast = int(forecast_values[0])  # First month prediction
                 else:
-                    # Old model structure
-                    predictions_30 = future_predictions[selected_sku].get(30, {})
-                    forecast_30 = predictions_30.get('arima', [])
-                    if len(forecast_30) > 0:
-                        monthly_forecast = int(np.sum(forecast_30))
-                    else:
-                        monthly_forecast = 0
+                    monthly_forecast = 0
                 
                 if monthly_forecast > 0:
                     
@@ -2456,29 +2360,13 @@ def show_prediction():
                 - 안전재고 = 3,500 × (30/30) = 3,500개
                 """)
         with col2:
-            if models_loaded and selected_sku and selected_sku in future_predictions:
-                # Check if using new model structure (same logic as col1)
-                predictions_data = future_predictions[selected_sku]
-                if 'forecast_months' in predictions_data:
-                    # Check for adaptive or improved model structure
-                    if 'predictions' in predictions_data:
-                        # Adaptive model structure
-                        forecast_values = predictions_data.get('predictions', [])
-                    else:
-                        # Improved model structure
-                        forecast_values = predictions_data.get('arima', [])
-                    
-                    if len(forecast_values) > 0:
-                        monthly_forecast = int(forecast_values[0])
-                    else:
-                        monthly_forecast = 0
+            if models_loaded and selected_sku and selected_sku in forecasts:
+                # Same first-month forecast as col1
+                forecast_values = forecasts.monthly(selected_sku)
+                if len(forecast_values) > 0:
+                    monthly_forecast = int(forecast_values[0])
                 else:
-                    predictions_30 = future_predictions[selected_sku].get(30, {})
-                    forecast_30 = predictions_30.get('arima', [])
-                    if len(forecast_30) > 0:
-                        monthly_forecast = int(np.sum(forecast_30))
-                    else:
-                        monthly_forecast = 0
+                    monthly_forecast = 0
                 
                 if monthly_forecast > 0:
                     st.metric("권장 안전재고", f"{recommended_safety:,}개")
@@ -2526,62 +2414,17 @@ def show_prediction():
                 st.error(f"기존 조정값 로드 오류: {str(e)}")
         
         # Load predictions if models are available
-        if models_loaded and selected_sku and selected_sku in future_predictions:
-            # Check if using improved model structure
-            predictions_data = future_predictions[selected_sku]
-            
-            if 'forecast_months' in predictions_data:
-                # Check for adaptive or improved model structure
-                if 'predictions' in predictions_data:
-                    # Adaptive model structure
-                    forecast_values = predictions_data.get('predictions', [])
-                else:
-                    # Improved model structure
-                    forecast_values = predictions_data.get('arima', [])
-                                
-                if len(forecast_values) >= 3:
-                    # Direct monthly predictions
-                    pred_current = int(forecast_values[0])
-                    pred_2month = int(forecast_values[1])
-                    pred_3month = int(forecast_values[2])
-                    pred_4month = int(forecast_values[3]) if len(forecast_values) >= 4 else 0
-            else:
-                # Old model structure - Get 90-day predictions
-                predictions_90 = future_predictions[selected_sku].get(90, {})
-                forecast_values = predictions_90.get('arima', [])
-                
-                if len(forecast_values) > 0:
-                    # Convert weekly predictions to monthly
-                    # Create date range for predictions
-                    last_date = predictions_90.get('last_date', datetime.now())
-                    if isinstance(last_date, str):
-                        last_date = pd.to_datetime(last_date)
-                    
-                    prediction_dates = pd.date_range(
-                        start=last_date + pd.Timedelta(days=7),
-                        periods=len(forecast_values),
-                        freq='W'
-                    )
-                    
-                    # Create dataframe with predictions
-                    weekly_pred_df = pd.DataFrame({
-                        '날짜': prediction_dates,
-                        '출고량': forecast_values
-                    })
-                
-                # Convert to monthly
-                weekly_pred_df['월'] = weekly_pred_df['날짜'].dt.to_period('M')
-                monthly_pred = weekly_pred_df.groupby('월')['출고량'].sum().reset_index()
-                
-                # Get predictions for each month
-                if len(monthly_pred) >= 1:
-                    pred_current = int(monthly_pred.iloc[0]['출고량'])
-                if len(monthly_pred) >= 2:
-                    pred_2month = int(monthly_pred.iloc[1]['출고량'])
-                if len(monthly_pred) >= 3:
-                    pred_3month = int(monthly_pred.iloc[2]['출고량'])
-                if len(monthly_pred) >= 4:
-                    pred_4month = int(monthly_pred.iloc[3]['출고량'])
+        if models_loaded and selected_sku and selected_sku in forecasts:
+            # Monthly predictions (legacy weekly forecasts are already summed per month)
+            forecast_values = forecasts.monthly(selected_sku)
+            if len(forecast_values) >= 1:
+                pred_current = int(forecast_values[0])
+            if len(forecast_values) >= 2:
+                pred_2month = int(forecast_values[1])
+            if len(forecast_values) >= 3:
+                pred_3month = int(forecast_values[2])
+            if len(forecast_values) >= 4:
+                pred_4month = int(forecast_values[3])
         
         # Show info if existing adjustment exists
         if existing_adjustment:
@@ -2722,377 +2565,26 @@ def show_alerts():
             default=["발주 시점"]
         )
         
-        # Load AI predictions if available
-        future_predictions = {}
-        try:
-            with open('models_adaptive/future_predictions.pkl', 'rb') as f:
-                future_predictions = pickle.load(f)
-        except:
-            try:
-                with open('models/future_predictions.pkl', 'rb') as f:
-                    future_predictions = pickle.load(f)
-            except:
-                try:
-                    with open('models_improved/future_predictions.pkl', 'rb') as f:
-                        future_predictions = pickle.load(f)
-                except:
-                    pass
-        
-        # SKU mapping for predictions
-        sku_mapping = {
-            '바이오밸런스': 'BIOBAL',
-            '풍성밸런스': 'PSBAL',  # AMPLEBAL
-            '클린밸런스': 'CLBAL',  # CLEANBAL
-            '뉴로마스터': 'NEUROMASTER',
-            '키네코어': 'KNCORE',  # KINECORE
-            '다래 케어': 'DARAECARE',
-            '선화이버': 'SF',  # SUNFIBER
-            '영데이즈': 'YOUNGDAYS',
-            '당당케어': 'DDCARE',
-            '칸디다웨이': 'KDDWAY',
-            '퓨어마그 펫': 'PMPKOR'
-        }
-        
-        # Get real inventory alerts from database
-        alerts_list = []
-        
-        # Define clean_numeric function for cleaning data
-        def clean_numeric(value, default=0):
-            if value is None:
-                return default
-            if isinstance(value, (int, float)):
-                return value
-            # Handle string values that might contain formatting
-            try:
-                # Remove any non-numeric characters except decimal point and minus
-                clean_str = str(value).strip()
-                # Remove any pipe characters, table formatting, or extra spaces
-                clean_str = clean_str.replace('│', '').replace('|', '').replace('┃', '')
-                clean_str = clean_str.replace('─', '').replace('━', '').strip()
-                # If still contains non-numeric chars, extract just the number
-                import re
-                match = re.search(r'-?\d+\.?\d*', clean_str)
-                if match:
-                    clean_str = match.group()
-                # Try to convert to number
-                if clean_str:
-                    return float(clean_str) if '.' in clean_str else int(clean_str)
-                else:
-                    return default
-            except Exception as e:
-                print(f"Error cleaning numeric value '{value}': {e}")
-                return default
-        
+        # Rows kept current by the alert worker; custom thresholds (or a worker that has not
+        # caught up yet) evaluate every alert type for every product here instead
+        alert_worker = get_alert_worker()
+        alert_settings = st.session_state.get('alert_settings') or alert_worker.thresholds
+        thresholds = {name: alert_settings.get(name, value) for name, value in alert_worker.thresholds.items()}
         try:
-            products = ProductQueries.get_all_products()
-            if products:
-                for product in products:
-                    current_stock = clean_numeric(product.get('현재재고'), 0)
-                    safety_stock = clean_numeric(product.get('안전재고'), 0)
-                    product_name = product['상품명']
-                    lead_time = clean_numeric(product.get('리드타임'), 30)
-                    outbound = clean_numeric(product.get('출고량'), 0)
-                    
-                    # Initialize daily_usage with ordinary calculation as fallback
-                    daily_usage = outbound / 30 if outbound > 0 else 0  # Fallback if no AI predictions
-                    
-                    ### AI 예측 시작
-                    ai_safety_stock = None
-                    ai_monthly_forecast = None
-                    demand_trend = ''  # Default to empty when no data
-                    expected_consumption_days = None  # 예상 소비일
-                    
-                    if product_name in sku_mapping and sku_mapping[product_name] in future_predictions:
-                        pred_data = future_predictions[sku_mapping[product_name]]
-                        if 'forecast_months' in pred_data:
-                            # Check for adaptive or improved model structure
-                            if 'predictions' in pred_data:
-                                # Adaptive model structure
-                                forecast_values = pred_data.get('predictions', [])
-                            else:
-                                # Improved model structure - use 'arima'
-                                forecast_values = pred_data.get('arima', [])
-                            if len(forecast_values) > 0:
-                                # Calculate monthly average from available predictions
-                                if len(forecast_values) >= 3:
-                                    # Use all 3 months for better average
-                                    avg_monthly_forecast = sum(forecast_values[:3]) / 3
-                                else:
-                                    # Use what we have
-                                    avg_monthly_forecast = sum(forecast_values) / len(forecast_values)
-                                
-                                ai_monthly_forecast = int(avg_monthly_forecast)
-                                
-                                # Calculate demand forecast based on lead time with partial months
-                                if lead_time <= 90 and len(forecast_values) >= 3:
-                                    # Calculate precisely for partial months
-                                    total_forecast = 0
-                                    remaining_days = lead_time
-                                    
-                                    for month_idx, monthly_forecast in enumerate(forecast_values[:3]):
-                                        if remaining_days <= 0:
-                                            break
-                                        
-                                        if remaining_days >= 30:
-                                            # Use full month
-                                            total_forecast += monthly_forecast
-                                            remaining_days -= 30
-                                        else:
-                                            # Use partial month
-                                            total_forecast += monthly_forecast * (remaining_days / 30)
-                                            remaining_days = 0
-                                    
-                                    ai_safety_stock = int(total_forecast)
-                                elif lead_time > 90:
-                                    # For lead times > 3 months, calculate first 3 months precisely, then extrapolate
-                                    total_forecast = sum(forecast_values[:3])  # First 90 days
-                                    remaining_days = lead_time - 90
-                                    avg_daily = avg_monthly_forecast / 30
-                                    total_forecast += avg_daily * remaining_days
-                                    
-                                    # Apply safety factor for uncertainty
-                                    safety_factor = 1.2  # 20% safety buffer for long lead times
-                                    ai_safety_stock = int(total_forecast * safety_factor)
-                                else:
-                                    # Fallback to simple calculation
-                                    ai_safety_stock = int(avg_monthly_forecast * (lead_time / 30))
-                                
-                                # Calculate demand trend for 3 months
-                                if len(forecast_values) >= 3:
-                                    month1, month2, month3 = forecast_values[0], forecast_values[1], forecast_values[2]
-                                    
-                                    # Calculate the trend based on linear regression or simple comparison
-                                    avg_change = ((month2 - month1) + (month3 - month2)) / 2
-                                    change_rate = avg_change / month1 if month1 > 0 else 0
-                                    
-                                    # Determine trend based on change rate
-                                    if change_rate > 0.02:  # More than 2% increase
-                                        demand_trend = '상승'
-                                    elif change_rate < -0.02:  # More than 2% decrease
-                                        demand_trend = '하락'
-                                    else:
-                                        demand_trend = '유지'
-                                
-                                # Calculate expected consumption days
-                                if current_stock > 0:
-                                    remaining_stock = current_stock
-                                    total_days = 0
-                                    
-                                    for month_idx, monthly_amount in enumerate(forecast_values[:3]):
-                                        daily_rate = monthly_amount / 30
-                                        
-                                        if remaining_stock <= monthly_amount:
-                                            # Stock runs out this month
-                                            days_in_month = remaining_stock / daily_rate
-                                            expected_consumption_days = int(total_days + days_in_month)
-                                            break
-                                        else:
-                                            # Stock lasts beyond this month
-                                            remaining_stock -= monthly_amount
-                                            total_days += 30
-                                    
-                                    # If stock lasts beyond 3 months
-                                    if expected_consumption_days is None and remaining_stock > 0:
-                                        avg_daily = avg_monthly_forecast / 30
-                                        additional_days = remaining_stock / avg_daily
-                                        expected_consumption_days = int(total_days + additional_days)
-                        else:
-                            # Old model - use 30-day total
-                            predictions_30 = pred_data.get(30, {})
-                            forecast_30 = predictions_30.get('arima', [])
-                            if len(forecast_30) > 0:
-                                ai_monthly_forecast = int(np.sum(forecast_30))
-                                
-                                # Calculate demand forecast based on lead time
-                                if lead_time <= 90:
-                                    # For lead times up to 3 months, use direct calculation
-                                    ai_safety_stock = int(ai_monthly_forecast * (lead_time / 30))
-                                else:
-                                    # For lead times > 3 months, use conservative estimate with safety factor
-                                    base_forecast = ai_monthly_forecast * (lead_time / 30)
-                                    safety_factor = 1.2  # 20% safety buffer for long lead times
-                                    ai_safety_stock = int(base_forecast * safety_factor)
-                                
-                                # Calculate expected consumption days (simplified for old model)
-                                if current_stock > 0 and ai_monthly_forecast > 0:
-                                    daily_rate = ai_monthly_forecast / 30
-                                    expected_consumption_days = int(current_stock / daily_rate)
-                    
-                    # Update daily_usage with AI predictions if available
-                    if ai_monthly_forecast and ai_monthly_forecast > 0:
-                        daily_usage = ai_monthly_forecast / 30  # Use AI prediction for daily usage
-                    ### AI 예측 끝
-
-
-                    # # 1. 재고부족
-                    # 긴급
-                    if safety_stock > 0 and current_stock < safety_stock * 0.5:
-                        # Critical - less than 50% of safety stock
-                        # Calculate days until stockout if daily_usage is available
-                        days_msg = ""
-                        if daily_usage > 0:
-                            days_until_out = current_stock / daily_usage
-                            days_msg = f" (예상 소진: {int(days_until_out)}일)"
-                        
-                        alerts_list.append({
-                            '유형': '재고 부족',
-                            '제품': product_name,
-                            '상태': '긴급',
-                            '안전재고_관리자': safety_stock,
-                            '메시지': f'재고 {current_stock}개, 안전재고({safety_stock}개)의 50% 미만{days_msg}',
-                            # '발생일시': datetime.now()
-                        })
-                    
-                    # 주의
-                    elif safety_stock > 0 and current_stock < safety_stock:
-                        # Warning - below safety stock
-                        # Calculate days until stockout if daily_usage is available
-                        days_msg = ""
-                        if daily_usage > 0:
-                            days_until_out = current_stock / daily_usage
-                            days_msg = f" (예상 소진: {int(days_until_out)}일)"
-                        
-                        alerts_list.append({
-                            '유형': '재고 부족', 
-                            '제품': product_name,
-                            '상태': '주의',
-                            '안전재고_관리자': safety_stock,
-                            '메시지': f'재고 {current_stock}개, 안전재고({safety_stock}개) 미만{days_msg}',
-                            # '발생일시': datetime.now()
-                        })
-                    
-
-                    # # 2. 발주 시점
-                    monthly_predictions = []
-                    sku_for_prediction = None
-                    
-                    if product_name in sku_mapping:
-                        sku_for_prediction = sku_mapping[product_name]
-                        
-                        if sku_for_prediction in future_predictions:
-                            pred_data = future_predictions[sku_for_prediction]
-                            
-                            # Check different possible structures
-                            if 'predictions' in pred_data and isinstance(pred_data['predictions'], (list, np.ndarray)):
-                                # New adaptive model structure - predictions array has [Aug, Sep, Oct, Nov]
-                                preds = pred_data['predictions']
-                                if len(preds) >= 4:
-                                    # 이번 달은(index 0) 제외하고, 다음 3달만
-                                    monthly_predictions = list(preds[1:4])
-                                elif len(preds) >= 3:
-                                    monthly_predictions = list(preds[:3])
-                            elif 'forecast_months' in pred_data:
-                                if 'adaptive_forecast' in pred_data:
-                                    monthly_predictions = list(pred_data['adaptive_forecast'][:3])
-                                else:
-                                    monthly_predictions = list(pred_data.get('arima', [])[:3])
-                    
-                    moq = clean_numeric(product.get('최소주문수량'), 1)
-                    reorder_info = calculate_reorder_point(
-                        current_stock=current_stock,
-                        safety_stock=safety_stock,
-                        lead_time=lead_time,
-                        monthly_predictions=monthly_predictions,
-                        moq=moq,
-                        confidence_level=1.2 if lead_time > 90 else 1.0  # Higher confidence for long lead times
-                    )
-                    
-                    if reorder_info['urgency'] in ['긴급', '주의']:
-                        alerts_list.append({
-                            '유형': '발주 시점',
-                            '제품': product_name,
-                            '상태': reorder_info['urgency'],
-                            '수요 추이': calculate_demand_trend(monthly_predictions),
-                            '안전재고량_관리자': safety_stock,
-                            '현재 재고량': current_stock,
-                            '리드타임': lead_time,
-                            '안전재고량_예측기반': int(reorder_info['reorder_point']),
-                            '일일소비량': f"{reorder_info['avg_daily_consumption']:.2f}",
-                            '권장발주량': int(reorder_info['recommended_qty']),
-                            '재고소진일': int(reorder_info['days_until_stockout']) if reorder_info['days_until_stockout'] != float('inf') else 'N/A',
-                            # '재발주기간': int(reorder_info['days_until_reorder']) if reorder_info['days_until_reorder'] != float('inf') else 'N/A', 
-                            '메시지': reorder_info['order_status'],
-                        })
-                    
-                    # # 3. 소비기한 임박
-                    if product.get('소비기한'):
-                        try:
-                            # Convert expiry date to datetime if it's a string
-                            expiry_date = product['소비기한']
-                            if isinstance(expiry_date, str):
-                                expiry_date = pd.to_datetime(expiry_date).date()
-                            elif hasattr(expiry_date, 'date'):
-                                expiry_date = expiry_date.date()
-                            
-                            # Calculate days until expiry
-                            today = datetime.now().date()
-                            days_until_expiry = (expiry_date - today).days
-                            
-                            # Check if expiry alert is needed (based on slider value from settings)
-                            expiry_alert_threshold = st.session_state.get('alert_settings', {}).get('expiry_alert_days', 30)
-                            
-                            if days_until_expiry <= expiry_alert_threshold and days_until_expiry >= 0:
-                                # Determine status based on days remaining
-                                if days_until_expiry <= 7:
-                                    status = '긴급'
-                                    # priority_msg = '즉시 할인 판매 필요'
-                                elif days_until_expiry <= 14:
-                                    status = '경고'
-                                    # priority_msg = '할인 판매 준비'
-                                elif days_until_expiry <= 21:
-                                    status = '주의'
-                                    # priority_msg = '판매 계획 검토'
-                                else:
-                                    status = ''
-                                    # priority_msg = '모니터링 중'
-                                
-                                alerts_list.append({
-                                    '유형': '소비기한 임박',
-                                    '제품': product_name,
-                                    '현재 재고량': current_stock,
-                                    '소비기한': expiry_date.strftime('%Y-%m-%d'),
-                                    '남은 일수': days_until_expiry,
-                                    '상태': status,
-                                    '메시지': f'소비기한 {days_until_expiry}일 남음',  #  - {priority_msg}
-                                    # '권장 조치': priority_msg
-                                })
-                            elif days_until_expiry < 0:
-                                # Already expired
-                                alerts_list.append({
-                                    '유형': '소비기한 임박',
-                                    '제품': product_name,
-                                    '현재 재고량': current_stock,
-                                    '소비기한': expiry_date.strftime('%Y-%m-%d'),
-                                    '남은 일수': days_until_expiry,
-                                    '상태': '긴급',
-                                    '메시지': f'소비기한 {abs(days_until_expiry)}일 경과 - 즉시 처리 필요',
-                                    # '권장 조치': '즉시 폐기 또는 반품 처리'
-                                })
-                                
-                        except Exception as e:
-                            # Handle date parsing errors
-                            continue
-                    
-
-                    # # 4. 과잉 재고
-                    if daily_usage > 0:  # Only check if product has usage
-                        needed_inventory = (daily_usage * lead_time) + safety_stock  # 예측 수요량 × 리드타임 + 안전재고
-                        excess = current_stock - needed_inventory  # 과잉 재고 여부
-                        
-                        # 원래 필요한 양의 15%가 넘는다면
-                        if excess > needed_inventory * 0.15:  # 과잉여부 결정
-                            alerts_list.append({
-                                '유형': '과잉 재고',
-                                '제품': product_name,
-                                '과잉': int(excess),
-                                '상태': '주의',
-                                '안전재고': safety_stock,  # 안전재고_관리자
-                                '현재재고': current_stock,
-                                '일일소비량': daily_usage,
-                                '메시지': f'필요재고량의({int(needed_inventory)}개) 15% 초과',
-                                # '발생일시': datetime.now()
-                            })
-        
+            if alert_worker.synced and thresholds == alert_worker.thresholds:
+                alerts_list = [dict(row['details'], 발생일시=row['first_seen'])
+                               for row in AlertQueries.get_active_alerts()]
+            else:
+                # Load AI predictions if available (models_adaptive, then models, then models_improved),
+                # with set demand exploded onto component SKUs
+                forecasts = load_component_forecasts()
+                products = ProductQueries.get_all_products()
+                alerts = evaluate_alerts(
+                    pd.DataFrame(products) if products else pd.DataFrame(columns=['마스터_sku']),
+                    forecasts.entries,
+                    **thresholds
+                )
+                alerts_list = alerts.to_dict('records')
         except Exception as e:
             st.error(f"알림 데이터 로드 오류: {str(e)}")
             alerts_list = []
@@ -3106,13 +2598,13 @@ def show_alerts():
                 # Reorder columns for better display
                 columns_order = ['유형', '제품', '상태']
                 if '발주 시점' in alert_types and any(a['유형'] == '발주 시점' for a in filtered_alerts):
-                    columns_order += ['수요 추이', '현재 재고량', '안전재고량_관리자', '리드타임', '일일소비량', '안전재고량_예측기반', '권장발주량', '재고소진일', '재발주기간', '메시지']
+                    columns_order += ['수요 추이', '현재 재고량', '안전재고량', '리드타임', '일일소비량', '안전재고량_예측기반', '권장발주량', '재고소진일', '메시지']
                 elif '소비기한 임박' in alert_types and any(a['유형'] == '소비기한 임박' for a in filtered_alerts):
                     columns_order += ['현재 재고량', '소비기한', '남은 일수', '권장 조치', '메시지']
                 elif '과잉 재고' in alert_types and any(a['유형'] == '과잉 재고' for a in filtered_alerts):
-                    columns_order += ['과잉', '안전재고', '현재재고', '일일소비량', '메시지']
+                    columns_order += ['과잉', '안전재고량', '현재 재고량', '일일소비량', '메시지']
                 else:
-                    columns_order += ['메시지']
+                    columns_order += ['현재 재고량', '안전재고량', '예상 소비일', '메시지']
                 columns_order += ['발생일시']
                 # Only include columns that exist
                 columns_order = [col for col in columns_order if col in alerts_data.columns]
@@ -3140,11 +2632,12 @@ def show_alerts():
         
         # Color code by demand trend
         def color_trend(val):
-            if val == '상승':
+            val = str(val)
+            if '상승' in val:
                 return 'color: #1971c2; font-weight: bold'  # 파란색
-            elif val == '하락':
+            elif '하락' in val:
                 return 'color: #e03131; font-weight: bold'  # 빨간색
-            elif val == '유지':
+            elif '안정' in val or val == '유지':
                 return 'color: #2f9e44; font-weight: bold'  # 초록색
             return ''
         
@@ -3177,7 +2670,7 @@ def show_alerts():
                     help="향후 3개월간 예측 수요의 변화 추세",
                     width="small"
                 ),
-                '안전재고량_관리자': st.column_config.NumberColumn(
+                '안전재고량': st.column_config.NumberColumn(
                     help="관리자가 설정한 안전재고 수량",
                     width="small"
                 ),
@@ -3205,9 +2698,10 @@ def show_alerts():
                     width="small",
                     format="%d개"
                 ),
-                '재고소진일': st.column_config.TextColumn(
+                '재고소진일': st.column_config.NumberColumn(
                     help="현재 소비 속도로 재고가 소진되는 예상 일수",
-                    width="small"
+                    width="small",
+                    format="%d일"
                 ),
                 '재발주기간': st.column_config.TextColumn(
                     help="며칠안에 발주해야하는지",
@@ -3251,91 +2745,121 @@ def show_alerts():
             use_container_width=True, 
             hide_index=True
         )
-        
         # Quick actions
+        order_cost_col, holding_cost_col = st.columns(2)
+        with order_cost_col:
+            order_cost = st.number_input(
+                "발주 1건당 고정비 (원)", min_value=0, value=DEFAULT_ORDER_COST, step=50000,
+                help="운송비, 검수 등 공급업체 발주 1건마다 드는 비용"
+            )
+        with holding_cost_col:
+            holding_cost = st.number_input(
+                "개당 일 보관비 (원)", min_value=0.0, value=float(DEFAULT_HOLDING_COST), step=1.0,
+                help="제품 1개를 하루 보관하는 비용"
+            )
+        
         if st.button("📋 발주표 생성"):
             st.success("발주표가 생성되었습니다.")
             
-            # Generate real order sheet from products needing reorder using AI predictions
-            order_list = []
+            # One purchase order per supplier, planned jointly over all of its products
+            order_sheet = pd.DataFrame()
             try:
+                # Component-level forecasts (cached per forecast file and BOM version)
+                forecasts = load_component_forecasts()
                 products = ProductQueries.get_all_products()
                 if products:
                     products_df = pd.DataFrame(products)
                     
-                    # Calculate reorder points for all products using AI predictions
+                    # Urgency per product (SKUs with a forecast error std use a 95% service level)
                     reorder_results = batch_calculate_reorder_points(
                         products_df, 
-                        future_predictions,
-                        confidence_level=1.0
+                        forecasts.entries,
+                        confidence_level=1.0,
+                        service_level=0.95
+                    )
+                    orders, _ = plan_orders(
+                        products_df, forecasts.entries, order_cost, holding_cost, service_level=0.95
+                    )
+                    upcoming = next_purchase_orders(orders).merge(
+                        reorder_results[['마스터_sku', 'priority', 'urgency', 'demand_trend']],
+                        on='마스터_sku', how='left'
                     )
                     
-                    # Filter products that need ordering (긴급 or 주의 status)
-                    needs_order = reorder_results[reorder_results['urgency'].isin(['긴급', '주의'])]
-                    needs_order = needs_order.sort_values('priority', ascending=False)
-                    
-                    for _, row in needs_order.iterrows():
-                        # Get manufacturer from original products data
-                        manufacturer = ''
-                        for product in products:
-                            if product['마스터_sku'] == row['마스터_sku']:
-                                manufacturer = product['제조사']
-                                break
-                        
-                        order_list.append({
-                            '우선순위': row['priority'],
-                            '상태': row['urgency'],
-                            '제품': row['상품명'],
-                            '현재 재고': int(row['현재재고']),
-                            '안전재고량_예측기반': int(row['reorder_point']),
-                            '권장 발주량': int(row['recommended_qty']),
-                            'MOQ': int(row['MOQ']),
-                            '공급업체': manufacturer,
-                            '예상 입고일': (datetime.now() + pd.Timedelta(days=row['리드타임'])).strftime('%Y-%m-%d'),
-                            '수요 추이': row['demand_trend']
-                        })
+                    # Suppliers with a 긴급 or 주의 product get their next order; the
+                    # supplier's other products due soon ride along on the same order
+                    candidates = reorder_results.loc[reorder_results['urgency'].isin(['긴급', '주의']), '마스터_sku']
+                    suppliers = set(products_df.loc[products_df['마스터_sku'].isin(candidates), '제조사'].dropna()) - {''}
+                    upcoming = upcoming[upcoming['공급업체'].isin(suppliers) | upcoming['마스터_sku'].isin(candidates)]
+                    upcoming = upcoming.sort_values(['공급업체', 'priority'], ascending=[True, False])
+                    
+                    order_sheet = pd.DataFrame({
+                        '공급업체': upcoming['공급업체'].replace('', '미지정'),
+                        '발주일': upcoming['발주일'],
+                        '예상 입고일': upcoming['입고예정일'],
+                        '우선순위': upcoming['priority'].fillna(1).astype(int),
+                        '상태': upcoming['urgency'].fillna('정상'),
+                        '제품': upcoming['상품명'],
+                        '현재 재고': upcoming['현재재고'],
+                        '권장 발주량': upcoming['발주량'],
+                        'MOQ': upcoming['MOQ'],
+                        '커버 일수': upcoming['커버일수'],
+                        '수요 추이': upcoming['demand_trend'].fillna('데이터 부족')
+                    })
             except Exception as e:
                 st.error(f"발주표 생성 오류: {str(e)}")
             
-            if order_list:
-                order_sheet = pd.DataFrame(order_list)
+            if len(order_sheet):
+                purchase_orders = order_sheet.groupby(['공급업체', '발주일', '예상 입고일'], sort=False).agg(
+                    품목수=('제품', 'size'),
+                    총발주량=('권장 발주량', 'sum')
+                ).reset_index()
+                st.markdown("**공급업체별 발주서**")
+                st.dataframe(purchase_orders, use_container_width=True, hide_index=True)
                 st.dataframe(order_sheet, use_container_width=True, hide_index=True)
                 
-                # Add download button for order sheet
-                buffer = io.BytesIO()
-                with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-                    order_sheet.to_excel(writer, index=False, sheet_name='발주표')
-                
-                st.download_button(
-                    label="📥 발주표 다운로드",
-                    data=buffer.getvalue(),
-                    file_name=f"발주표_{datetime.now().strftime('%Y%m%d')}.xlsx",
-                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                )
+                # Add download button for order sheet (one sheet per supplier)
+                try:
+                    buffer = io.BytesIO()
+                    supplier_lines = list(order_sheet.groupby('공급업체', sort=False))
+                    sheet_names = excel_sheet_names([supplier for supplier, _ in supplier_lines], reserved=('발주표',))
+                    with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
+                        order_sheet.to_excel(writer, index=False, sheet_name='발주표')
+                        for sheet_name, (_, lines) in zip(sheet_names, supplier_lines):
+                            lines.to_excel(writer, index=False, sheet_name=sheet_name)
+                    
+                    st.download_button(
+                        label="📥 발주표 다운로드",
+                        data=buffer.getvalue(),
+                        file_name=f"발주표_{datetime.now().strftime('%Y%m%d')}.xlsx",
+                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                    )
+                except Exception as e:
+                    st.error(f"발주표 파일 생성 오류: {str(e)}")
             else:
                 st.info("현재 발주가 필요한 제품이 없습니다.")
     
     with tabs[1]:
         st.subheader("알림 설정")
+        # Sliders start at the thresholds the alert list uses (saved settings, else the worker's)
 
         st.markdown("**재고 부족 알림**")
         stock_alert_days = st.slider(
             "재고 소진 예상일 기준 (일)",
-            1, 30, 10,
+            1, 30, min(max(thresholds['stock_alert_days'], 1), 30),
             help="재고가 N일 내에 소진될 것으로 예상되면 알림"
         )
         
         st.markdown("**발주 시점 알림**")
         order_alert_days = st.slider(
             "발주 필요일 전 알림 (일)",
-            1, 30, 10,
+            1, 30, min(max(thresholds['order_alert_days'], 1), 30),
             help="발주가 필요한 시점 N일 전에 알림"
         )
 
         st.markdown("**소비기한 알림**")
         expiry_alert_days = st.slider(
             "소비기한 임박 기준 (일)",
-            7, 90, 30,
+            7, 90, min(max(thresholds['expiry_alert_days'], 7), 90),
             help="소비기한이 N일 남으면 알림"
         )
         
@@ -3420,207 +2944,19 @@ def show_alerts():
         
         if email and is_admin:
             if st.button("📧 즉시 알림 발송", use_container_width=True):
-                # Collect current alerts
-                alerts_for_email = []
-                
-                # Load AI predictions for forecast-based calculations
-                future_predictions = {}
-                try:
-                    with open('models_adaptive/future_predictions.pkl', 'rb') as f:
-                        future_predictions = pickle.load(f)
-                except:
-                    pass
-                
-                # SKU mapping for predictions
-                sku_mapping = {
-                    '바이오밸런스': 'BIOBAL',
-                    '풍성밸런스': 'PSBAL',  # AMPLEBAL
-                    '클린밸런스': 'CLBAL',  # CLEANBAL
-                    '뉴로마스터': 'NEUROMASTER',
-                    '키네코어': 'KNCORE',  # KINECORE
-                    '다래 케어': 'DARAECARE',
-                    '선화이버': 'SF',  # SUNFIBER
-                    '영데이즈': 'YOUNGDAYS',
-                    '당당케어': 'DDCARE',
-                    '칸디다웨이': 'KDDWAY',
-                    '퓨어마그 펫': 'PMPKOR'
-                }
-                
                 try:
+                    # Same alert rules as the alert list, with the thresholds set above
+                    forecasts = load_component_forecasts()
                     products = ProductQueries.get_all_products()
+                    alerts_for_email = []
                     if products:
-                        for product in products:
-                            # Clean numeric values to handle any formatting issues
-                            def clean_numeric(value, default=0):
-                                if value is None:
-                                    return default
-                                if isinstance(value, (int, float)):
-                                    return value
-                                # Handle string values that might contain formatting
-                                try:
-                                    # Remove any non-numeric characters except decimal point and minus
-                                    clean_str = str(value).strip()
-                                    # Remove any pipe characters, table formatting, or extra spaces
-                                    clean_str = clean_str.replace('│', '').replace('|', '').replace('┃', '')
-                                    clean_str = clean_str.replace('─', '').replace('━', '').strip()
-                                    # If still contains non-numeric chars, extract just the number
-                                    import re
-                                    match = re.search(r'-?\d+\.?\d*', clean_str)
-                                    if match:
-                                        clean_str = match.group()
-                                    # Try to convert to number
-                                    if clean_str:
-                                        return float(clean_str) if '.' in clean_str else int(clean_str)
-                                    else:
-                                        return default
-                                except Exception as e:
-                                    print(f"Error cleaning numeric value '{value}': {e}")
-                                    return default
-                            
-                            current_stock = clean_numeric(product.get('현재재고'), 0)
-                            safety_stock = clean_numeric(product.get('안전재고'), 0)
-                            product_name = product['상품명']
-                            lead_time = clean_numeric(product.get('리드타임'), 30)
-                            outbound = clean_numeric(product.get('출고량'), 0)
-                            expiration = product.get('소비기한')
-                            
-                            daily_usage = outbound / 30 if outbound > 0 else 0
-                            
-                            # Calculate expected_consumption_days using forecast (same as main logic)
-                            expected_consumption_days = 0
-                            forecast_values = []
-                            
-                            # Check if we have AI predictions for this product
-                            if product_name in sku_mapping and sku_mapping[product_name] in future_predictions:
-                                pred_data = future_predictions[sku_mapping[product_name]]
-                                if 'forecast_months' in pred_data:
-                                    # New model - use forecast
-                                    forecast_values = list(pred_data.get('arima', []))
-                                elif 'predictions' in pred_data:
-                                    # Old model structure
-                                    preds = pred_data['predictions']
-                                    if 'arima' in preds and len(preds['arima']) >= 3:
-                                        forecast_values = list(preds['arima'][:3])
-                            
-                            # Calculate expected consumption days using forecast if available
-                            if len(forecast_values) > 0 and current_stock > 0:
-                                remaining_stock = current_stock
-                                total_days = 0
-                                
-                                for month_idx, monthly_amount in enumerate(forecast_values[:3]):
-                                    daily_rate = monthly_amount / 30 if monthly_amount > 0 else 0.1
-                                    
-                                    if daily_rate > 0 and remaining_stock <= monthly_amount:
-                                        # Stock runs out this month
-                                        days_in_month = remaining_stock / daily_rate
-                                        expected_consumption_days = int(total_days + days_in_month)
-                                        break
-                                    else:
-                                        # Stock lasts beyond this month
-                                        remaining_stock -= monthly_amount
-                                        total_days += 30
-                                
-                                # If stock lasts beyond 3 months
-                                if expected_consumption_days == 0 and remaining_stock > 0:
-                                    avg_monthly = sum(forecast_values[:3]) / len(forecast_values[:3])
-                                    avg_daily = avg_monthly / 30 if avg_monthly > 0 else 0.1
-                                    additional_days = remaining_stock / avg_daily
-                                    expected_consumption_days = int(total_days + additional_days)
-                            else:
-                                # No forecast available, use simple calculation
-                                if daily_usage > 0 and current_stock > 0:
-                                    expected_consumption_days = int(current_stock / daily_usage)
-                            
-                            # Check if stock alert is needed
-                            if daily_usage > 0:
-                                try:
-                                    days_until_stockout = float(current_stock) / float(daily_usage)
-                                except (ValueError, TypeError):
-                                    days_until_stockout = 0
-                                
-                                # Stock depletion alert - only if below safety stock
-                                if current_stock < safety_stock and days_until_stockout > 0:
-                                    stockout_date = (datetime.now() + pd.Timedelta(days=days_until_stockout)).strftime('%Y-%m-%d')
-                                    
-                                    # Determine status based on how critical the stock level is
-                                    if current_stock < safety_stock * 0.5:
-                                        status = '긴급'
-                                    else:
-                                        status = '주의'
-                                    
-                                    try:
-                                        days_text = int(days_until_stockout)
-                                    except:
-                                        days_text = round(days_until_stockout)
-                                    
-                                    alerts_for_email.append({
-                                        '제품': product_name,
-                                        '유형': '재고 부족',
-                                        '현재 재고량': current_stock,
-                                        '안전재고량': safety_stock,
-                                        # '예상 소진일': stockout_date,
-                                        '예상 소비일': expected_consumption_days,
-                                        '리드타임': lead_time,
-                                        '상태': status,
-                                        '메시지': f'{days_text}일 후 재고 소진 예상'
-                                    })
-                                
-                                # 발주시점 알림
-                                if days_until_stockout > 0:
-                                    days_until_reorder = days_until_stockout - lead_time
-                                    if days_until_reorder <= order_alert_days and days_until_reorder <= lead_time:
-                                        # Determine urgency based on how soon we need to order
-                                        if days_until_reorder <= 0:
-                                            order_status = '긴급'
-                                            order_message = '즉시 발주 필요'
-                                        elif days_until_reorder <= 3:
-                                            order_status = '경고'
-                                            try:
-                                                order_message = f'{int(days_until_reorder)}일 내 발주 필요'
-                                            except:
-                                                order_message = f'{days_until_reorder:.0f}일 내 발주 필요'
-                                        else:
-                                            order_status = '주의'
-                                            try:
-                                                order_message = f'{int(days_until_reorder)}일 내 발주 권장'
-                                            except:
-                                                order_message = f'{days_until_reorder:.0f}일 내 발주 권장'
-                                        
-                                        alerts_for_email.append({
-                                            '제품': product_name,
-                                            '유형': '발주 시점',
-                                            '현재 재고량': current_stock,
-                                            '안전재고량': safety_stock, 
-                                            '출고량': outbound,
-                                            # '예상 소진일': stockout_date,
-                                            '예상 소비일': expected_consumption_days,
-                                            '리드타임': lead_time,
-                                            '상태': order_status,
-                                            '메시지': order_message
-                                        })
-                            
-                            # 소비기한 임박
-                            if expiration:
-                                if isinstance(expiration, str):
-                                    try:
-                                        expiration = pd.to_datetime(expiration).date()
-                                    except:
-                                        expiration = None
-                                
-                                if expiration:
-                                    days_until_expiry = (expiration - datetime.now().date()).days
-                                    if days_until_expiry <= expiry_alert_days:
-                                        status = '긴급' if days_until_expiry <= 7 else ('경고' if days_until_expiry <= 14 else '주의')
-                                        
-                                        alerts_for_email.append({
-                                            '제품': product_name,
-                                            '유형': '소비기한 임박',
-                                            '현재 재고량': current_stock,
-                                            '소비기한': expiration.strftime('%Y-%m-%d'),
-                                            '남은 일수': days_until_expiry,
-                                            '상태': status,
-                                            '권장 조치': '판촉 진행 또는 폐기 준비'
-                                        })
+                        alerts = evaluate_alerts(
+                            pd.DataFrame(products), forecasts.entries,
+                            stock_alert_days=stock_alert_days,
+                            order_alert_days=order_alert_days,
+                            expiry_alert_days=expiry_alert_days
+                        )
+                        alerts_for_email = alert_records(alerts[alerts['유형'].isin(EMAIL_ALERT_TYPES)])
                 
                     if alerts_for_email:
                         # Send test email
@@ -3642,14 +2978,36 @@ def show_alerts():
                                 st.info("실제 이메일을 발송하려면 EMAIL_SETUP.md 파일을 참고하여 SMTP 설정을 완료해주세요.")
                         else:
                             if email_system.send_inventory_alert(email, alerts_for_email):
-                                st.success(f"테스트 이메일이 {email}로 발송되었습니다.")
+                                st.success(f"테스트 이메일이 {email} 발송 대기열에 추가되었습니다. 백그라운드에서 발송됩니다.")
                             else:
-                                st.error("이메일 발송에 실패했습니다. SMTP 설정을 확인해주세요.")
+                                st.error("이메일 발송 대기열 추가에 실패했습니다. SMTP 설정을 확인해주세요.")
                     else:
                         st.info("현재 알림이 필요한 제품이 없습니다.")
                 
                 except Exception as e:
                     st.error(f"이메일 발송 오류: {str(e)}")
+            
+            # Delivery status recorded by the background sender (utils.mail_outbox)
+            with st.expander("📮 최근 발송 내역"):
+                try:
+                    recent_mail = MailQueries.get_recent_mail(20)
+                except Exception as e:
+                    recent_mail = []
+                    st.error(f"발송 내역 조회 오류: {str(e)}")
+                if recent_mail:
+                    status_labels = {'pending': '대기', 'sending': '발송 중', 'sent': '발송 완료', 'failed': '실패'}
+                    mail_df = pd.DataFrame(recent_mail)
+                    mail_df['status'] = mail_df['status'].map(status_labels)
+                    mail_df = mail_df.rename(columns={
+                        'recipient': '수신자', 'subject': '제목', 'status': '상태', 'attempts': '시도 횟수',
+                        'last_error': '마지막 오류', 'created_at': '요청 시각', 'sent_at': '발송 시각'
+                    })
+                    st.dataframe(
+                        mail_df[['요청 시각', '수신자', '제목', '상태', '시도 횟수', '발송 시각', '마지막 오류']],
+                        use_container_width=True, hide_index=True
+                    )
+                else:
+                    st.info("발송 내역이 없습니다.")
         
         st.markdown("---")
         
@@ -1,18 +1,480 @@
 import os
+import json
+import select
+import threading
+import time
 import psycopg2
 from psycopg2.extras import RealDictCursor
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, ISOLATION_LEVEL_AUTOCOMMIT
+from psycopg2.pool import PoolError
 import streamlit as st
 from contextlib import contextmanager
 from typing import Dict, List, Any, Optional
 from dotenv import load_dotenv
 
+from config.schema import (INV_CODE_SUFFIX_FUNCTION, CHANGE_CHANNEL, SHIPMENT_DAILY_TABLE, BOM_TABLE, ACTIVE_ALERTS_TABLE,
+                           MAIL_OUTBOX_TABLE, apply_schema, shipment_daily_rows)
+
 import pandas as pd
-from datetime import datetime
         
 
 # Load environment variables
 load_dotenv()
 
+
+def _env_number(key: str, default, cast=int):
+    """Read a numeric setting from the environment, falling back to default"""
+    try:
+        return cast(os.getenv(key, default))
+    except (TypeError, ValueError):
+        return default
+
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of PostgreSQL connections
+    
+    Each physical connection gets the session timezone once, when it is opened.
+    Connections idle longer than `health_check_after` seconds are pinged on
+    checkout, and connections idle longer than `max_idle` seconds are closed
+    (down to `min_size`).
+    """
+    
+    def __init__(self, connection_params: Dict[str, Any], min_size: int = 1, max_size: int = 10,
+                 timeout: float = 30.0, max_idle: float = 300.0, health_check_after: float = 30.0):
+        self.connection_params = connection_params
+        self.min_size = max(0, min_size)
+        self.max_size = max(1, max_size, self.min_size)
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.health_check_after = health_check_after
+        
+        self._cond = threading.Condition()
+        self._idle = []  # [(connection, last_used_monotonic)], most recently used last
+        self._size = 0  # Open physical connections (idle + in use + being opened)
+        self._in_use = 0
+        self._closed = False
+        self._stats = {
+            'checkouts': 0,
+            'waits': 0,
+            'timeouts': 0,
+            'connections_created': 0,
+            'connections_recycled': 0,
+            'health_check_failures': 0,
+            'checkout_time_total': 0.0,
+            'checkout_time_max': 0.0,
+            'wait_time_total': 0.0,
+        }
+    
+    def _connect(self):
+        """Open a new physical connection and apply the session settings once"""
+        conn = psycopg2.connect(**self.connection_params)
+        try:
+            with conn.cursor() as cursor:
+                # Set timezone to Korean time for this session
+                cursor.execute("SET timezone = 'Asia/Seoul'")
+            conn.commit()
+        except Exception:
+            conn.close()
+            raise
+        with self._cond:
+            self._stats['connections_created'] += 1
+        return conn
+    
+    def _is_healthy(self, conn, last_used: float) -> bool:
+        """Check a pooled connection before handing it out"""
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception:
+            return False
+    
+    def _recycle_idle_locked(self):
+        """Close connections idle for longer than max_idle (caller holds the lock)"""
+        now = time.monotonic()
+        keep = []
+        # Oldest connections sit at the front of the idle list
+        for conn, last_used in self._idle:
+            if now - last_used > self.max_idle and self._size > self.min_size:
+                self._size -= 1
+                self._stats['connections_recycled'] += 1
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            else:
+                keep.append((conn, last_used))
+        self._idle = keep
+    
+    def warm(self):
+        """Open connections up to min_size"""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                    self._cond.notify()
+                raise
+            with self._cond:
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+    
+    def getconn(self):
+        """Check out a connection, waiting up to `timeout` seconds if the pool is exhausted"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        conn, last_used = None, None
+        
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("connection pool is closed")
+                self._recycle_idle_locked()
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    raise PoolError(f"connection pool exhausted ({self.max_size} connections in use)")
+                if not waited:
+                    self._stats['waits'] += 1
+                    waited = True
+                self._cond.wait(remaining)
+            self._in_use += 1
+            if waited:
+                self._stats['wait_time_total'] += time.monotonic() - started
+        
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                with self._cond:
+                    self._stats['health_check_failures'] += 1
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+        
+        elapsed = time.monotonic() - started
+        with self._cond:
+            self._stats['checkouts'] += 1
+            self._stats['checkout_time_total'] += elapsed
+            self._stats['checkout_time_max'] = max(self._stats['checkout_time_max'], elapsed)
+        return conn
+    
+    def putconn(self, conn, discard: bool = False):
+        """Return a connection to the pool (closing it if broken or discarded)"""
+        if not discard and not conn.closed:
+            try:
+                if conn.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                discard = True
+        
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed or self._closed:
+                self._size -= 1
+                close_conn = True
+            else:
+                self._idle.append((conn, time.monotonic()))
+                close_conn = False
+            self._cond.notify()
+        
+        if close_conn and not conn.closed:
+            try:
+                conn.close()
+            except Exception:
+                pass
+    
+    def close(self):
+        """Close all idle connections and refuse further checkouts"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except Exception:
+                pass
+    
+    def stats(self) -> Dict[str, Any]:
+        """Current pool usage and checkout latency statistics"""
+        with self._cond:
+            checkouts = self._stats['checkouts']
+            waits = self._stats['waits']
+            return {
+                'size': self._size,
+                'in_use': self._in_use,
+                'idle': len(self._idle),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'checkouts': checkouts,
+                'waits': waits,
+                'timeouts': self._stats['timeouts'],
+                'connections_created': self._stats['connections_created'],
+                'connections_recycled': self._stats['connections_recycled'],
+                'health_check_failures': self._stats['health_check_failures'],
+                'avg_checkout_ms': (self._stats['checkout_time_total'] / checkouts * 1000) if checkouts else 0.0,
+                'max_checkout_ms': self._stats['checkout_time_max'] * 1000,
+                'avg_wait_ms': (self._stats['wait_time_total'] / waits * 1000) if waits else 0.0,
+            }
+
+
+class ProductSnapshotCache:
+    """Snapshot of query results shared by every call within one page render
+    
+    Snapshots only live inside request_scope() (one Streamlit rerun); outside a scope,
+    and inside db.transaction(), every call goes to the database. Writes call
+    invalidate(), which bumps a process-wide generation so a snapshot taken before
+    the write is never served after it, in any session.
+    """
+    
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+    
+    @contextmanager
+    def request_scope(self):
+        """Cache snapshots for the duration of the block (nested scopes join the outer one)"""
+        if getattr(self._local, 'entries', None) is not None:
+            yield self
+            return
+        
+        self._local.entries = {}
+        try:
+            yield self
+        finally:
+            self._local.entries = None
+    
+    def get(self, key: str, loader, bypass: bool = False):
+        """Return the snapshot for key, calling loader() at most once per scope and generation"""
+        entries = getattr(self._local, 'entries', None)
+        if entries is None or bypass:
+            return loader()
+        
+        generation = self._generation
+        entry = entries.get(key)
+        if entry is not None and entry[0] == generation:
+            self._stats['hits'] += 1
+            return list(entry[1])
+        
+        self._stats['misses'] += 1
+        rows = loader()
+        # Skip storing if a write landed while loading
+        if generation == self._generation:
+            entries[key] = (generation, rows)
+        return list(rows)
+    
+    def invalidate(self):
+        """Drop every snapshot (call after any write to the cached tables)"""
+        with self._lock:
+            self._generation += 1
+            self._stats['invalidations'] += 1
+    
+    def stats(self) -> Dict[str, int]:
+        return dict(self._stats)
+
+
+class SharedCache:
+    """Process-wide cache of per-SKU query results, shared by every session
+    
+    Entries live for `ttl` seconds but are only used while `is_enabled()` is true
+    (the change listener is connected), so evictions driven by NOTIFY keep them
+    consistent with writes made by other processes. Keys are (name, sku); the sku
+    '*' holds whole-table results and is evicted together with any SKU of that name.
+    """
+    
+    ALL = '*'
+    
+    def __init__(self, ttl: float, is_enabled):
+        self.ttl = ttl
+        self.is_enabled = is_enabled
+        self._lock = threading.Lock()
+        self._entries = {}  # (name, sku) -> (expires_monotonic, value)
+        self._generation = 0
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+    
+    def get(self, name: str, sku: str, loader):
+        """Cached value for (name, sku), loading it when missing or expired"""
+        if not self.is_enabled():
+            return loader()
+        
+        key = (name, sku)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._stats['hits'] += 1
+                value = entry[1]
+                return list(value) if isinstance(value, list) else value
+            self._stats['misses'] += 1
+            generation = self._generation
+        
+        value = loader()
+        with self._lock:
+            # An eviction while loading means the value may already be stale
+            if generation == self._generation:
+                self._entries[key] = (now + self.ttl, value)
+        return list(value) if isinstance(value, list) else value
+    
+    def evict(self, names, skus=None):
+        """Drop entries of the given names for skus (None = every SKU)"""
+        names = set(names)
+        skus = None if skus is None else set(skus) | {self.ALL}
+        with self._lock:
+            self._generation += 1
+            stale = [key for key in self._entries
+                     if key[0] in names and (skus is None or key[1] in skus)]
+            for key in stale:
+                del self._entries[key]
+            self._stats['evictions'] += len(stale)
+    
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._stats['evictions'] += len(self._entries)
+            self._entries = {}
+    
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._stats, size=len(self._entries))
+
+
+class ChangeListener:
+    """Background thread LISTENing on the change channel of the schema triggers
+    
+    Handlers are called as handler(table, op, skus) from the listener thread.
+    `skus` is None when every row may have changed; after a (re)connect handlers
+    get (None, 'reconnect', None) since notifications may have been missed.
+    """
+    
+    def __init__(self, connection_params: Dict[str, Any], channel: str,
+                 poll_interval: float = 10.0, max_backoff: float = 60.0):
+        self.connection_params = connection_params
+        self.channel = channel
+        self.poll_interval = poll_interval
+        self.max_backoff = max_backoff
+        self._handlers = []
+        self._thread = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._listening = threading.Event()
+        self._stats = {'notifications': 0, 'reconnects': 0, 'errors': 0}
+    
+    @property
+    def listening(self) -> bool:
+        """True while the LISTEN connection is up"""
+        return self._listening.is_set()
+    
+    def subscribe(self, handler):
+        with self._lock:
+            if handler not in self._handlers:
+                self._handlers.append(handler)
+    
+    def start(self):
+        """Start the listener thread (no-op if already running)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='db-change-listener', daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+        self._listening.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        return dict(self._stats, listening=self.listening)
+    
+    def _dispatch(self, table, op, skus):
+        for handler in list(self._handlers):
+            try:
+                handler(table, op, skus)
+            except Exception as e:
+                print(f"Change handler error: {str(e)}")
+    
+    def _handle_payload(self, payload: str):
+        try:
+            message = json.loads(payload)
+            table, op, skus = message.get('table'), message.get('op'), message.get('skus')
+        except (ValueError, AttributeError):
+            table, op, skus = None, 'unknown', None
+        self._stats['notifications'] += 1
+        self._dispatch(table, op, skus)
+    
+    def _run(self):
+        backoff = 1.0
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.connection_params)
+                conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel}")
+                self._listening.set()
+                self._dispatch(None, 'reconnect', None)
+                backoff = 1.0
+                
+                while not self._stop.is_set():
+                    ready, _, _ = select.select([conn], [], [], self.poll_interval)
+                    if not ready:
+                        # Quiet period: make sure the connection is still alive
+                        with conn.cursor() as cursor:
+                            cursor.execute("SELECT 1")
+                    conn.poll()
+                    while conn.notifies:
+                        self._handle_payload(conn.notifies.pop(0).payload)
+            except Exception as e:
+                self._stats['errors'] += 1
+                print(f"Change listener error (retrying in {backoff:.0f}s): {str(e)}")
+            finally:
+                was_listening = self._listening.is_set()
+                self._listening.clear()
+                if was_listening:
+                    self._stats['reconnects'] += 1
+                    # Caches must not outlive the connection that keeps them consistent
+                    self._dispatch(None, 'disconnect', None)
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            
+            if self._stop.wait(backoff):
+                break
+            backoff = min(backoff * 2, self.max_backoff)
+
+
 class DatabaseConnection:
     """PostgreSQL database connection manager"""
     
@@ -24,32 +486,141 @@ class DatabaseConnection:
             'user': os.getenv('DB_USER', 'difyuser'),
             'password': os.getenv('DB_PASSWORD', '')
         }
+        self.pool_settings = {
+            'min_size': _env_number('DB_POOL_MIN_SIZE', 1),
+            'max_size': _env_number('DB_POOL_MAX_SIZE', 10),
+            'timeout': _env_number('DB_POOL_TIMEOUT', 30.0, float),
+            'max_idle': _env_number('DB_POOL_MAX_IDLE', 300.0, float),
+            'health_check_after': _env_number('DB_POOL_HEALTH_CHECK_AFTER', 30.0, float),
+        }
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        self._local = threading.local()  # Per-thread connection of an open transaction()
+        self.change_listener = ChangeListener(self.connection_params, CHANGE_CHANNEL)
+    
+    @property
+    def pool(self) -> ConnectionPool:
+        """Connection pool, created on first use"""
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    pool = ConnectionPool(self.connection_params, **self.pool_settings)
+                    try:
+                        pool.warm()
+                    except Exception as e:
+                        print(f"Connection pool warm-up failed: {str(e)}")
+                    self._ensure_schema(pool)
+                    self._pool = pool
+        return self._pool
+    
+    def _ensure_schema(self, pool: ConnectionPool):
+        """Create the sequences/indexes the queries rely on (once per process)"""
+        try:
+            conn = pool.getconn()
+        except Exception as e:
+            print(f"Schema setup skipped: {str(e)}")
+            return
+        try:
+            apply_schema(conn)
+        except Exception as e:
+            print(f"Schema setup failed: {str(e)}")
+        finally:
+            pool.putconn(conn)
+    
+    def start_change_listener(self):
+        """Start listening for table changes so shared caches can be used (idempotent)
+        
+        Set DB_CHANGE_LISTENER=off to disable; shared caches then always query.
+        """
+        if os.getenv('DB_CHANGE_LISTENER', 'on').lower() in ('off', '0', 'false'):
+            return
+        self.change_listener.start()
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        """Pool statistics (in use, waits, checkout latency) for sizing under load"""
+        return self.pool.stats()
+    
+    def close_pool(self):
+        """Close all pooled connections (a new pool is created on next use)"""
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool:
+            pool.close()
     
     @contextmanager
     def get_connection(self):
-        """Context manager for database connections"""
+        """Context manager for pooled database connections"""
         conn = None
+        discard = False
         try:
-            conn = psycopg2.connect(**self.connection_params)
+            conn = self.pool.getconn()
             yield conn
         except Exception as e:
             if conn:
-                conn.rollback()
+                try:
+                    conn.rollback()
+                except Exception:
+                    discard = True
+                if isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+                    discard = True
             st.error(f"Database connection error: {str(e)}")
             raise
         finally:
             if conn:
-                conn.close()
+                self.pool.putconn(conn, discard=discard)
+    
+    @property
+    def in_transaction(self) -> bool:
+        """True when the current thread is inside a transaction() block"""
+        return getattr(self._local, 'conn', None) is not None
+    
+    @contextmanager
+    def transaction(self):
+        """Unit of work: every query issued inside shares one connection and one commit
+        
+        Usage:
+            with db.transaction():
+                ProductQueries.process_inventory_in(master_sku, quantity)
+                ShipmentQueries.insert_shipment_receipt(master_sku, '입고', quantity, user_id)
+        
+        Any exception rolls the whole block back. Nested blocks join the outer transaction.
+        """
+        if self.in_transaction:
+            yield self
+            return
+        
+        with self.get_connection() as conn:
+            self._local.conn = conn
+            try:
+                yield self
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                self._local.conn = None
+                # Snapshots loaded by other threads while this block was open may predate it
+                invalidate_products()
     
     @contextmanager
     def get_cursor(self, dict_cursor=True):
         """Context manager for database cursor"""
+        cursor_factory = RealDictCursor if dict_cursor else None
+        
+        tx_conn = getattr(self._local, 'conn', None)
+        if tx_conn is not None:
+            # Inside transaction(): commit/rollback happens when the block exits
+            cursor = tx_conn.cursor(cursor_factory=cursor_factory)
+            try:
+                yield cursor
+            finally:
+                cursor.close()
+            return
+        
         with self.get_connection() as conn:
-            cursor_factory = RealDictCursor if dict_cursor else None
             cursor = conn.cursor(cursor_factory=cursor_factory)
             try:
-                # Set timezone to Korean time for this session
-                cursor.execute("SET timezone = 'Asia/Seoul'")
+                # Session timezone (Asia/Seoul) is set once per pooled connection
                 yield cursor
                 conn.commit()
             except Exception as e:
@@ -79,6 +650,47 @@ class DatabaseConnection:
 # Singleton instance
 db = DatabaseConnection()
 
+# Product snapshots for one page render (see ProductSnapshotCache)
+product_cache = ProductSnapshotCache()
+
+# Per-SKU results shared across sessions, kept consistent by db.change_listener
+shared_cache = SharedCache(
+    ttl=_env_number('DB_SHARED_CACHE_TTL', 300.0, float),
+    is_enabled=lambda: db.change_listener.listening
+)
+
+# Watched table -> shared cache names holding its rows
+CACHES_BY_TABLE = {
+    'playauto_product_inventory': ('product', 'all_products'),
+    'playauto_product_category': ('product', 'all_products', 'bom'),
+    BOM_TABLE: ('bom',),
+    'playauto_copy_shipment_receipt': ('shipments',),
+    'playauto_predictions': ('adjusted_prediction',),
+}
+
+
+def invalidate_products(skus: Optional[List[str]] = None):
+    """Drop cached product rows after a local write (skus None = all products)"""
+    product_cache.invalidate()
+    shared_cache.evict(CACHES_BY_TABLE['playauto_product_inventory'], skus)
+
+
+def _on_table_change(table, op, skus):
+    """Evict cached rows for the SKUs a write touched (called by the change listener)"""
+    if table is None:
+        # (Re)connect or disconnect: notifications may have been missed
+        shared_cache.clear()
+        product_cache.invalidate()
+        return
+    
+    names = CACHES_BY_TABLE.get(table, ())
+    shared_cache.evict(names, skus)
+    if 'all_products' in names:
+        product_cache.invalidate()
+
+
+db.change_listener.subscribe(_on_table_change)
+
 # Member-related queries
 class MemberQueries:
     @staticmethod
@@ -164,7 +776,31 @@ class ProductQueries:
             ON pi.마스터_sku = pc.master_SKU
         ORDER BY pi.플레이오토_sku
         """
-        return db.execute_query(query)
+        # At most one query per page render; reads inside a transaction see its own writes
+        return product_cache.get(
+            'all_products',
+            lambda: shared_cache.get('all_products', SharedCache.ALL, lambda: db.execute_query(query)),
+            bypass=db.in_transaction
+        )
+    
+    @staticmethod
+    def get_products_by_skus(skus: List[str]):
+        """get_all_products() rows of the given master SKUs only (not cached)"""
+        query = """
+        SELECT 
+            pi.마스터_sku, pi.플레이오토_sku,
+            pi.상품명, pi.카테고리, pi.세트유무, 
+            pi.출고량, pi.입고량, pi.현재재고, 
+            pi.리드타임, pi.최소주문수량, pi.안전재고, 
+            pi.제조사, pi.소비기한,
+            COALESCE(pc.multiple, 1) as 배수
+        FROM playauto_product_inventory pi
+        LEFT JOIN playauto_product_category pc 
+            ON pi.마스터_sku = pc.master_SKU
+        WHERE pi.마스터_sku = ANY(%s)
+        ORDER BY pi.플레이오토_sku
+        """
+        return db.execute_query(query, (list(skus),))
     
     @staticmethod
     def get_products_by_category(category: str):
@@ -190,7 +826,10 @@ class ProductQueries:
         query = """
         SELECT * FROM playauto_product_inventory WHERE 마스터_sku = %s
         """
-        results = db.execute_query(query, (master_sku,))
+        if db.in_transaction:
+            results = db.execute_query(query, (master_sku,))
+        else:
+            results = shared_cache.get('product', master_sku, lambda: db.execute_query(query, (master_sku,)))
         return results[0] if results else None
     
     @staticmethod
@@ -211,7 +850,9 @@ class ProductQueries:
         (마스터_sku, 플레이오토_sku, 상품명, 카테고리, 세트유무, 현재재고, 출고량, 입고량, 리드타임, 최소주문수량, 안전재고, 제조사, 소비기한, 등록한_회원_id)
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
         """
-        return db.execute_update(query, (master_sku, playauto_sku, product_name, category, is_set, current_stock, 0, 0, lead_time, moq, safety_stock, supplier, expiration, user_id))
+        result = db.execute_update(query, (master_sku, playauto_sku, product_name, category, is_set, current_stock, 0, 0, lead_time, moq, safety_stock, supplier, expiration, user_id))
+        invalidate_products([master_sku])
+        return result
     
     @staticmethod
     def set_product_info(master_sku: str, playauto_sku: str, product_name: str, is_set: str, multiple: int, category: str, category_mid: str, category_low: str):
@@ -220,7 +861,39 @@ class ProductQueries:
         (master_SKU, playauto_SKU, product_name, is_set, multiple, category, category_mid, category_low) 
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
         """
-        return db.execute_update(query, (master_sku, playauto_sku, product_name, is_set, multiple, category, category_mid, category_low))
+        result = db.execute_update(query, (master_sku, playauto_sku, product_name, is_set, multiple, category, category_mid, category_low))
+        invalidate_products([master_sku])
+        return result
+    
+    @staticmethod
+    def get_bom_rows():
+        """Set -> component rows with the set's 출고 배수 (multiple), for utils.bom"""
+        query = f"""
+        SELECT b.set_sku, b.component_sku, b.quantity::float as quantity, COALESCE(pc.multiple, 1) as multiple
+        FROM {BOM_TABLE} b
+        LEFT JOIN playauto_product_category pc
+            ON b.set_sku = pc.master_SKU
+        ORDER BY b.set_sku, b.component_sku
+        """
+        return shared_cache.get('bom', SharedCache.ALL, lambda: db.execute_query(query))
+    
+    @staticmethod
+    def set_bom_components(set_sku: str, components: Dict[str, Optional[float]]):
+        """
+        Replace the components of a set
+        
+        Args:
+            set_sku: Master SKU of the set
+            components: Component master SKU -> units per set (None = the set's 배수)
+        """
+        with db.transaction():
+            db.execute_update(f"DELETE FROM {BOM_TABLE} WHERE set_sku = %s", (set_sku,))
+            if components:
+                db.execute_many(
+                    f"INSERT INTO {BOM_TABLE} (set_sku, component_sku, quantity) VALUES (%s, %s, %s)",
+                    [(set_sku, component, quantity) for component, quantity in components.items()]
+                )
+        shared_cache.evict(('bom',))
     
     @staticmethod
     def update_product(master_sku: str, **kwargs):
@@ -242,7 +915,9 @@ class ProductQueries:
         SET {', '.join(update_fields)}
         WHERE 마스터_sku = %s
         """
-        return db.execute_update(query, tuple(params))
+        result = db.execute_update(query, tuple(params))
+        invalidate_products([master_sku])
+        return result
     
     @staticmethod
     def process_inventory_in(master_sku: str, quantity: int):  # 제고 테이블 입고량 업데이트
@@ -253,7 +928,9 @@ class ProductQueries:
             현재재고 = 현재재고 + %s
         WHERE 마스터_sku = %s
         """
-        return db.execute_update(query, (quantity, quantity, master_sku))
+        result = db.execute_update(query, (quantity, quantity, master_sku))
+        invalidate_products([master_sku])
+        return result
     
     @staticmethod
     def process_inventory_out(master_sku: str, quantity: int):  # 제고 테이블 출고량 업데이트
@@ -264,7 +941,9 @@ class ProductQueries:
             현재재고 = 현재재고 - %s
         WHERE 마스터_sku = %s AND 현재재고 >= %s
         """
-        return db.execute_update(query, (quantity, quantity, master_sku, quantity))
+        result = db.execute_update(query, (quantity, quantity, master_sku, quantity))
+        invalidate_products([master_sku])
+        return result
     
     @staticmethod
     def adjust_inventory(master_sku: str, new_stock_level: int):  # 현재 재고 업데이트
@@ -274,7 +953,9 @@ class ProductQueries:
         SET 현재재고 = %s
         WHERE 마스터_sku = %s
         """
-        return db.execute_update(query, (new_stock_level, master_sku))
+        result = db.execute_update(query, (new_stock_level, master_sku))
+        invalidate_products([master_sku])
+        return result
     
     @staticmethod
     def adjust_history(master_sku: str, current_stock: int, new_stock_level: int, reason: str, name: str, id: str):
@@ -331,6 +1012,109 @@ class ShipmentQueries:
         """
         return db.execute_query(query)
     
+    @staticmethod
+    def _inv_inout_filters(direction: str, product_name: str = None, manufacturer: str = None,
+                           start_date=None, end_date=None):
+        """WHERE conditions and params shared by the edit-grid page and count queries"""
+        conditions = ["a.입출고_여부 = %s"]
+        params = [direction]
+        
+        product_conditions = []
+        for column, term in (('상품명', product_name), ('제조사', manufacturer)):
+            if term and term.strip():
+                # Partial, case-insensitive match; %/_ typed by the user are literal
+                escaped = term.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+                product_conditions.append(f"{column} ILIKE %s")
+                params.append(f"%{escaped}%")
+        if product_conditions:
+            conditions.append(f"""a.마스터_SKU IN (
+                SELECT 마스터_sku FROM playauto_product_inventory
+                WHERE {' AND '.join(product_conditions)}
+            )""")
+        
+        if start_date:
+            conditions.append("a.시점 >= %s::date")
+            params.append(start_date)
+        if end_date:
+            conditions.append("a.시점 < %s::date + 1")
+            params.append(end_date)
+        return conditions, params
+    
+    @staticmethod
+    def get_inv_inout_page(direction: str, product_name: str = None, manufacturer: str = None,
+                           start_date=None, end_date=None, after=None, limit: int = 200):
+        """One page of receipts for the edit grid, newest first (keyset pagination)
+        
+        Args:
+            direction: '입고' or '출고'
+            after: next_cursor of the previous page ((시점, inv_code)); None for the first page
+        
+        Returns:
+            Dictionary with 'rows' and 'next_cursor' (None on the last page)
+        """
+        conditions, params = ShipmentQueries._inv_inout_filters(
+            direction, product_name, manufacturer, start_date, end_date
+        )
+        if after:
+            conditions.append("(a.시점, a.inv_code) < (%s, %s)")
+            params.extend(after)
+        
+        query = f"""
+        SELECT 
+            a.inv_code, a.마스터_SKU, b.상품명, b.제조사, a.입출고_여부, a.수량, a.시점, a.작업자_id 
+        FROM playauto_copy_shipment_receipt a 
+        INNER JOIN playauto_product_inventory b 
+        ON a.마스터_SKU = b.마스터_SKU
+        WHERE {' AND '.join(conditions)}
+        ORDER BY a.시점 DESC, a.inv_code DESC
+        LIMIT %s
+        """
+        rows = db.execute_query(query, tuple(params) + (limit + 1,))
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = (rows[-1]['시점'], rows[-1]['inv_code'])
+        return {'rows': rows, 'next_cursor': next_cursor}
+    
+    @staticmethod
+    def count_inv_inout(direction: str, product_name: str = None, manufacturer: str = None,
+                        start_date=None, end_date=None, exact_below: int = 10000):
+        """Number of receipts matching the edit-grid filters
+        
+        Uses the planner's row estimate; counts exactly when the estimate is below exact_below.
+        
+        Returns:
+            Tuple of (count, is_exact)
+        """
+        conditions, params = ShipmentQueries._inv_inout_filters(
+            direction, product_name, manufacturer, start_date, end_date
+        )
+        from_where = f"""
+        FROM playauto_copy_shipment_receipt a 
+        INNER JOIN playauto_product_inventory b 
+        ON a.마스터_SKU = b.마스터_SKU
+        WHERE {' AND '.join(conditions)}
+        """
+        plan = db.execute_query(f"EXPLAIN (FORMAT JSON) SELECT 1 {from_where}", tuple(params))
+        estimate = int(plan[0]['QUERY PLAN'][0]['Plan']['Plan Rows'])
+        if estimate >= exact_below:
+            return estimate, False
+        
+        result = db.execute_query(f"SELECT COUNT(*) as cnt {from_where}", tuple(params))
+        return int(result[0]['cnt']), True
+    
+    @staticmethod
+    def get_inv_inout_date_range(direction: str):
+        """First and last receipt time for one direction (index min/max lookups)"""
+        query = """
+        SELECT MIN(시점) as first_time, MAX(시점) as last_time
+        FROM playauto_copy_shipment_receipt
+        WHERE 입출고_여부 = %s
+        """
+        result = db.execute_query(query, (direction,))
+        return result[0] if result else {'first_time': None, 'last_time': None}
+    
     @staticmethod
     def insert_edit_request(inv_code, master_sku, product_name, manufacturer, 
                            inout_type, old_qty, new_qty, old_date, new_date,
@@ -363,113 +1147,175 @@ class ShipmentQueries:
         return db.execute_query(query)
     
     @staticmethod
-    def get_monthly_shipment_summary():
-        """Get shipment data aggregated by month for the last 6 months"""
-        query = """
-        WITH monthly_data AS (
-            SELECT 
-                p.마스터_sku,
-                p.상품명,
-                EXTRACT(YEAR FROM sr.시점) as year,
-                EXTRACT(MONTH FROM sr.시점) as month,
-                SUM(CASE WHEN sr.입출고_여부 = '출고' THEN sr.수량 ELSE 0 END) as 월별출고량
-            FROM playauto_product_inventory p
-            LEFT JOIN playauto_shipment_receipt sr ON p.마스터_sku = sr.마스터_SKU
-            WHERE sr.시점 >= CURRENT_DATE - INTERVAL '6 months'
-                AND sr.입출고_여부 = '출고'
-            GROUP BY p.마스터_sku, p.상품명, 
-                     EXTRACT(YEAR FROM sr.시점), EXTRACT(MONTH FROM sr.시점)
-        )
-        SELECT 
-            마스터_sku,
-            상품명,
-            SUM(CASE WHEN CURRENT_DATE - INTERVAL '6 months' <= make_date(year::int, month::int, 1) 
-                     AND make_date(year::int, month::int, 1) < CURRENT_DATE - INTERVAL '5 months' 
-                     THEN 월별출고량 ELSE 0 END) as 출고량_5개월전,
-            SUM(CASE WHEN CURRENT_DATE - INTERVAL '5 months' <= make_date(year::int, month::int, 1) 
-                     AND make_date(year::int, month::int, 1) < CURRENT_DATE - INTERVAL '4 months' 
-                     THEN 월별출고량 ELSE 0 END) as 출고량_4개월전,
-            SUM(CASE WHEN CURRENT_DATE - INTERVAL '4 months' <= make_date(year::int, month::int, 1) 
-                     AND make_date(year::int, month::int, 1) < CURRENT_DATE - INTERVAL '3 months' 
-                     THEN 월별출고량 ELSE 0 END) as 출고량_3개월전,
-            SUM(CASE WHEN CURRENT_DATE - INTERVAL '3 months' <= make_date(year::int, month::int, 1) 
-                     AND make_date(year::int, month::int, 1) < CURRENT_DATE - INTERVAL '2 months' 
-                     THEN 월별출고량 ELSE 0 END) as 출고량_2개월전,
-            SUM(CASE WHEN CURRENT_DATE - INTERVAL '2 months' <= make_date(year::int, month::int, 1) 
-                     AND make_date(year::int, month::int, 1) < CURRENT_DATE - INTERVAL '1 month' 
-                     THEN 월별출고량 ELSE 0 END) as 출고량_1개월전,
-            SUM(CASE WHEN EXTRACT(YEAR FROM CURRENT_DATE) = year::int 
-                    AND EXTRACT(MONTH FROM CURRENT_DATE) = month::int
-                    THEN 월별출고량 ELSE 0 END) as 출고량_현재월
-        FROM monthly_data
-        GROUP BY 마스터_sku, 상품명
-        ORDER BY 마스터_sku
+    def _rollup_filters(master_sku: str = None, start_date=None, end_date=None):
+        """WHERE clause and params for the daily rollup (dates inclusive)"""
+        conditions = []
+        params = []
+        if master_sku:
+            conditions.append("마스터_sku = %s")
+            params.append(master_sku)
+        if start_date:
+            conditions.append("day >= %s")
+            params.append(start_date)
+        if end_date:
+            conditions.append("day <= %s")
+            params.append(end_date)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        return where, tuple(params)
+    
+    @staticmethod
+    def get_daily_shipments(start_date=None, end_date=None, master_sku: str = None):
+        """Daily 입고/출고 totals per SKU from the rollup table"""
+        where, params = ShipmentQueries._rollup_filters(master_sku, start_date, end_date)
+        query = f"""
+        SELECT 마스터_sku, day, in_qty, out_qty
+        FROM {SHIPMENT_DAILY_TABLE}
+        {where}
+        ORDER BY 마스터_sku, day
         """
-        return db.execute_query(query)
+        return db.execute_query(query, params)
     
     @staticmethod
-    def generate_inv_code(master_sku: str, transaction_type: str, transaction_datetime=None):
-        """Generate inv_code for inventory transactions"""
-        from datetime import datetime
-        
-        # Determine the transaction datetime
-        if transaction_datetime:
-            if isinstance(transaction_datetime, str):
-                dt = datetime.strptime(transaction_datetime, '%Y-%m-%d %H:%M:%S')
-            else:
-                dt = transaction_datetime
-        else:
-            # Get current Korean time
-            query = "SELECT CURRENT_TIMESTAMP AT TIME ZONE 'Asia/Seoul' as now"
-            result = db.execute_query(query)
-            dt = result[0]['now']
+    def get_monthly_shipments(master_sku: str = None, start_date=None, end_date=None):
+        """Monthly 입고/출고 totals per SKU from the rollup table (month = first day of month, out_days = days with 출고)"""
+        where, params = ShipmentQueries._rollup_filters(master_sku, start_date, end_date)
+        query = f"""
+        SELECT 마스터_sku, DATE_TRUNC('month', day)::date as month,
+               SUM(in_qty)::bigint as in_qty, SUM(out_qty)::bigint as out_qty,
+               COUNT(*) FILTER (WHERE out_qty > 0)::int as out_days
+        FROM {SHIPMENT_DAILY_TABLE}
+        {where}
+        GROUP BY 마스터_sku, DATE_TRUNC('month', day)
+        ORDER BY 마스터_sku, month
+        """
+        return db.execute_query(query, params)
+    
+    @staticmethod
+    def get_training_watermarks(before):
+        """
+        Per-SKU watermark of the data a forecast was trained on
         
-        # Format the datetime part
-        dt_str = dt.strftime('%y%m%d%H%M%S')
+        last_time / last_inv_code / receipt_count cover 출고 receipts before `before`;
+        adjust_hash changes whenever an edit request is decided (approved or rejected).
+        """
+        query = """
+        SELECT r.마스터_sku, r.last_time, r.last_inv_code, r.receipt_count, a.adjust_hash
+        FROM (
+            SELECT 마스터_sku, MAX(시점) as last_time, MAX(inv_code) as last_inv_code, COUNT(*) as receipt_count
+            FROM playauto_copy_shipment_receipt
+            WHERE 입출고_여부 = '출고' AND 시점 < %s
+            GROUP BY 마스터_sku
+        ) r
+        LEFT JOIN (
+            SELECT 마스터_sku,
+                   md5(string_agg(concat_ws('|', inv_code, 수량_new, 시점_new, 승인), ','
+                                  ORDER BY inv_code, 시점_new, 승인)) as adjust_hash
+            FROM playauto_inNout_adjust
+            WHERE 승인 IS DISTINCT FROM '승인대기'
+            GROUP BY 마스터_sku
+        ) a ON a.마스터_sku = r.마스터_sku
+        """
+        return db.execute_query(query, (before,))
+    
+    @staticmethod
+    def get_shipment_date_range():
+        """First and last day with outbound quantity in the rollup"""
+        query = f"""
+        SELECT MIN(day) as first_day, MAX(day) as last_day
+        FROM {SHIPMENT_DAILY_TABLE}
+        WHERE out_qty > 0
+        """
+        result = db.execute_query(query)
+        return result[0] if result else {'first_day': None, 'last_day': None}
+    
+    @staticmethod
+    def rebuild_daily_rollup(start_date=None, end_date=None):
+        """Recompute the daily rollup from the receipt ledger (whole history or a date range)"""
+        conditions = []
+        params = []
+        if start_date:
+            conditions.append("시점 >= %s::date")
+            params.append(start_date)
+        if end_date:
+            conditions.append("시점 < %s::date + 1")
+            params.append(end_date)
+        ledger_where = ''.join(f" AND {c}" for c in conditions)
+        rollup_where, rollup_params = ShipmentQueries._rollup_filters(None, start_date, end_date)
         
-        # Convert transaction type to 'in' or 'out'
-        trans_type = 'in' if transaction_type == '입고' else 'out'
+        with db.transaction():
+            # Hold off receipt writes so the rollup triggers and the rebuild cannot interleave
+            db.execute_update("LOCK TABLE playauto_copy_shipment_receipt IN SHARE MODE")
+            db.execute_update(f"DELETE FROM {SHIPMENT_DAILY_TABLE} {rollup_where}", rollup_params)
+            return db.execute_update(f"""
+            INSERT INTO {SHIPMENT_DAILY_TABLE} (마스터_sku, day, in_qty, out_qty)
+            {shipment_daily_rows('playauto_copy_shipment_receipt', where=ledger_where)}
+            """, tuple(params))
+    
+    @staticmethod
+    def monthly_summary_columns(months: int = 6) -> List[str]:
+        """Pivot columns of get_monthly_shipment_summary, oldest month first"""
+        return [f"출고량_{k}개월전" for k in range(months - 1, 0, -1)] + ['출고량_현재월']
+    
+    @staticmethod
+    def get_monthly_shipment_summary(months: int = 6):
+        """Outbound quantity per product for the last `months` calendar months (current month included)
         
-        # Get the count of existing transactions for this second
-        count_query = """
-        SELECT COUNT(*) + 1 as next_num
-        FROM playauto_copy_shipment_receipt
-        WHERE 마스터_SKU = %s 
-        AND 입출고_여부 = %s
-        AND DATE_TRUNC('second', 시점) = DATE_TRUNC('second', %s::timestamp)
+        Every filter is a plain range on 시점, so the (입출고_여부, 시점, 마스터_SKU)
+        index limits the scan to the window instead of the whole ledger.
         """
+        months = max(1, int(months))
+        current_month = "DATE_TRUNC('month', CURRENT_DATE)::timestamp"
+        pivot_columns = []
+        for k, column in zip(range(months - 1, -1, -1), ShipmentQueries.monthly_summary_columns(months)):
+            pivot_columns.append(f"""
+            COALESCE(SUM(r.수량) FILTER (
+                WHERE r.시점 >= {current_month} - INTERVAL '{k} months'
+                AND r.시점 < {current_month} - INTERVAL '{k - 1} months'
+            ), 0) as {column}""")
         
-        result = db.execute_query(count_query, (master_sku, transaction_type, dt))
-        next_num = result[0]['next_num'] if result else 1
-        
-        # Generate the inv_code
-        inv_code = f"{master_sku}-{trans_type}-{dt_str}-{str(next_num).zfill(3)}"
+        query = f"""
+        SELECT 
+            p.마스터_sku,
+            p.상품명,{','.join(pivot_columns)}
+        FROM playauto_copy_shipment_receipt r
+        JOIN playauto_product_inventory p ON p.마스터_sku = r.마스터_SKU
+        WHERE r.입출고_여부 = '출고'
+            AND r.시점 >= {current_month} - INTERVAL '{months - 1} months'
+            AND r.시점 < {current_month} + INTERVAL '1 month'
+        GROUP BY p.마스터_sku, p.상품명
+        ORDER BY p.마스터_sku
+        """
+        return db.execute_query(query)
+    
+    @staticmethod
+    def inv_code_sql(sku_expr: str, type_expr: str, timestamp_expr: str) -> str:
+        """SQL expression that builds inv_code inside an INSERT ({sku}-{in|out}-{yymmddHHMMSS}-{nnn})
         
-        return inv_code
+        The suffix comes from a sequence cycling through 001-999, so codes are unique
+        across concurrent writers (up to 999 receipts per second) without reading
+        existing receipts.
+        """
+        return (
+            f"{sku_expr} || '-' || CASE WHEN {type_expr} = '입고' THEN 'in' ELSE 'out' END"
+            f" || '-' || TO_CHAR({timestamp_expr}, 'YYMMDDHH24MISS')"
+            f" || '-' || {INV_CODE_SUFFIX_FUNCTION}()"
+        )
     
     @staticmethod
     def insert_shipment_receipt(master_sku: str, transaction_type: str, quantity: int, id: str, inv_code: str = None, transaction_datetime=None):
-        """Insert a new shipment receipt with optional custom datetime"""
-        # Generate inv_code if not provided
-        if not inv_code:
-            inv_code = ShipmentQueries.generate_inv_code(master_sku, transaction_type, transaction_datetime)
-        
-        if transaction_datetime:
-            # Use provided datetime
-            query = """
-            INSERT INTO playauto_copy_shipment_receipt 
-            (마스터_SKU, 입출고_여부, 수량, 시점, 작업자_id, inv_code)
-            VALUES (%s, %s, %s, %s, %s, %s)
-            """
-            return db.execute_update(query, (master_sku, transaction_type, quantity, transaction_datetime, id, inv_code))
-        else:
-            # Use current timestamp with Korean timezone
-            query = """
-            INSERT INTO playauto_copy_shipment_receipt 
-            (마스터_SKU, 입출고_여부, 수량, 시점, 작업자_id, inv_code)
-            VALUES (%s, %s, %s, CURRENT_TIMESTAMP AT TIME ZONE 'Asia/Seoul', %s, %s)
-            """
-            return db.execute_update(query, (master_sku, transaction_type, quantity, id, inv_code))
+        """Insert a new shipment receipt with optional custom datetime
+        
+        inv_code is built by the INSERT itself unless one is given.
+        """
+        # Use provided datetime, otherwise current timestamp with Korean timezone
+        query = f"""
+        INSERT INTO playauto_copy_shipment_receipt 
+        (마스터_SKU, 입출고_여부, 수량, 시점, 작업자_id, inv_code)
+        SELECT v.sku, v.type, v.qty, v.ts, v.id, COALESCE(v.inv_code, {ShipmentQueries.inv_code_sql('v.sku', 'v.type', 'v.ts')})
+        FROM (VALUES (%s, %s, %s, COALESCE(%s::timestamp, CURRENT_TIMESTAMP AT TIME ZONE 'Asia/Seoul'), %s, %s))
+            AS v(sku, type, qty, ts, id, inv_code)
+        """
+        return db.execute_update(query, (master_sku, transaction_type, quantity, transaction_datetime, id, inv_code))
     
     @staticmethod
     def get_total_monthly_shipments():
@@ -597,9 +1443,11 @@ class PredictionQueries:
         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
         RETURNING 예측결과_id
         """
-        return db.execute_query(query, (master_sku, pred_1month, pred_2month, pred_3month,
-                                        adjusted_1month, adjusted_2month, adjusted_3month,
-                                        reason, edited_by))
+        result = db.execute_query(query, (master_sku, pred_1month, pred_2month, pred_3month,
+                                          adjusted_1month, adjusted_2month, adjusted_3month,
+                                          reason, edited_by))
+        shared_cache.evict(CACHES_BY_TABLE['playauto_predictions'], [master_sku])
+        return result
     
     @staticmethod
     def get_latest_adjustment(master_sku: str):
@@ -624,4 +1472,174 @@ class PredictionQueries:
         WHERE adjusted_1month IS NOT NULL AND 마스터_sku = %s
         ORDER BY 마스터_sku, edited_at DESC
         """
-        return db.execute_query(query, (master_sku,))
+        return shared_cache.get('adjusted_prediction', master_sku, lambda: db.execute_query(query, (master_sku,)))
+
+
+class AlertQueries:
+    """Materialized alert state (see utils.alert_worker)"""
+    
+    # pg_advisory_xact_lock key serializing alert state updates across processes
+    LOCK_KEY = 7243017
+    
+    @staticmethod
+    def lock_alert_states():
+        """Hold the alert state lock until the surrounding db.transaction() ends"""
+        db.execute_query("SELECT pg_advisory_xact_lock(%s) AS locked", (AlertQueries.LOCK_KEY,))
+    
+    @staticmethod
+    def get_alert_states(skus: Optional[List[str]] = None):
+        """Stored alert rows of the given SKUs (None = all), resolved ones included"""
+        query = f"""
+        SELECT 마스터_sku, alert_type, severity, state, message, details, content_hash,
+               first_seen, last_seen, updated_at, resolved_at,
+               notified_severity, notified_state, notified_at
+        FROM {ACTIVE_ALERTS_TABLE}
+        """
+        if skus is None:
+            return db.execute_query(query)
+        return db.execute_query(query + " WHERE 마스터_sku = ANY(%s)", (list(skus),))
+    
+    @staticmethod
+    def get_active_alerts():
+        """Unresolved alerts, most recently changed first"""
+        query = f"""
+        SELECT 마스터_sku, alert_type, severity, state, message, details,
+               first_seen, last_seen, updated_at
+        FROM {ACTIVE_ALERTS_TABLE}
+        WHERE state <> 'resolved'
+        ORDER BY updated_at DESC, 마스터_sku, alert_type
+        """
+        return db.execute_query(query)
+    
+    @staticmethod
+    def save_alert_states(rows: List[Dict[str, Any]]):
+        """Upsert alert rows (마스터_sku, alert_type, severity, state, message, details, content_hash, first_seen, resolved_at)"""
+        if not rows:
+            return 0
+        query = f"""
+        INSERT INTO {ACTIVE_ALERTS_TABLE} AS a
+            (마스터_sku, alert_type, severity, state, message, details, content_hash,
+             first_seen, last_seen, updated_at, resolved_at)
+        VALUES (%s, %s, %s, %s, %s, %s::jsonb, %s, %s, now(), now(), %s)
+        ON CONFLICT (마스터_sku, alert_type) DO UPDATE
+        SET severity = EXCLUDED.severity,
+            state = EXCLUDED.state,
+            message = EXCLUDED.message,
+            details = EXCLUDED.details,
+            content_hash = EXCLUDED.content_hash,
+            first_seen = EXCLUDED.first_seen,
+            last_seen = CASE WHEN EXCLUDED.state = 'resolved' THEN a.last_seen ELSE now() END,
+            updated_at = now(),
+            resolved_at = EXCLUDED.resolved_at
+        """
+        return db.execute_many(query, [
+            (row['마스터_sku'], row['alert_type'], row['severity'], row['state'], row.get('message'),
+             json.dumps(row.get('details'), ensure_ascii=False, default=str), row.get('content_hash'),
+             row['first_seen'], row.get('resolved_at'))
+            for row in rows
+        ])
+    
+    @staticmethod
+    def _update_keys(assignments: str, keys: List[tuple]):
+        """Run one UPDATE ... SET assignments over (마스터_sku, alert_type) keys"""
+        if not keys:
+            return 0
+        query = f"""
+        UPDATE {ACTIVE_ALERTS_TABLE} AS a
+        SET {assignments}
+        FROM unnest(%s::text[], %s::text[]) AS k(마스터_sku, alert_type)
+        WHERE a.마스터_sku = k.마스터_sku AND a.alert_type = k.alert_type
+        """
+        return db.execute_update(query, ([key[0] for key in keys], [key[1] for key in keys]))
+    
+    @staticmethod
+    def touch_alerts(keys: List[tuple]):
+        """Record that unchanged alerts were raised again (last_seen only)"""
+        return AlertQueries._update_keys("last_seen = now()", keys)
+    
+    @staticmethod
+    def mark_notified(keys: List[tuple]):
+        """Record the current severity/state of alerts as emailed"""
+        return AlertQueries._update_keys(
+            "notified_severity = a.severity, notified_state = a.state, notified_at = now()", keys)
+
+
+class MailQueries:
+    """Outbound email queue (see utils.mail_outbox)"""
+    
+    @staticmethod
+    def queue_mail(recipient: str, subject: str, html: str) -> int:
+        """Add a message to the outbox; returns its id"""
+        query = f"""
+        INSERT INTO {MAIL_OUTBOX_TABLE} (recipient, subject, html)
+        VALUES (%s, %s, %s)
+        RETURNING id
+        """
+        return db.execute_query(query, (recipient, subject, html))[0]['id']
+    
+    @staticmethod
+    def claim_mail(limit: int, stale_seconds: float):
+        """
+        Mark up to `limit` due messages as 'sending' and return them
+        
+        Due: pending with next_attempt_at reached, or claimed more than stale_seconds ago
+        by a sender that never reported back. Rows claimed by another sender are skipped.
+        """
+        query = f"""
+        UPDATE {MAIL_OUTBOX_TABLE} AS o
+        SET status = 'sending', claimed_at = now(), attempts = o.attempts + 1
+        FROM (
+            SELECT id FROM {MAIL_OUTBOX_TABLE}
+            WHERE (status = 'pending' AND next_attempt_at <= now())
+               OR (status = 'sending' AND claimed_at < now() - make_interval(secs => %s))
+            ORDER BY next_attempt_at, id
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        ) AS due
+        WHERE o.id = due.id
+        RETURNING o.id, o.recipient, o.subject, o.html, o.attempts
+        """
+        return db.execute_query(query, (stale_seconds, limit))
+    
+    @staticmethod
+    def mark_mail_sent(ids: List[int]):
+        if not ids:
+            return 0
+        query = f"""
+        UPDATE {MAIL_OUTBOX_TABLE}
+        SET status = 'sent', sent_at = now(), claimed_at = NULL, last_error = NULL
+        WHERE id = ANY(%s)
+        """
+        return db.execute_update(query, (list(ids),))
+    
+    @staticmethod
+    def mark_mail_failed(rows: List[tuple]):
+        """Record failed attempts: (id, error, retry delay in seconds or None to give up)"""
+        if not rows:
+            return 0
+        query = f"""
+        UPDATE {MAIL_OUTBOX_TABLE}
+        SET status = CASE WHEN %s::float8 IS NULL THEN 'failed' ELSE 'pending' END,
+            next_attempt_at = now() + make_interval(secs => COALESCE(%s::float8, 0)),
+            claimed_at = NULL,
+            last_error = %s
+        WHERE id = %s
+        """
+        return db.execute_many(query, [(delay, delay, error, mail_id) for mail_id, error, delay in rows])
+    
+    @staticmethod
+    def get_recent_mail(limit: int = 20):
+        """Most recently queued messages with their delivery status"""
+        query = f"""
+        SELECT id, recipient, subject, status, attempts, last_error, created_at, sent_at, next_attempt_at
+        FROM {MAIL_OUTBOX_TABLE}
+        ORDER BY id DESC
+        LIMIT %s
+        """
+        return db.execute_query(query, (limit,))
+    
+    @staticmethod
+    def get_outbox_counts():
+        """Number of messages per status"""
+        query = f"SELECT status, COUNT(*) AS count FROM {MAIL_OUTBOX_TABLE} GROUP BY status"
+        return {row['status']: row['count'] for row in db.execute_query(query)}
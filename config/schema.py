@@ -0,0 +1,365 @@
+# Schema objects the app relies on beyond the base tables.
+# Every statement is idempotent; they are applied once per process when the
+# connection pool is created (see DatabaseConnection.pool).
+
+# Sequence numbering inv_code suffixes ({sku}-{in|out}-{yymmddHHMMSS}-{nnn}). It cycles
+# through 001-999: the timestamp already separates codes, so the suffix only has to tell
+# apart receipts of the same SKU within one second
+INV_CODE_SEQUENCE = 'playauto_inv_code_seq'
+# Next inv_code suffix, zero-padded to 3 digits
+INV_CODE_SUFFIX_FUNCTION = 'playauto_inv_code_suffix'
+
+# NOTIFY channel carrying {"table", "op", "skus"} for every write to a watched table.
+# "skus" is null when the list would not fit in a notification (treat as "all SKUs").
+CHANGE_CHANNEL = 'playauto_changes'
+
+# Set -> component bill of materials (see utils.bom). quantity is component units per
+# set; NULL means the set is `multiple` units of a single component.
+BOM_TABLE = 'playauto_product_bom'
+
+_BOM_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {BOM_TABLE} (
+    set_sku TEXT NOT NULL,
+    component_sku TEXT NOT NULL,
+    quantity NUMERIC CHECK (quantity > 0),
+    PRIMARY KEY (set_sku, component_sku)
+)
+"""
+
+# Materialized alert state per (SKU, alert type), kept up to date by utils.alert_worker.
+# state: 'new' when first raised, 'escalated' when its severity went up, 'resolved' once
+# the rule no longer fires (a resolved alert raised again starts over as 'new').
+ACTIVE_ALERTS_TABLE = 'playauto_active_alerts'
+
+_ACTIVE_ALERTS_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {ACTIVE_ALERTS_TABLE} (
+    마스터_sku TEXT NOT NULL,
+    alert_type TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    state TEXT NOT NULL CHECK (state IN ('new', 'escalated', 'resolved')),
+    message TEXT,
+    details JSONB,
+    first_seen TIMESTAMPTZ NOT NULL DEFAULT now(),
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    resolved_at TIMESTAMPTZ,
+    PRIMARY KEY (마스터_sku, alert_type)
+)
+"""
+
+# Digest bookkeeping: content_hash identifies the alert content (severity + details),
+# last_seen is the last evaluation that raised it, notified_* what was last emailed
+_ACTIVE_ALERTS_DIGEST_COLUMNS = f"""
+ALTER TABLE {ACTIVE_ALERTS_TABLE}
+    ADD COLUMN IF NOT EXISTS content_hash TEXT,
+    ADD COLUMN IF NOT EXISTS last_seen TIMESTAMPTZ NOT NULL DEFAULT now(),
+    ADD COLUMN IF NOT EXISTS notified_severity TEXT,
+    ADD COLUMN IF NOT EXISTS notified_state TEXT,
+    ADD COLUMN IF NOT EXISTS notified_at TIMESTAMPTZ
+"""
+
+# Outbound email queue drained by utils.mail_outbox. status: 'pending' until sent (or
+# retried after a failure at next_attempt_at), 'sending' while a sender holds it, then
+# 'sent' or 'failed' (after the last attempt).
+MAIL_OUTBOX_TABLE = 'playauto_mail_outbox'
+
+_MAIL_OUTBOX_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {MAIL_OUTBOX_TABLE} (
+    id BIGSERIAL PRIMARY KEY,
+    recipient TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    html TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'sending', 'sent', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    claimed_at TIMESTAMPTZ,
+    last_error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+    sent_at TIMESTAMPTZ
+)
+"""
+
+_MAIL_OUTBOX_INDEX = f"""
+CREATE INDEX IF NOT EXISTS {MAIL_OUTBOX_TABLE}_due_idx
+ON {MAIL_OUTBOX_TABLE} (next_attempt_at) WHERE status IN ('pending', 'sending')
+"""
+
+# Watched table -> column holding the master SKU
+CHANGE_TABLES = {
+    'playauto_product_inventory': '마스터_sku',
+    'playauto_product_category': 'master_sku',
+    BOM_TABLE: 'set_sku',
+    'playauto_copy_shipment_receipt': '마스터_sku',
+    'playauto_predictions': '마스터_sku',
+}
+
+_NOTIFY_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION playauto_notify_change() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    skus text[];
+    payload text;
+BEGIN
+    -- One notification per statement, listing the distinct SKUs it touched
+    IF TG_OP = 'INSERT' THEN
+        EXECUTE format('SELECT array_agg(DISTINCT %1$I::text) FROM new_rows', TG_ARGV[0]) INTO skus;
+    ELSIF TG_OP = 'DELETE' THEN
+        EXECUTE format('SELECT array_agg(DISTINCT %1$I::text) FROM old_rows', TG_ARGV[0]) INTO skus;
+    ELSE
+        EXECUTE format('SELECT array_agg(DISTINCT s) FROM (SELECT %1$I::text AS s FROM new_rows '
+                       'UNION SELECT %1$I::text FROM old_rows) t', TG_ARGV[0]) INTO skus;
+    END IF;
+
+    IF skus IS NULL THEN
+        RETURN NULL;  -- statement touched no rows
+    END IF;
+
+    payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'skus', skus)::text;
+    IF octet_length(payload) > 7000 THEN
+        -- NOTIFY payloads are limited to 8000 bytes
+        payload := json_build_object('table', TG_TABLE_NAME, 'op', TG_OP, 'skus', NULL)::text;
+    END IF;
+
+    PERFORM pg_notify('{CHANGE_CHANNEL}', payload);
+    RETURN NULL;
+END
+$$
+"""
+
+
+# Daily 입고/출고 totals per SKU, maintained by triggers on the receipt ledger
+SHIPMENT_DAILY_TABLE = 'playauto_shipment_daily'
+
+_SHIPMENT_DAILY_TABLE = f"""
+CREATE TABLE IF NOT EXISTS {SHIPMENT_DAILY_TABLE} (
+    마스터_sku TEXT NOT NULL,
+    day DATE NOT NULL,
+    in_qty BIGINT NOT NULL DEFAULT 0,
+    out_qty BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (마스터_sku, day)
+)
+"""
+
+
+def shipment_daily_rows(source: str, sign: int = 1, where: str = '') -> str:
+    """SELECT of (마스터_sku, day, in_qty, out_qty) summed from receipt rows in `source`"""
+    return f"""
+        SELECT 마스터_sku, 시점::date AS day,
+               {sign} * SUM(CASE WHEN 입출고_여부 = '입고' THEN COALESCE(수량, 0) ELSE 0 END) AS in_qty,
+               {sign} * SUM(CASE WHEN 입출고_여부 = '출고' THEN COALESCE(수량, 0) ELSE 0 END) AS out_qty
+        FROM {source}
+        WHERE 시점 IS NOT NULL AND 마스터_sku IS NOT NULL {where}
+        GROUP BY 1, 2
+    """
+
+
+def _rollup_upsert(changes: str) -> str:
+    return f"""
+        INSERT INTO {SHIPMENT_DAILY_TABLE} AS d (마스터_sku, day, in_qty, out_qty)
+        SELECT 마스터_sku, day, SUM(in_qty), SUM(out_qty)
+        FROM ({changes}) changes
+        GROUP BY 1, 2
+        ORDER BY 1, 2
+        ON CONFLICT (마스터_sku, day) DO UPDATE
+        SET in_qty = d.in_qty + EXCLUDED.in_qty,
+            out_qty = d.out_qty + EXCLUDED.out_qty;
+    """
+
+
+_ROLLUP_FUNCTION = f"""
+CREATE OR REPLACE FUNCTION playauto_shipment_rollup() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    -- One upsert per statement; an edit moves its quantity from the old day/SKU to the new one
+    IF TG_OP = 'INSERT' THEN
+        {_rollup_upsert(shipment_daily_rows('new_rows'))}
+    ELSIF TG_OP = 'DELETE' THEN
+        {_rollup_upsert(shipment_daily_rows('old_rows', -1))}
+    ELSE
+        {_rollup_upsert(shipment_daily_rows('new_rows') + ' UNION ALL ' + shipment_daily_rows('old_rows', -1))}
+    END IF;
+    RETURN NULL;
+END
+$$
+"""
+
+# Initial fill; runs in the same transaction that creates the triggers, so no receipt is
+# counted twice or missed. Later repairs: python -m utils.shipment_rollup
+_ROLLUP_BACKFILL = f"""
+INSERT INTO {SHIPMENT_DAILY_TABLE} (마스터_sku, day, in_qty, out_qty)
+{shipment_daily_rows('playauto_copy_shipment_receipt')}
+HAVING NOT EXISTS (SELECT 1 FROM {SHIPMENT_DAILY_TABLE})
+"""
+
+
+_TRANSITION_TABLES = {
+    'INSERT': 'NEW TABLE AS new_rows',
+    'UPDATE': 'NEW TABLE AS new_rows OLD TABLE AS old_rows',
+    'DELETE': 'OLD TABLE AS old_rows',
+}
+
+
+def _statement_trigger(name: str, table: str, op: str, function_call: str) -> str:
+    """Create a statement-level trigger with transition tables unless it already exists"""
+    return f"""
+    DO $$
+    BEGIN
+        IF NOT EXISTS (
+            SELECT 1 FROM pg_trigger
+            WHERE tgname = '{name}' AND tgrelid = '{table}'::regclass
+        ) THEN
+            CREATE TRIGGER {name}
+            AFTER {op} ON {table}
+            REFERENCING {_TRANSITION_TABLES[op]}
+            FOR EACH STATEMENT EXECUTE PROCEDURE {function_call};
+        END IF;
+    END
+    $$
+    """
+
+
+def _notify_trigger(table: str, sku_column: str, op: str) -> str:
+    """Statement-level trigger publishing the SKUs changed by one INSERT/UPDATE/DELETE"""
+    return _statement_trigger(f"{table}_notify_{op.lower()}", table, op,
+                              f"playauto_notify_change('{sku_column}')")
+
+
+SCHEMA_STATEMENTS = [
+    ('inv_code_sequence', f"""
+    CREATE SEQUENCE IF NOT EXISTS {INV_CODE_SEQUENCE} START WITH 1 MINVALUE 1 MAXVALUE 999 CYCLE
+    """),
+    # Sequences created before it cycled: bound them (restarting at 1 if already past 999)
+    ('inv_code_sequence_cycle', f"""
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_sequence
+                   WHERE seqrelid = '{INV_CODE_SEQUENCE}'::regclass AND (seqmax <> 999 OR NOT seqcycle)) THEN
+            IF (SELECT last_value FROM {INV_CODE_SEQUENCE}) > 999 THEN
+                ALTER SEQUENCE {INV_CODE_SEQUENCE} MAXVALUE 999 CYCLE RESTART WITH 1;
+            ELSE
+                ALTER SEQUENCE {INV_CODE_SEQUENCE} MAXVALUE 999 CYCLE;
+            END IF;
+        END IF;
+    END
+    $$
+    """),
+    ('inv_code_suffix_function', f"""
+    CREATE OR REPLACE FUNCTION {INV_CODE_SUFFIX_FUNCTION}() RETURNS text
+    LANGUAGE sql VOLATILE AS $$
+        SELECT lpad(nextval('{INV_CODE_SEQUENCE}')::text, 3, '0')
+    $$
+    """),
+    ('notify_change_function', _NOTIFY_FUNCTION),
+    ('bom_table', _BOM_TABLE),
+    ('active_alerts_table', _ACTIVE_ALERTS_TABLE),
+    ('active_alerts_digest_columns', _ACTIVE_ALERTS_DIGEST_COLUMNS),
+    ('mail_outbox_table', _MAIL_OUTBOX_TABLE),
+    ('mail_outbox_index', _MAIL_OUTBOX_INDEX),
+] + [
+    (f"{table}_notify_{op.lower()}", _notify_trigger(table, sku_column, op))
+    for table, sku_column in CHANGE_TABLES.items()
+    for op in ('INSERT', 'UPDATE', 'DELETE')
+] + [
+    ('shipment_daily_table', _SHIPMENT_DAILY_TABLE),
+    ('shipment_rollup_function', _ROLLUP_FUNCTION),
+] + [
+    (f"shipment_rollup_{op.lower()}", _statement_trigger(
+        f"playauto_copy_shipment_receipt_rollup_{op.lower()}", 'playauto_copy_shipment_receipt', op,
+        'playauto_shipment_rollup()'))
+    for op in ('INSERT', 'UPDATE', 'DELETE')
+] + [
+    ('shipment_daily_backfill', _ROLLUP_BACKFILL),
+]
+
+# Indexes on large tables. They are built with CONCURRENTLY (no write lock, but not
+# allowed inside a transaction), so they are not applied at startup; run
+#     python -m config.schema
+# once per database to create them.
+INDEX_STATEMENTS = [
+    # Range scans over outbound (or inbound) receipts by time, e.g. get_monthly_shipment_summary
+    ('receipt_direction_time_idx', """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS playauto_copy_shipment_receipt_direction_time_idx
+    ON playauto_copy_shipment_receipt (입출고_여부, 시점, 마스터_SKU) INCLUDE (수량)
+    """),
+    # Keyset pagination of the edit grid: ORDER BY 시점 DESC, inv_code DESC per direction
+    ('receipt_direction_time_code_idx', """
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS playauto_copy_shipment_receipt_direction_time_code_idx
+    ON playauto_copy_shipment_receipt (입출고_여부, 시점, inv_code)
+    """),
+]
+
+# Advisory lock key serializing schema setup across app/scheduler processes
+SCHEMA_LOCK_KEY = 'playauto_schema'
+
+
+def apply_schema(conn):
+    """
+    Apply SCHEMA_STATEMENTS on the given connection in one transaction
+
+    A failing statement (e.g. a table missing in this database) is skipped
+    without undoing the others.
+
+    Args:
+        conn: Open psycopg2 connection (committed or rolled back on return)
+
+    Returns:
+        Number of statements applied
+    """
+    applied = 0
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s))", (SCHEMA_LOCK_KEY,))
+            for name, statement in SCHEMA_STATEMENTS:
+                cursor.execute("SAVEPOINT schema_statement")
+                try:
+                    cursor.execute(statement)
+                    cursor.execute("RELEASE SAVEPOINT schema_statement")
+                    applied += 1
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT schema_statement")
+                    print(f"Schema statement '{name}' skipped: {str(e)}")
+        conn.commit()
+        return applied
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def create_indexes(conn):
+    """
+    Create INDEX_STATEMENTS (CONCURRENTLY, one statement per implicit transaction)
+
+    Args:
+        conn: Open psycopg2 connection; switched to autocommit for the duration
+
+    Returns:
+        Number of indexes created or already present
+    """
+    created = 0
+    autocommit = conn.autocommit
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cursor:
+            for name, statement in INDEX_STATEMENTS:
+                try:
+                    cursor.execute(statement)
+                    created += 1
+                    print(f"Index '{name}' ready")
+                except Exception as e:
+                    # A failed CONCURRENTLY build leaves an INVALID index: drop it and re-run
+                    print(f"Index '{name}' failed: {str(e)}")
+    finally:
+        conn.autocommit = autocommit
+    return created
+
+
+# Migration entry point: python -m config.schema
+if __name__ == "__main__":
+    import psycopg2
+    from config.database import db
+
+    conn = psycopg2.connect(**db.connection_params)
+    try:
+        print(f"Schema statements applied: {apply_schema(conn)}/{len(SCHEMA_STATEMENTS)}")
+        print(f"Indexes ready: {create_indexes(conn)}/{len(INDEX_STATEMENTS)}")
+    finally:
+        conn.close()
@@ -36,6 +36,9 @@ DEFAULT_ALERT_SETTINGS = {
     'overstock_ratio': 200
 }
 
+# Shipment statistics: months shown in the monthly summary (current month included)
+SHIPMENT_SUMMARY_MONTHS = int(os.getenv('SHIPMENT_SUMMARY_MONTHS', 6))
+
 # Safety stock calculation
 SAFETY_STOCK_MULTIPLIER = 1.5  # Safety factor for stock calculation
 
@@ -0,0 +1,366 @@
+"""
+Inventory alert rules evaluated for the whole catalog at once
+
+One definition of the four alert types shared by the alert tab, the instant alert email
+and the daily scheduler:
+
+    재고 부족       stock below 안전재고 (긴급 under half of it), or expected to run out
+                    within stock_alert_days (주의)
+    발주 시점       batch_calculate_reorder_points urgency 긴급/주의, or the reorder point is
+                    reached within order_alert_days (주의)
+    소비기한 임박   소비기한 within expiry_alert_days (긴급 <= 7 days or expired,
+                    경고 <= 14, 주의 otherwise)
+    과잉 재고       stock more than 15% above daily usage x 리드타임 + 안전재고
+
+Daily usage comes from the forecast (mean of the next 3 months) and falls back to
+출고량 / 30 for SKUs without one. Every rule is a column operation over the product
+snapshot and the forecast matrix; evaluate_alerts returns one row per (SKU, 유형).
+
+    alerts = evaluate_alerts(products_df, forecasts.entries, stock_alert_days=10)
+    alert_records(alerts)                          # list of dicts for the alert email
+"""
+import hashlib
+import json
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.calculations import DAYS_PER_MONTH
+from utils.order_timing import batch_calculate_reorder_points, build_forecast_matrix
+
+ALERT_TYPES = ['재고 부족', '발주 시점', '소비기한 임박', '과잉 재고']
+# Types included in alert emails
+EMAIL_ALERT_TYPES = ['재고 부족', '발주 시점', '소비기한 임박']
+ALERT_COLUMNS = [
+    '유형', '마스터_sku', '제품', '상태', '메시지', '현재 재고량', '안전재고량', '리드타임',
+    '일일소비량', '재고소진일', '예상 소비일', '수요 추이', '안전재고량_예측기반', '권장발주량',
+    '소비기한', '남은 일수', '권장 조치', '과잉',
+]
+# Severity order of 상태 (alert state transitions escalate along it)
+SEVERITY_RANK = {'': 0, '주의': 1, '경고': 2, '긴급': 3}
+# Lead time assumed when a product has none
+DEFAULT_ALERT_LEAD_TIME = 30
+# Stock above the needed inventory by more than this fraction is 과잉 재고
+EXCESS_RATIO = 0.15
+
+# Products whose forecasts are stored under a short SKU instead of their 마스터_sku
+FORECAST_SKUS = {
+    '바이오밸런스': 'BIOBAL',
+    '풍성밸런스': 'PSBAL',  # AMPLEBAL
+    '클린밸런스': 'CLBAL',  # CLEANBAL
+    '뉴로마스터': 'NEUROMASTER',
+    '키네코어': 'KNCORE',  # KINECORE
+    '다래 케어': 'DARAECARE',
+    '선화이버': 'SF',  # SUNFIBER
+    '영데이즈': 'YOUNGDAYS',
+    '당당케어': 'DDCARE',
+    '칸디다웨이': 'KDDWAY',
+    '퓨어마그 펫': 'PMPKOR'
+}
+
+
+def numeric_column(products_df, column, default=0):
+    """Numbers of a snapshot column, also from strings with table formatting (e.g. '│ 120')"""
+    if column not in products_df.columns:
+        return np.full(len(products_df), float(default))
+    values = products_df[column]
+    if values.dtype == object:
+        values = values.astype(str).str.extract(r'(-?\d+\.?\d*)', expand=False).where(values.notna())
+    return pd.to_numeric(values, errors='coerce').fillna(default).to_numpy(dtype=float)
+
+
+def forecast_entries(products_df, predictions_dict):
+    """Forecast entry per 마스터_sku, looked up under FORECAST_SKUS[상품명] when missing"""
+    entries = {}
+    names = products_df['상품명'] if '상품명' in products_df.columns else pd.Series('', index=products_df.index)
+    for sku, name in zip(products_df['마스터_sku'], names):
+        key = sku if sku in predictions_dict else FORECAST_SKUS.get(name)
+        if key in predictions_dict:
+            entries[sku] = predictions_dict[key]
+    return entries
+
+
+def days_of_stock(stock, forecast, lengths):
+    """
+    Days until the stock is consumed along the monthly forecast path (the last forecast
+    month continues after the horizon); inf where nothing is consumed
+    """
+    n, horizon = forecast.shape
+    valid = np.arange(horizon)[None, :] < lengths[:, None]
+    monthly = np.where(valid, np.nan_to_num(forecast), 0.0)
+    consumed = np.cumsum(monthly, axis=1)
+    before = consumed - monthly
+
+    runs_out = valid & (consumed >= stock[:, None]) & (monthly > 0)
+    month = np.argmax(runs_out, axis=1)
+    rows = np.arange(n)
+    rate = monthly[rows, month] / DAYS_PER_MONTH
+    with np.errstate(invalid='ignore', divide='ignore'):
+        within = DAYS_PER_MONTH * month + (stock - before[rows, month]) / rate
+        last = np.maximum(lengths - 1, 0)
+        last_rate = monthly[rows, last] / DAYS_PER_MONTH
+        beyond = np.where(last_rate > 0,
+                          DAYS_PER_MONTH * lengths + (stock - consumed[rows, last]) / last_rate, np.inf)
+    days = np.where(runs_out.any(axis=1), within, beyond)
+    return np.where(stock <= 0, 0.0, days)
+
+
+def _rows(alert_type, mask, columns):
+    """DataFrame of one alert type from column arrays restricted to mask"""
+    frame = pd.DataFrame({name: np.asarray(values)[mask] if np.ndim(values) else values
+                          for name, values in columns.items()})
+    frame.insert(0, '유형', alert_type)
+    return frame
+
+
+def _days_text(days):
+    """Whole days as text ('N/A' where infinite)"""
+    finite = np.isfinite(days)
+    text = np.trunc(np.where(finite, days, 0)).astype(np.int64).astype(str).astype(object)
+    return np.where(finite, text, 'N/A')
+
+
+def evaluate_alerts(products_df, predictions_dict, stock_alert_days=10, order_alert_days=10, expiry_alert_days=30,
+                    service_level=0.95, now=None):
+    """
+    All alerts of the product snapshot
+
+    Args:
+        products_df: Snapshot of get_all_products() (마스터_sku, 상품명, 현재재고, 안전재고,
+            리드타임, 최소주문수량, 출고량, 소비기한)
+        predictions_dict: SKU -> forecast entry (e.g. ForecastSet.entries)
+        stock_alert_days: 재고 부족 when the stock runs out within this many days
+        order_alert_days: 발주 시점 when the reorder point is reached within this many days
+        expiry_alert_days: 소비기한 임박 within this many days
+        service_level: Service level of the forecast-based reorder point (None = buffer days)
+        now: Reference time (default: datetime.now())
+
+    Returns:
+        DataFrame with ALERT_COLUMNS, one row per (SKU, 유형), in ALERT_TYPES order
+    """
+    now = now or datetime.now()
+    products_df = products_df.reset_index(drop=True)
+    if not len(products_df):
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+
+    skus = products_df['마스터_sku'].astype(str).to_numpy()
+    names = products_df['상품명'].fillna('').astype(str).to_numpy() if '상품명' in products_df.columns else skus
+    stock = numeric_column(products_df, '현재재고', 0)
+    safety_stock = numeric_column(products_df, '안전재고', 0)
+    lead_time = numeric_column(products_df, '리드타임', DEFAULT_ALERT_LEAD_TIME)
+    outbound = numeric_column(products_df, '출고량', 0)
+
+    entries = forecast_entries(products_df, predictions_dict)
+    forecast, lengths = build_forecast_matrix(skus, entries)
+    has_forecast = lengths > 0
+    first_months = np.where(np.arange(forecast.shape[1])[None, :] < np.minimum(lengths, 3)[:, None],
+                            np.nan_to_num(forecast), 0.0)
+    forecast_daily = first_months.sum(axis=1) / np.maximum(np.minimum(lengths, 3), 1) / DAYS_PER_MONTH
+    daily_usage = np.where(has_forecast, forecast_daily, np.maximum(outbound, 0) / DAYS_PER_MONTH)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        simple_days = np.where(daily_usage > 0, np.maximum(stock, 0) / daily_usage, np.inf)
+    days_until_stockout = np.where(has_forecast, days_of_stock(stock, forecast, lengths), simple_days)
+    stockout_days = np.where(np.isfinite(days_until_stockout), np.trunc(days_until_stockout), np.nan)
+
+    base = {
+        '마스터_sku': skus,
+        '제품': names,
+        '현재 재고량': stock.astype(np.int64),
+        '안전재고량': safety_stock.astype(np.int64),
+        '리드타임': lead_time.astype(np.int64),
+        '일일소비량': np.round(daily_usage, 2),
+        '예상 소비일': stockout_days,
+    }
+    stock_text = stock.astype(np.int64).astype(str).astype(object)
+    safety_text = safety_stock.astype(np.int64).astype(str).astype(object)
+    frames = []
+
+    # 1. 재고 부족
+    below_half = (safety_stock > 0) & (stock < safety_stock * 0.5)
+    below = (safety_stock > 0) & (stock < safety_stock)
+    running_out = days_until_stockout <= stock_alert_days
+    days_msg = np.where(daily_usage > 0, " (예상 소진: " + _days_text(days_until_stockout) + "일)", "")
+    message = np.where(
+        below_half, "재고 " + stock_text + "개, 안전재고(" + safety_text + "개)의 50% 미만" + days_msg,
+        np.where(below, "재고 " + stock_text + "개, 안전재고(" + safety_text + "개) 미만" + days_msg,
+                 _days_text(days_until_stockout) + "일 후 재고 소진 예상")
+    )
+    mask = below | running_out
+    frames.append(_rows('재고 부족', mask, {
+        **base, '상태': np.where(below_half, '긴급', '주의'), '메시지': message, '재고소진일': stockout_days,
+    }))
+
+    # 2. 발주 시점 (longer lead times get a 20% larger buffer)
+    order_df = pd.DataFrame({
+        '마스터_sku': skus, '상품명': names, '현재재고': stock, '안전재고': safety_stock,
+        '리드타임': lead_time, '최소주문수량': numeric_column(products_df, '최소주문수량', 1),
+    })
+    reorder = batch_calculate_reorder_points(
+        order_df, entries, confidence_level=np.where(lead_time > 90, 1.2, 1.0), now=now, service_level=service_level
+    )
+    urgency = reorder['urgency'].to_numpy()
+    days_until_reorder = reorder['days_until_reorder'].to_numpy(dtype=float)
+    soon = (urgency == '정상') & (days_until_reorder <= order_alert_days)
+    mask = np.isin(urgency, ['긴급', '주의']) | soon
+    reorder_stockout = reorder['days_until_stockout'].to_numpy(dtype=float)
+    frames.append(_rows('발주 시점', mask, {
+        **base,
+        '상태': np.where(urgency == '긴급', '긴급', '주의'),
+        '메시지': np.where(soon, "발주점 도달 " + _days_text(days_until_reorder) + "일 전 - 발주 준비",
+                        reorder['order_status'].to_numpy()),
+        '일일소비량': np.round(reorder['avg_daily_consumption'].to_numpy(dtype=float), 2),
+        '재고소진일': np.where(np.isfinite(reorder_stockout), np.trunc(reorder_stockout), np.nan),
+        '수요 추이': reorder['demand_trend'].to_numpy(),
+        '안전재고량_예측기반': reorder['reorder_point'].to_numpy(dtype=float).astype(np.int64),
+        '권장발주량': reorder['recommended_qty'].to_numpy(dtype=float).astype(np.int64),
+    }))
+
+    # 3. 소비기한 임박
+    if '소비기한' in products_df.columns:
+        expiry = pd.to_datetime(products_df['소비기한'], errors='coerce')
+        days_left = (expiry.dt.normalize() - pd.Timestamp(now).normalize()).dt.days.to_numpy(dtype=float)
+        mask = ~np.isnan(days_left) & (days_left <= expiry_alert_days)
+        days_left = np.nan_to_num(days_left).astype(np.int64)
+        expired = days_left < 0
+        frames.append(_rows('소비기한 임박', mask, {
+            **base,
+            '상태': np.select([days_left <= 7, days_left <= 14], ['긴급', '경고'], default='주의'),
+            '메시지': np.where(expired, "소비기한 " + np.abs(days_left).astype(str).astype(object) + "일 경과 - 즉시 처리 필요",
+                            "소비기한 " + days_left.astype(str).astype(object) + "일 남음"),
+            '소비기한': expiry.dt.strftime('%Y-%m-%d').to_numpy(),
+            '남은 일수': days_left,
+            '권장 조치': np.where(expired, '즉시 폐기 또는 반품 처리', '판촉 진행 또는 폐기 준비'),
+        }))
+
+    # 4. 과잉 재고
+    needed = daily_usage * lead_time + safety_stock
+    excess = stock - needed
+    mask = (daily_usage > 0) & (excess > needed * EXCESS_RATIO)
+    frames.append(_rows('과잉 재고', mask, {
+        **base,
+        '상태': '주의',
+        '메시지': "필요재고량의(" + needed.astype(np.int64).astype(str).astype(object) + "개) 15% 초과",
+        '과잉': excess.astype(np.int64),
+    }))
+
+    frames = [frame for frame in frames if len(frame)]
+    if not frames:
+        return pd.DataFrame(columns=ALERT_COLUMNS)
+    return pd.concat(frames, ignore_index=True).reindex(columns=ALERT_COLUMNS)
+
+
+def _plain(value):
+    """Python scalar of a cell; whole-number floats (from NaN-padded columns) become ints"""
+    value = value.item() if isinstance(value, np.generic) else value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def alert_records(alerts):
+    """Alert rows as dicts without the fields that do not apply to their type (for emails)"""
+    return [{key: _plain(value) for key, value in row.items() if not pd.isna(value)}
+            for row in alerts.to_dict('records')]
+
+
+def alert_hash(severity, details):
+    """Content hash of an alert: equal hashes mean nothing worth re-rendering or re-sending"""
+    payload = json.dumps([severity, details], ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def alert_transitions(previous, alerts, now=None):
+    """
+    Alert state rows to store after re-evaluating some SKUs
+
+    A raised alert with no unresolved row is 'new', one whose 상태 got more severe is
+    'escalated', and an unresolved row whose alert is no longer raised is 'resolved'.
+    Other raised alerts keep their state and first_seen, with the current severity and
+    message; those whose content hash is unchanged are not rewritten at all.
+
+    Args:
+        previous: Stored rows (AlertQueries.get_alert_states) of the evaluated SKUs
+        alerts: evaluate_alerts() result for the same SKUs
+        now: Time of the evaluation, timezone-aware since it is stored in TIMESTAMPTZ
+            columns (default: now, in the local timezone)
+
+    Returns:
+        Tuple of (rows for AlertQueries.save_alert_states that differ from the stored
+        ones, each with 'transition' ('new' / 'escalated' / 'resolved', or None for
+        updates); (마스터_sku, alert_type) keys of unchanged raised alerts, whose
+        last_seen is all that needs updating)
+    """
+    now = now or datetime.now().astimezone()
+    stored = {(row['마스터_sku'], row['alert_type']): row for row in previous}
+    rows = []
+    unchanged = []
+    raised = set()
+    for alert in alert_records(alerts):
+        key = (alert['마스터_sku'], alert['유형'])
+        raised.add(key)
+        severity = alert.get('상태', '')
+        content_hash = alert_hash(severity, alert)
+        old = stored.get(key)
+        if old is None or old['state'] == 'resolved':
+            transition, state, first_seen = 'new', 'new', now
+        else:
+            if old.get('content_hash') == content_hash:
+                unchanged.append(key)
+                continue
+            escalated = SEVERITY_RANK.get(severity, 0) > SEVERITY_RANK.get(old['severity'], 0)
+            transition = 'escalated' if escalated else None
+            state = 'escalated' if escalated else old['state']
+            first_seen = old['first_seen']
+        rows.append({
+            '마스터_sku': key[0], 'alert_type': key[1], 'severity': severity, 'state': state,
+            'message': alert.get('메시지'), 'details': alert, 'content_hash': content_hash,
+            'first_seen': first_seen, 'resolved_at': None, 'transition': transition,
+        })
+
+    for key, old in stored.items():
+        if key not in raised and old['state'] != 'resolved':
+            rows.append({
+                **{name: old[name] for name in ('마스터_sku', 'alert_type', 'severity', 'message', 'details',
+                                                'content_hash', 'first_seen')},
+                'state': 'resolved', 'resolved_at': now, 'transition': 'resolved',
+            })
+    return rows, unchanged
+
+
+def alert_digest(rows):
+    """
+    Changes since the last notification, for the daily digest email
+
+    Compares each stored row with what was last emailed about it (notified_severity /
+    notified_state), so an alert is reported once when it appears, again only when it
+    gets more severe, and once when it is resolved. Alerts raised and resolved between
+    two digests are not reported; one resolved and raised again counts as new.
+
+    Args:
+        rows: AlertQueries.get_alert_states() rows
+
+    Returns:
+        Dict of 'new' / 'escalated' / 'resolved' -> rows, and 'notified' -> every
+        (마스터_sku, alert_type) whose notified state should be brought up to date
+    """
+    digest = {'new': [], 'escalated': [], 'resolved': [], 'notified': []}
+    for row in rows:
+        key = (row['마스터_sku'], row['alert_type'])
+        sent_state, sent_severity = row.get('notified_state'), row.get('notified_severity')
+        if row['state'] == 'resolved':
+            if sent_state is None or sent_state == 'resolved':
+                if sent_state is None:
+                    digest['notified'].append(key)
+                continue
+            digest['resolved'].append(row)
+        elif sent_state is None or sent_state == 'resolved' or row['first_seen'] > row['notified_at']:
+            # Never sent, or resolved (and possibly raised again) since it was
+            digest['new'].append(row)
+        elif SEVERITY_RANK.get(row['severity'], 0) > SEVERITY_RANK.get(sent_severity, 0):
+            digest['escalated'].append(row)
+        else:
+            continue
+        digest['notified'].append(key)
+    return digest
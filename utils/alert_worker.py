@@ -0,0 +1,253 @@
+"""
+Event-driven alert evaluation
+
+Every write to a watched table publishes the SKUs it touched (see config.schema); the
+AlertWorker queues those SKUs, waits `debounce` seconds so a burst of receipts becomes
+one batch, re-evaluates only the queued SKUs (utils.alert_engine) and stores the
+resulting state transitions in playauto_active_alerts:
+
+    receipt insert / 재고 조정 / 수정 승인   ->  SKUs queued  ->  new / escalated / resolved
+
+A (re)connect of the change listener queues every SKU, since notifications may have
+been missed meanwhile; BOM and category changes do too, as they move forecasts between
+SKUs, and so does a new forecast file. Subscribers are called after every batch with
+its transitions and SKUs; workers of several processes share the table, so a batch may
+find its changes already stored by another process (its transitions are then empty).
+
+The stored rows follow one set of thresholds (STOCK_ALERT_DAYS / ORDER_ALERT_DAYS /
+EXPIRY_ALERT_DAYS), so each process shares one worker (get_alert_worker) and the alert
+tab reads its rows instead of evaluating the catalog on every render.
+
+    python -m utils.alert_worker            # one full re-evaluation, printing the transitions
+"""
+import os
+import threading
+import time
+
+import pandas as pd
+
+from config.database import db, AlertQueries, ProductQueries
+from config.schema import BOM_TABLE
+from utils.alert_engine import alert_transitions, evaluate_alerts
+from utils.bom import load_component_forecasts
+
+# Watched tables whose changes re-evaluate the SKUs they touched
+ALERT_SKU_TABLES = ('playauto_product_inventory', 'playauto_copy_shipment_receipt', 'playauto_predictions')
+# Watched tables whose changes re-evaluate every SKU
+ALERT_ALL_TABLES = ('playauto_product_category', BOM_TABLE)
+# Seconds between checks for a new forecast file while idle
+FORECAST_CHECK_INTERVAL = 60
+# Threshold -> (environment variable, default)
+ALERT_THRESHOLD_ENV = {
+    'stock_alert_days': ('STOCK_ALERT_DAYS', 10),
+    'order_alert_days': ('ORDER_ALERT_DAYS', 10),
+    'expiry_alert_days': ('EXPIRY_ALERT_DAYS', 30),
+}
+
+
+def alert_thresholds():
+    """Alert thresholds from the environment (defaults for missing or malformed values)"""
+    thresholds = {}
+    for name, (key, default) in ALERT_THRESHOLD_ENV.items():
+        # Clean any formatting characters
+        value = str(os.getenv(key, '')).replace('│', '').replace('|', '').strip()
+        try:
+            thresholds[name] = int(value)
+        except ValueError:
+            thresholds[name] = default
+    return thresholds
+
+
+class AlertWorker:
+    """Background thread re-evaluating the alerts of changed SKUs"""
+
+    def __init__(self, stock_alert_days=10, order_alert_days=10, expiry_alert_days=30, debounce=2.0):
+        self.thresholds = {
+            'stock_alert_days': stock_alert_days,
+            'order_alert_days': order_alert_days,
+            'expiry_alert_days': expiry_alert_days,
+        }
+        self.debounce = debounce
+        self._pending = set()
+        self._pending_all = False
+        self._condition = threading.Condition()
+        self._handlers = []
+        self._thread = None
+        self._stop = threading.Event()
+        self._stats = {'batches': 0, 'skus': 0, 'transitions': 0, 'errors': 0}
+        # Forecast set of the last full run, and when it finished
+        self._forecasts = None
+        self._synced_at = None
+
+    def subscribe(self, handler):
+        """Call handler(transitions, skus) after every batch (skus None = every product)"""
+        if handler not in self._handlers:
+            self._handlers.append(handler)
+
+    def unsubscribe(self, handler):
+        if handler in self._handlers:
+            self._handlers.remove(handler)
+
+    def configure(self, **thresholds):
+        """Change thresholds; the stored rows are rebuilt for the new ones"""
+        updated = dict(self.thresholds, **thresholds)
+        if updated != self.thresholds:
+            self.thresholds = updated
+            self._synced_at = None
+            self.enqueue(None)
+
+    @property
+    def synced(self):
+        """True while the stored rows are current: a full run finished and the listener is up"""
+        return (self._synced_at is not None and self._thread is not None and self._thread.is_alive()
+                and db.change_listener.listening)
+
+    def enqueue(self, skus=None):
+        """Queue SKUs for re-evaluation (None = every SKU)"""
+        with self._condition:
+            if skus is None:
+                self._pending_all = True
+            else:
+                self._pending.update(skus)
+            self._condition.notify()
+
+    def on_table_change(self, table, op, skus):
+        """db.change_listener handler"""
+        if table is None:
+            if op == 'reconnect':
+                self.enqueue(None)
+        elif table in ALERT_SKU_TABLES:
+            self.enqueue(skus)
+        elif table in ALERT_ALL_TABLES:
+            self.enqueue(None)
+
+    def start(self):
+        """Start the worker and the change listener feeding it (no-op if already running)"""
+        if self._thread and self._thread.is_alive():
+            return
+        db.change_listener.subscribe(self.on_table_change)
+        db.start_change_listener()
+        self._stop.clear()
+        self.enqueue(None)
+        self._thread = threading.Thread(target=self._run, name='alert-worker', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        with self._condition:
+            self._condition.notify()
+        if self._thread:
+            self._thread.join(timeout=10)
+
+    def stats(self):
+        with self._condition:
+            return dict(self._stats, pending='all' if self._pending_all else len(self._pending))
+
+    def _forecasts_changed(self):
+        if self._forecasts is None:
+            return False
+        try:
+            return load_component_forecasts() is not self._forecasts
+        except Exception as e:
+            print(f"Forecast check failed: {str(e)}")
+            return False
+
+    def _take(self):
+        """Wait for queued SKUs; returns (all?, skus) or None when stopping"""
+        while True:
+            with self._condition:
+                if self._stop.is_set() or self._pending or self._pending_all:
+                    break
+                self._condition.wait(FORECAST_CHECK_INTERVAL)
+                if self._stop.is_set() or self._pending or self._pending_all:
+                    break
+            if self._forecasts_changed():
+                self.enqueue(None)
+        if self._stop.is_set():
+            return None
+        # Let a burst of writes land in the same batch
+        self._stop.wait(self.debounce)
+        with self._condition:
+            batch = (self._pending_all, self._pending)
+            self._pending, self._pending_all = set(), False
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._take()
+            if batch is None:
+                break
+            everything, skus = batch
+            try:
+                self.process(None if everything else skus)
+            except Exception as e:
+                self._stats['errors'] += 1
+                print(f"Alert evaluation failed: {str(e)}")
+                # Try again with the next batch
+                self.enqueue(None if everything else skus)
+                self._stop.wait(self.debounce * 5)
+
+    def process(self, skus=None, notify=True):
+        """
+        Re-evaluate the alerts of SKUs (None = every product) and store the transitions
+
+        Alerts whose content hash is unchanged only get their last_seen updated.
+
+        Args:
+            skus: SKUs to re-evaluate (None = every product)
+            notify: Call the subscribed handlers
+
+        Returns:
+            Transition rows that were stored (see alert_engine.alert_transitions)
+        """
+        if skus is not None and not skus:
+            return []
+        thresholds = self.thresholds
+        forecasts = load_component_forecasts()
+        products = ProductQueries.get_all_products() if skus is None else ProductQueries.get_products_by_skus(skus)
+        products_df = pd.DataFrame(products) if products else pd.DataFrame(columns=['마스터_sku'])
+        alerts = evaluate_alerts(products_df, forecasts.entries, **thresholds)
+
+        with db.transaction():
+            AlertQueries.lock_alert_states()
+            previous = AlertQueries.get_alert_states(None if skus is None else list(skus))
+            rows, unchanged = alert_transitions(previous, alerts)
+            AlertQueries.save_alert_states(rows)
+            AlertQueries.touch_alerts(unchanged)
+
+        if skus is None and thresholds == self.thresholds:
+            self._forecasts, self._synced_at = forecasts, time.time()
+        transitions = [row for row in rows if row['transition']]
+        self._stats['batches'] += 1
+        self._stats['skus'] += len(products_df)
+        self._stats['transitions'] += len(transitions)
+        if notify:
+            for handler in list(self._handlers):
+                try:
+                    handler(transitions, skus)
+                except Exception as e:
+                    print(f"Alert handler error: {str(e)}")
+        return transitions
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def get_alert_worker():
+    """The process-wide AlertWorker (created with alert_thresholds() and started on first use)"""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = AlertWorker(**alert_thresholds())
+        _worker.start()
+        return _worker
+
+
+if __name__ == "__main__":
+    worker = AlertWorker()
+    started = time.time()
+    transitions = worker.process()
+    print(f"Re-evaluated all products in {time.time() - started:.2f}s: {len(transitions)} transitions")
+    for row in transitions:
+        print(f"  {row['transition']:<9} {row['마스터_sku']:<16} {row['alert_type']:<8} {row['severity']} {row['message']}")
@@ -0,0 +1,336 @@
+"""
+Rolling-origin backtests of the demand forecasters
+
+Replays the monthly 출고 series (daily shipment rollup, as it is today) at many cutoffs:
+for every cutoff each candidate forecaster sees only the months before it and forecasts
+the next HORIZON months. Forecasts and actuals form SKU x cutoff x horizon cubes, and all
+error metrics are computed on the whole cube at once.
+
+Each run is stored in {output}/{run_id}/ as .npy cubes plus meta.json, and its summary is
+appended to {output}/history.csv, so comparing candidates or runs is a file read:
+
+    python -m utils.backtesting                                  # last 12 cutoffs
+    python -m utils.backtesting --cutoffs 6 --candidates baseline arima --workers 8
+    python -m utils.backtesting --candidates baseline ses croston seasonal_naive routed
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import time
+import warnings
+from datetime import date, datetime
+
+import numpy as np
+import pandas as pd
+
+from config.database import db
+from utils import baseline_forecasters
+from utils.forecast_training import (
+    HORIZON, _with_timeout, init_worker_process, load_monthly_series, series_for_sku,
+    fit_sku, forecast_arima, forecast_baseline, forecast_prophet
+)
+
+CANDIDATES = ('baseline', 'arima', 'prophet', 'ensemble', 'ses', 'croston', 'seasonal_naive', 'routed')
+DEFAULT_CANDIDATES = ('baseline', 'arima', 'ensemble', 'routed')
+# Computed for every SKU of a cutoff at once in the parent (see utils.baseline_forecasters)
+CLOSED_FORM_CANDIDATES = ('ses', 'croston', 'seasonal_naive', 'routed')
+# Months of history a SKU needs before a cutoff to be forecast at it
+MIN_TRAIN_MONTHS = 3
+DEFAULT_OUTPUT = 'backtests'
+
+
+def candidate_forecast(candidate, y, months, horizon=HORIZON):
+    """Forecast of one candidate from history y (negative values clipped to 0)"""
+    if candidate == 'baseline':
+        forecast = forecast_baseline(y, horizon)
+    elif candidate == 'arima':
+        forecast = forecast_arima(y, horizon)
+    elif candidate == 'prophet':
+        forecast = forecast_prophet(y, horizon, months)
+    else:
+        models = ['arima', 'prophet'] if _prophet_available() else ['arima']
+        forecast = fit_sku(None, y, months, models, horizon)['predictions']
+    return np.clip(np.asarray(forecast, dtype=float), 0, None)
+
+
+def _prophet_available():
+    try:
+        import prophet  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _backtest_task(task, candidates, timeout):
+    """Forecasts of every candidate for one (SKU, cutoff); NaN where a candidate failed"""
+    key, y, months = task
+    forecasts = np.full((len(candidates), HORIZON), np.nan)
+    for k, candidate in enumerate(candidates):
+        try:
+            forecasts[k] = _with_timeout(timeout, candidate_forecast, candidate, y, months)
+        except Exception:  # includes FitTimeout from _with_timeout
+            continue
+    return key, forecasts
+
+
+def _backtest_chunk(tasks, candidates, timeout):
+    return [_backtest_task(task, candidates, timeout) for task in tasks]
+
+
+def run_backtest(series, n_cutoffs=12, candidates=DEFAULT_CANDIDATES, workers=None, timeout=60, chunk_size=16):
+    """
+    Forecast every SKU at each of the last `n_cutoffs` month boundaries
+
+    Args:
+        series: DataFrame SKU x month of 출고 quantities (see load_monthly_series)
+        n_cutoffs: Number of cutoffs (the last one leaves one month of actuals)
+        candidates: Forecaster names from CANDIDATES
+        workers: Worker processes (default: all cores)
+        timeout: Seconds allowed per candidate fit
+
+    Returns:
+        Dictionary with skus, cutoffs (first forecast month of each cutoff), candidates,
+        forecasts (candidate, SKU, cutoff, horizon) and actuals (SKU, cutoff, horizon); NaN
+        marks forecasts that were not made and actuals that are not known yet
+    """
+    values = series.to_numpy(dtype=float)
+    months = series.columns
+    n_months = len(months)
+    cutoff_positions = list(range(max(1, n_months - n_cutoffs), n_months))
+    skus = list(series.index)
+
+    # Actuals cube by fancy indexing: month position = cutoff + horizon step
+    steps = np.array(cutoff_positions)[:, None] + np.arange(HORIZON)[None, :]
+    known = steps < n_months
+    actuals = np.where(known[None, :, :], values[:, np.minimum(steps, n_months - 1)], np.nan)
+
+    forecasts = np.full((len(candidates), len(skus), len(cutoff_positions), HORIZON), np.nan)
+    closed_form = [k for k, candidate in enumerate(candidates) if candidate in CLOSED_FORM_CANDIDATES]
+    pooled = [k for k, candidate in enumerate(candidates) if candidate not in CLOSED_FORM_CANDIDATES]
+    pool_candidates = [candidates[k] for k in pooled]
+
+    for j, cutoff in enumerate(cutoff_positions):
+        Y = baseline_forecasters.history_matrix(values[:, :cutoff])
+        eligible = baseline_forecasters.history_lengths(Y) >= MIN_TRAIN_MONTHS
+        for k in closed_form:
+            forecasts[k, eligible, j, :] = baseline_forecasters.forecast(Y[eligible], candidates[k], HORIZON)
+
+    tasks = []
+    for i, sku in enumerate(skus):
+        history = series_for_sku(series.loc[sku])
+        start = n_months - len(history)
+        for j, cutoff in enumerate(cutoff_positions):
+            if pooled and cutoff - start >= MIN_TRAIN_MONTHS:
+                tasks.append(((i, j), values[i, start:cutoff], months[start:cutoff]))
+        # Months before the SKU's first shipment are not actuals
+        actuals[i, steps < start] = np.nan
+
+    chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+    workers = workers or os.cpu_count() or 1
+
+    if not chunks:
+        pass
+    elif workers == 1:
+        # In process: silence fit warnings for this run only; Ctrl+C and BLAS threads stay as they are
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            for chunk in chunks:
+                for (i, j), result in _backtest_chunk(chunk, pool_candidates, timeout):
+                    forecasts[pooled, i, j, :] = result
+    else:
+        pool = multiprocessing.Pool(workers, initializer=init_worker_process)
+        try:
+            pending = [pool.apply_async(_backtest_chunk, (chunk, pool_candidates, timeout)) for chunk in chunks]
+            for chunk, async_result in zip(chunks, pending):
+                try:
+                    results = async_result.get(timeout=timeout * len(pool_candidates) * len(chunk) + 60 if timeout else None)
+                except multiprocessing.TimeoutError:
+                    continue  # stays NaN
+                for (i, j), result in results:
+                    forecasts[pooled, i, j, :] = result
+        finally:
+            pool.terminate()
+            pool.join()
+
+    return {
+        'skus': skus,
+        'cutoffs': [str(months[c]) for c in cutoff_positions],
+        'candidates': list(candidates),
+        'forecasts': forecasts,
+        'actuals': actuals,
+    }
+
+
+def error_metrics(forecasts, actuals, axis=None):
+    """
+    MAE, RMSE, MAPE and bias over `axis` of a forecast/actual cube (NaN cells ignored)
+
+    forecasts may carry extra leading axes (e.g. candidates); actuals broadcast against them.
+    MAPE skips cells whose actual is 0. Bias is mean(forecast - actual) (> 0 = over-forecast).
+
+    Returns:
+        Dictionary of arrays (or scalars when axis=None) plus 'n' (number of scored cells)
+    """
+    errors = forecasts - actuals
+    valid = ~np.isnan(errors)
+    n = valid.sum(axis=axis)
+    safe_n = np.maximum(n, 1)
+    filled = np.where(valid, errors, 0.0)
+
+    actual_b = np.broadcast_to(actuals, errors.shape)
+    pct_valid = valid & (actual_b != 0)
+    pct = np.where(pct_valid, np.abs(filled) / np.where(pct_valid, np.abs(actual_b), 1.0), 0.0)
+    n_pct = pct_valid.sum(axis=axis)
+
+    with np.errstate(invalid='ignore'):
+        return {
+            'mae': np.where(n > 0, np.abs(filled).sum(axis=axis) / safe_n, np.nan),
+            'rmse': np.where(n > 0, np.sqrt((filled ** 2).sum(axis=axis) / safe_n), np.nan),
+            'mape': np.where(n_pct > 0, pct.sum(axis=axis) / np.maximum(n_pct, 1) * 100, np.nan),
+            'bias': np.where(n > 0, filled.sum(axis=axis) / safe_n, np.nan),
+            'n': n,
+        }
+
+
+def summarize(backtest, by='horizon'):
+    """
+    Metrics table per candidate and `by` ('horizon', 'cutoff', 'sku' or None for overall)
+
+    Returns:
+        DataFrame with candidate, the `by` column, mae, rmse, mape, bias, n
+    """
+    forecasts, actuals = backtest['forecasts'], backtest['actuals']
+    # Reduce over the axes that are not kept: forecasts are (candidate, sku, cutoff, horizon)
+    keep = {'sku': 1, 'cutoff': 2, 'horizon': 3, None: None}[by]
+    axes = tuple(a for a in (1, 2, 3) if a != keep)
+    metrics = error_metrics(forecasts, actuals, axis=axes)
+
+    labels = {
+        'sku': backtest['skus'],
+        'cutoff': backtest['cutoffs'],
+        'horizon': list(range(1, forecasts.shape[3] + 1)),
+    }.get(by, [None])
+    rows = []
+    for k, candidate in enumerate(backtest['candidates']):
+        for position, label in enumerate(labels):
+            row = {'candidate': candidate}
+            if by:
+                row[by] = label
+            for name, values in metrics.items():
+                value = values[k] if by is None else values[k, position]
+                row[name] = int(value) if name == 'n' else float(value)
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def best_candidates(backtest, metric='rmse'):
+    """Candidate with the lowest `metric` per SKU (over all cutoffs and horizons)"""
+    per_sku = summarize(backtest, by='sku').dropna(subset=[metric])
+    best = per_sku.loc[per_sku.groupby('sku')[metric].idxmin()]
+    return best.set_index('sku')[['candidate', metric, 'n']]
+
+
+def save_backtest(backtest, output_dir=DEFAULT_OUTPUT, run_id=None):
+    """
+    Store the cubes in {output_dir}/{run_id}/ and append the overall summary to history.csv
+
+    Returns:
+        Path of the run directory
+    """
+    run_id = run_id or datetime.now().strftime('%Y%m%d-%H%M%S')
+    run_dir = os.path.join(output_dir, run_id)
+    os.makedirs(run_dir, exist_ok=True)
+    np.save(os.path.join(run_dir, 'forecasts.npy'), backtest['forecasts'], allow_pickle=False)
+    np.save(os.path.join(run_dir, 'actuals.npy'), backtest['actuals'], allow_pickle=False)
+    with open(os.path.join(run_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'run_id': run_id,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'skus': backtest['skus'],
+            'cutoffs': backtest['cutoffs'],
+            'candidates': backtest['candidates'],
+            'horizon': int(backtest['forecasts'].shape[3]),
+        }, f, ensure_ascii=False)
+
+    summary = summarize(backtest, by='horizon')
+    summary.insert(0, 'run_id', run_id)
+    history_path = os.path.join(output_dir, 'history.csv')
+    summary.to_csv(history_path, mode='a', header=not os.path.exists(history_path), index=False)
+    return run_dir
+
+
+def load_backtest(run_dir):
+    """Backtest dictionary of a stored run (cubes memory-mapped read-only)"""
+    with open(os.path.join(run_dir, 'meta.json'), encoding='utf-8') as f:
+        meta = json.load(f)
+    return {
+        'run_id': meta['run_id'],
+        'skus': meta['skus'],
+        'cutoffs': meta['cutoffs'],
+        'candidates': meta['candidates'],
+        'forecasts': np.load(os.path.join(run_dir, 'forecasts.npy'), mmap_mode='r', allow_pickle=False),
+        'actuals': np.load(os.path.join(run_dir, 'actuals.npy'), mmap_mode='r', allow_pickle=False),
+    }
+
+
+def load_history(output_dir=DEFAULT_OUTPUT):
+    """Per-run, per-candidate, per-horizon metrics of every stored run"""
+    history_path = os.path.join(output_dir, 'history.csv')
+    if not os.path.exists(history_path):
+        return pd.DataFrame()
+    return pd.read_csv(history_path, dtype={'run_id': str})
+
+
+def compare_with_previous(history, run_id, metric='rmse'):
+    """Change of `metric` per candidate and horizon against the run before `run_id`"""
+    runs = list(dict.fromkeys(history['run_id']))
+    if run_id not in runs or runs.index(run_id) == 0:
+        return pd.DataFrame()
+    previous_id = runs[runs.index(run_id) - 1]
+    current = history[history['run_id'] == run_id].set_index(['candidate', 'horizon'])[metric]
+    previous = history[history['run_id'] == previous_id].set_index(['candidate', 'horizon'])[metric]
+    comparison = pd.DataFrame({'previous': previous, 'current': current}).dropna()
+    comparison['change'] = comparison['current'] - comparison['previous']
+    comparison = comparison.reset_index()
+    comparison.attrs['previous_run'] = previous_id
+    return comparison
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rolling-origin backtest of the demand forecasters")
+    parser.add_argument('--cutoffs', type=int, default=12, help="Number of monthly cutoffs (default: 12)")
+    parser.add_argument('--candidates', nargs='+', default=list(DEFAULT_CANDIDATES), choices=CANDIDATES)
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help="Directory for stored runs (default: backtests)")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--timeout', type=float, default=60, help="Seconds allowed per fit (0 = no limit)")
+    parser.add_argument('--skus', nargs='+', help="Only backtest these SKUs")
+    args = parser.parse_args()
+
+    started = time.time()
+    series, _ = load_monthly_series(date.today().replace(day=1), args.skus)
+    # The pool forks after this point; workers must not share the parent's connections
+    db.close_pool()
+    if series.empty:
+        print("No shipment history found")
+        return
+
+    backtest = run_backtest(series, args.cutoffs, args.candidates, args.workers, args.timeout)
+    run_dir = save_backtest(backtest, args.output)
+    print(f"Backtested {len(backtest['skus'])} SKUs x {len(backtest['cutoffs'])} cutoffs x "
+          f"{len(backtest['candidates'])} candidates in {time.time() - started:.1f}s -> {run_dir}")
+
+    with pd.option_context('display.width', 120, 'display.float_format', '{:,.2f}'.format):
+        print(summarize(backtest, by=None).to_string(index=False))
+        best = best_candidates(backtest)
+        print("\nBest candidate per SKU (RMSE):")
+        print(best['candidate'].value_counts().to_string())
+
+        comparison = compare_with_previous(load_history(args.output), os.path.basename(run_dir))
+        if not comparison.empty:
+            print(f"\nRMSE change vs {comparison.attrs['previous_run']}:")
+            print(comparison.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
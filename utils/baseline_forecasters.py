@@ -0,0 +1,197 @@
+"""
+Closed-form forecasters over the whole SKU x month matrix
+
+Every function takes Y, a (SKUs, months) float matrix of monthly 출고 with NaN before each
+SKU's history starts (see history_matrix), and returns a (SKUs, horizon) forecast. They
+loop over months at most, never over SKUs, so the long tail of short or intermittent
+series is covered in milliseconds and ARIMA/Prophet only run where route() says they
+pay off.
+"""
+import numpy as np
+
+# Syntetos-Boylan cut-offs: average inter-demand interval and squared CV of demand sizes
+ADI_CUTOFF = 1.32
+CV2_CUTOFF = 0.49
+
+ROUTE_METHODS = ('moving_average', 'ses', 'croston', 'model')
+
+
+def history_matrix(series):
+    """
+    Float matrix of a zero-filled SKU x month DataFrame with NaN before each SKU's first shipment
+
+    Args:
+        series: DataFrame (or array) SKU x month (see forecast_training.load_monthly_series)
+    """
+    values = np.asarray(series, dtype=float)
+    started = np.cumsum(values > 0, axis=1) > 0
+    return np.where(started, values, np.nan)
+
+
+def history_lengths(Y):
+    """Number of months of history per SKU"""
+    return (~np.isnan(Y)).sum(axis=1)
+
+
+def moving_average(Y, horizon, window=3):
+    """Flat forecast at the mean of the last `window` months (fewer if the history is shorter)"""
+    recent = Y[:, -window:]
+    count = (~np.isnan(recent)).sum(axis=1)
+    level = np.nan_to_num(recent).sum(axis=1) / np.maximum(count, 1)
+    return np.repeat(level[:, None], horizon, axis=1)
+
+
+def simple_exponential_smoothing(Y, horizon, alpha=0.3):
+    """Flat SES forecast; the level starts at each SKU's first month"""
+    level = np.full(len(Y), np.nan)
+    for t in range(Y.shape[1]):
+        y = Y[:, t]
+        observed = ~np.isnan(y)
+        level = np.where(observed & np.isnan(level), y, level)
+        level = np.where(observed, alpha * y + (1 - alpha) * level, level)
+    return np.repeat(np.nan_to_num(level)[:, None], horizon, axis=1)
+
+
+def croston(Y, horizon, alpha=0.1, sba=True):
+    """
+    Croston forecast for intermittent demand (Syntetos-Boylan approximation by default)
+
+    Demand sizes and inter-demand intervals are smoothed separately, updating only in months
+    with demand; the forecast is size / interval, scaled by (1 - alpha/2) for SBA.
+    """
+    n = len(Y)
+    size = np.full(n, np.nan)
+    interval = np.full(n, np.nan)
+    since_last = np.zeros(n)
+    for t in range(Y.shape[1]):
+        y = Y[:, t]
+        observed = ~np.isnan(y)
+        since_last = since_last + observed
+        demand = observed & (y > 0)
+        first = demand & np.isnan(size)
+        update = demand & ~first
+        size = np.where(first, y, np.where(update, size + alpha * (y - size), size))
+        interval = np.where(first, since_last, np.where(update, interval + alpha * (since_last - interval), interval))
+        since_last = np.where(demand, 0, since_last)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = np.where(np.isnan(size), 0.0, size / interval)
+    if sba:
+        rate = rate * (1 - alpha / 2)
+    return np.repeat(rate[:, None], horizon, axis=1)
+
+
+def seasonal_naive(Y, horizon, season=12):
+    """Same month last season; rows with less than one season of history are NaN"""
+    forecast = np.full((len(Y), horizon), np.nan)
+    if Y.shape[1] >= season:
+        columns = Y.shape[1] - season + (np.arange(horizon) % season)
+        forecast = Y[:, columns].copy()
+        forecast[history_lengths(Y) < season] = np.nan
+    return forecast
+
+
+def classify_demand(Y):
+    """
+    Syntetos-Boylan demand class per SKU
+
+    Returns:
+        Tuple of (ADI, CV^2 of non-zero demand sizes, class array of
+        'smooth' / 'erratic' / 'intermittent' / 'lumpy' / 'none')
+    """
+    observed = ~np.isnan(Y)
+    demand = observed & (np.nan_to_num(Y) > 0)
+    n = observed.sum(axis=1)
+    n_demand = demand.sum(axis=1)
+    sizes = np.where(demand, Y, 0.0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        adi = np.where(n_demand > 0, n / np.maximum(n_demand, 1), np.inf)
+        mean = sizes.sum(axis=1) / np.maximum(n_demand, 1)
+        variance = np.where(demand, (sizes - mean[:, None]) ** 2, 0.0).sum(axis=1) / np.maximum(n_demand, 1)
+        cv2 = np.where(mean > 0, variance / mean ** 2, 0.0)
+
+    intermittent = adi >= ADI_CUTOFF
+    variable = cv2 >= CV2_CUTOFF
+    classes = np.select(
+        [n_demand == 0, ~intermittent & ~variable, ~intermittent & variable, intermittent & ~variable],
+        ['none', 'smooth', 'erratic', 'intermittent'],
+        default='lumpy'
+    )
+    return adi, cv2, classes
+
+
+def route(Y, min_months_for_models=6):
+    """
+    Forecasting method per SKU by history length and intermittency
+
+        fewer than 3 months            -> moving_average
+        intermittent or lumpy demand   -> croston
+        fewer than min_months          -> ses
+        otherwise                      -> model (ARIMA / Prophet ensemble)
+
+    Returns:
+        Array of method names from ROUTE_METHODS
+    """
+    lengths = history_lengths(Y)
+    _, _, classes = classify_demand(Y)
+    return np.select(
+        [lengths < 3, np.isin(classes, ['intermittent', 'lumpy', 'none']), lengths < min_months_for_models],
+        ['moving_average', 'croston', 'ses'],
+        default='model'
+    )
+
+
+FORECASTERS = {
+    'moving_average': moving_average,
+    'ses': simple_exponential_smoothing,
+    'croston': croston,
+    'seasonal_naive': seasonal_naive,
+}
+
+
+def forecast(Y, method, horizon):
+    """
+    (SKUs, horizon) forecast of one FORECASTERS method, or of the routed method per SKU
+    when method='routed' (SES stands in for rows routed to 'model')
+
+    Seasonal naive rows without a full season fall back to the moving average.
+    """
+    if method == 'routed':
+        methods = route(Y)
+        result = np.zeros((len(Y), horizon))
+        for name in np.unique(methods):
+            rows = methods == name
+            result[rows] = forecast(Y[rows], 'ses' if name == 'model' else name, horizon)
+        return result
+
+    result = FORECASTERS[method](Y, horizon)
+    missing = np.isnan(result).any(axis=1)
+    if missing.any():
+        result[missing] = moving_average(Y[missing], horizon)
+    return np.clip(result, 0, None)
+
+
+def holdout_errors(Y, method, test_periods):
+    """
+    RMSE / MAE / MAPE of `method` on the last `test_periods` months of every row
+
+    Returns:
+        Dictionary of arrays (NaN where a row has no history before the holdout), plus
+        'residuals' (rows, test_periods) of actual - forecast
+    """
+    train, actual = Y[:, :-test_periods], Y[:, -test_periods:]
+    predicted = forecast(train, method, test_periods)
+    errors = predicted - actual
+    valid = ~np.isnan(errors) & (history_lengths(train) > 0)[:, None]
+    count = valid.sum(axis=1)
+    filled = np.where(valid, errors, 0.0)
+    nonzero = valid & (np.nan_to_num(actual) != 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        pct = np.where(nonzero, np.abs(filled) / np.where(nonzero, np.abs(actual), 1.0), 0.0)
+        return {
+            'rmse': np.where(count > 0, np.sqrt((filled ** 2).sum(axis=1) / np.maximum(count, 1)), np.nan),
+            'mae': np.where(count > 0, np.abs(filled).sum(axis=1) / np.maximum(count, 1), np.nan),
+            'mape': np.where(nonzero.any(axis=1), pct.sum(axis=1) / np.maximum(nonzero.sum(axis=1), 1) * 100, np.nan),
+            'residuals': np.where(valid, -errors, np.nan),
+        }
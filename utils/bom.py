@@ -0,0 +1,241 @@
+"""
+Bill of materials: set/bundle demand exploded into component demand
+
+Set SKUs record their 출고 in component units (sets x 배수, see show_inventory), so a set
+listed in playauto_product_bom passes each recorded unit on to its components as
+quantity / 배수 units; a NULL quantity means the set is 배수 units of one component.
+Sets may contain sets: the explosion matrix is the closure over every level. A set with
+BOM rows holds no demand of its own after the explosion; every other SKU keeps its own.
+
+The matrix is a scipy.sparse CSR (components x SKUs), built once per BOM change and
+applied to whole forecast matrices with one sparse multiply:
+
+    forecasts = load_component_forecasts()      # load_forecasts() with sets exploded
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import scipy.sparse as sp
+
+from config.database import ProductQueries
+from utils.forecast_store import DEFAULT_MODEL_DIRS, ForecastSet, load_forecasts, normalize_entry
+
+# Longest set-in-set chain followed before the BOM is treated as cyclic
+MAX_BOM_DEPTH = 20
+
+
+class BillOfMaterials:
+    """Sparse explosion matrix: demand of `skus[j]` -> demand of `skus[i]` is matrix[i, j]"""
+
+    def __init__(self, skus, matrix, sets):
+        self.skus = list(skus)
+        self.index = {sku: i for i, sku in enumerate(self.skus)}
+        self.matrix = matrix.tocsr()
+        self.sets = set(sets)
+
+    @classmethod
+    def from_rows(cls, rows, skus=()):
+        """
+        Build the closure from get_bom_rows() rows
+
+        Args:
+            rows: Dicts with set_sku, component_sku, quantity (None = multiple), multiple
+            skus: Extra SKUs to include (identity rows)
+
+        Raises:
+            ValueError: If the BOM contains a cycle
+        """
+        universe = list(dict.fromkeys(
+            list(skus) + [r['set_sku'] for r in rows] + [r['component_sku'] for r in rows]
+        ))
+        index = {sku: i for i, sku in enumerate(universe)}
+        sets = {r['set_sku'] for r in rows}
+
+        # One level: each set column points at its components, every other column at itself
+        data, row_index, col_index = [], [], []
+        for r in rows:
+            multiple = float(r.get('multiple') or 1)
+            quantity = float(r['quantity']) if r.get('quantity') is not None else multiple
+            data.append(quantity / multiple)
+            row_index.append(index[r['component_sku']])
+            col_index.append(index[r['set_sku']])
+        for sku in universe:
+            if sku not in sets:
+                data.append(1.0)
+                row_index.append(index[sku])
+                col_index.append(index[sku])
+        level = sp.csr_matrix((data, (row_index, col_index)), shape=(len(universe), len(universe)))
+
+        # Closure: multiply until no set column has demand left on a set row
+        closure = level
+        set_rows = np.array([index[sku] for sku in sets], dtype=int)
+        for _ in range(MAX_BOM_DEPTH):
+            if not len(set_rows) or closure[set_rows].nnz == 0:
+                break
+            closure = level @ closure
+        else:
+            raise ValueError("playauto_product_bom contains a cycle (or sets nested too deeply)")
+        closure.eliminate_zeros()
+        return cls(universe, closure, sets)
+
+    def __len__(self):
+        return len(self.skus)
+
+    @property
+    def is_identity(self):
+        return not self.sets
+
+    def submatrix(self, row_skus, col_skus):
+        """Explosion matrix between two SKU lists (SKUs outside the BOM map to themselves)"""
+        extra = [sku for sku in dict.fromkeys(list(row_skus) + list(col_skus)) if sku not in self.index]
+        matrix = self.matrix
+        if extra:
+            matrix = sp.block_diag([matrix, sp.identity(len(extra))], format='csr')
+        index = dict(self.index)
+        index.update({sku: len(self.skus) + k for k, sku in enumerate(extra)})
+        rows = np.array([index[sku] for sku in row_skus], dtype=int)
+        cols = np.array([index[sku] for sku in col_skus], dtype=int)
+        return matrix[rows][:, cols]
+
+    def explode(self, values, skus):
+        """
+        Component demand of a SKU x period matrix
+
+        Args:
+            values: Array (len(skus), ...) of demand per SKU (NaN counts as 0)
+            skus: SKUs of the rows of values
+
+        Returns:
+            Tuple of (result SKUs: skus plus any component not in them, exploded array)
+        """
+        values = np.nan_to_num(np.asarray(values, dtype=float))
+        result_skus = list(dict.fromkeys(list(skus) + [sku for sku in self.skus if sku not in self.sets]))
+        return result_skus, self.submatrix(result_skus, skus) @ values.reshape(len(skus), -1)
+
+
+def load_bom(skus=()):
+    """BillOfMaterials from playauto_product_bom (rows cached until the table changes)"""
+    return BillOfMaterials.from_rows(ProductQueries.get_bom_rows(), skus)
+
+
+def _with_monthly(entry, layout, values):
+    """Copy of a forecast entry with its monthly values replaced, keeping its layout"""
+    entry = dict(entry) if isinstance(entry, dict) else {}
+    values = np.asarray(values, dtype=float)
+    if layout == 'nested_arima':
+        entry['predictions'] = {**entry['predictions'], 'arima': values}
+    elif layout == 'improved':
+        entry['arima'] = values
+    elif layout in ('adaptive_forecast', 'legacy_weekly'):
+        entry['adaptive_forecast'] = values
+        entry.setdefault('forecast_months', [])
+        entry.pop(30, None)
+        entry.pop(90, None)
+    else:
+        full = float(values[0]) if len(values) else 0.0
+        previous = entry.get('august_full_prediction')
+        if entry.get('august_remainder_prediction') is not None and previous:
+            entry['august_remainder_prediction'] = entry['august_remainder_prediction'] * full / previous
+        entry['predictions'] = values
+        entry['august_full_prediction'] = full
+    return entry
+
+
+def explode_forecasts(forecasts, bom):
+    """
+    ForecastSet with set forecasts moved onto their components
+
+    Rows untouched by the BOM keep their original entries. Exploded rows keep the layout
+    and fields of the component's own entry (or of the first set feeding it) with new
+    monthly values and forecast_std (set errors treated as independent); their
+    lower/upper interval is dropped. Assumes the entries of one model directory share
+    the same month alignment.
+    """
+    if bom.is_identity or not len(forecasts):
+        return forecasts
+
+    skus = forecasts.skus
+    values = np.nan_to_num(np.asarray(forecasts.matrix, dtype=float))
+    std = np.asarray(forecasts.std, dtype=float)
+    result_skus = list(dict.fromkeys(skus + [sku for sku in bom.skus if sku not in bom.sets]))
+    explosion = bom.submatrix(result_skus, skus).tocsr()
+
+    # Only rows whose explosion is something other than "itself x 1" change
+    source_index = {sku: j for j, sku in enumerate(skus)}
+    changed = []
+    for i, sku in enumerate(result_skus):
+        cols = explosion.indices[explosion.indptr[i]:explosion.indptr[i + 1]]
+        weights = explosion.data[explosion.indptr[i]:explosion.indptr[i + 1]]
+        if not (len(cols) == 1 and cols[0] == source_index.get(sku) and weights[0] == 1.0):
+            changed.append(i)
+    if not changed:
+        return forecasts
+
+    sub = explosion[changed]
+    exploded = sub @ values
+    variance = sub.multiply(sub) @ np.where(np.isnan(std), 0.0, std ** 2)
+    std_known = (sub != 0).astype(float) @ np.isnan(std).astype(float) == 0
+
+    entries = dict(forecasts.entries)
+    for k, i in enumerate(changed):
+        sku = result_skus[i]
+        cols = sub.indices[sub.indptr[k]:sub.indptr[k + 1]]
+        if sku in source_index:
+            base_sku = sku
+        elif len(cols):
+            base_sku = skus[cols[0]]
+        else:
+            # A set with components but no forecasts feeding it keeps no demand
+            base_sku = sku
+        base = forecasts.entries.get(base_sku, {})
+        layout = normalize_entry(base)[1] if base else 'adaptive'
+        length = int(max((forecasts.lengths[c] for c in cols), default=0))
+        entry = _with_monthly(base, layout, exploded[k, :length])
+        entry['forecast_std'] = np.where(std_known[k, :length], np.sqrt(variance[k, :length]), np.nan)
+        entry.pop('lower', None)
+        entry.pop('upper', None)
+        entry['bom_sources'] = {skus[c]: float(w) for c, w in zip(cols, sub.data[sub.indptr[k]:sub.indptr[k + 1]])}
+        entries[sku] = entry
+
+    exploded_set = ForecastSet.from_pickles(entries, source=forecasts.source)
+    exploded_set.metrics = forecasts.metrics
+    return exploded_set
+
+
+# (forecast set id, BOM rows) -> exploded ForecastSet, most recent last
+_exploded_cache = OrderedDict()
+_exploded_lock = threading.Lock()
+_EXPLODED_CACHE_SIZE = 4
+
+
+def load_component_forecasts(model_dirs=DEFAULT_MODEL_DIRS):
+    """
+    load_forecasts() with set demand exploded onto components
+
+    Computed once per forecast file version and BOM version and shared by every render.
+    """
+    forecasts = load_forecasts(model_dirs)
+    try:
+        rows = ProductQueries.get_bom_rows()
+    except Exception as e:
+        print(f"Failed to load the bill of materials: {str(e)}")
+        return forecasts
+    key = (id(forecasts), tuple((r['set_sku'], r['component_sku'], r['quantity'], r['multiple']) for r in rows))
+    with _exploded_lock:
+        cached = _exploded_cache.get(key)
+        if cached is not None and cached[0] is forecasts:
+            _exploded_cache.move_to_end(key)
+            return cached[1]
+
+    try:
+        exploded = explode_forecasts(forecasts, BillOfMaterials.from_rows(rows))
+    except ValueError as e:
+        print(f"Bill of materials ignored: {str(e)}")
+        exploded = forecasts
+    with _exploded_lock:
+        # Keep the source set referenced so its id cannot be reused while cached
+        _exploded_cache[key] = (forecasts, exploded)
+        while len(_exploded_cache) > _EXPLODED_CACHE_SIZE:
+            _exploded_cache.popitem(last=False)
+    return exploded
@@ -2,6 +2,29 @@ import numpy as np
 import pandas as pd
 from typing import Dict, List, Tuple, Optional
 from datetime import datetime, timedelta
+from statistics import NormalDist
+
+# Month length used to spread monthly forecasts over a lead time in days
+DAYS_PER_MONTH = 30
+# Fewer holdout residuals than this fall back to the normal approximation
+MIN_EMPIRICAL_RESIDUALS = 3
+
+def service_level_z(service_level):
+    """
+    Standard normal quantile of a service level (e.g. 0.95 -> 1.645)
+    
+    Args:
+        service_level: Probability in (0, 1), scalar or array
+    
+    Returns:
+        z-score(s) with the shape of service_level
+    """
+    levels = np.asarray(service_level, dtype=float)
+    if np.any((levels <= 0) | (levels >= 1)):
+        raise ValueError("service_level must be between 0 and 1")
+    unique, inverse = np.unique(levels, return_inverse=True)
+    z_scores = np.array([NormalDist().inv_cdf(level) for level in unique])
+    return z_scores[inverse].reshape(levels.shape)
 
 def calculate_safety_stock(predicted_demand: float, lead_time_days: int, 
                           demand_std: float = None, service_level: float = 0.95) -> int:
@@ -22,9 +45,8 @@ def calculate_safety_stock(predicted_demand: float, lead_time_days: int,
     
     # If standard deviation is provided, use more sophisticated calculation
     if demand_std:
-        # Z-score for service level (95% = 1.65)
-        z_scores = {0.90: 1.28, 0.95: 1.65, 0.99: 2.33}
-        z_score = z_scores.get(service_level, 1.65)
+        # Z-score for service level (95% = 1.645)
+        z_score = float(service_level_z(service_level))
         
         # Safety stock = Z-score * sqrt(lead_time) * demand_std
         safety_stock = z_score * np.sqrt(lead_time_days) * demand_std
@@ -32,6 +54,107 @@ def calculate_safety_stock(predicted_demand: float, lead_time_days: int,
     
     return int(basic_safety_stock)
 
+def lead_time_demand(forecast: np.ndarray, forecast_std: np.ndarray, lead_time_days,
+                     lengths: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Mean and standard deviation of demand over the lead time for many SKUs at once
+    
+    The lead time is laid over the monthly forecast path (DAYS_PER_MONTH days per month,
+    the last forecast month extended when the lead time is longer). A month covered for
+    a fraction f adds f * forecast to the mean and f * std^2 to the variance.
+    
+    Args:
+        forecast: Monthly forecast matrix (n, h), NaN-padded
+        forecast_std: Forecast error std per month (n, h); NaN where unknown
+        lead_time_days: Lead time per SKU (n,) or scalar
+        lengths: Valid months per row (default: values before the first NaN)
+    
+    Returns:
+        Tuple of (mean (n,), std (n,)); std is NaN where a covered month has no std
+    """
+    forecast = np.asarray(forecast, dtype=float)
+    forecast_std = np.asarray(forecast_std, dtype=float)
+    n, horizon = forecast.shape
+    if lengths is None:
+        lengths = np.argmax(np.hstack([np.isnan(forecast), np.ones((n, 1), dtype=bool)]), axis=1)
+    lengths = np.asarray(lengths, dtype=int)
+    lead_time_days = np.broadcast_to(np.asarray(lead_time_days, dtype=float), (n,))
+    
+    month_start = DAYS_PER_MONTH * np.arange(horizon)[None, :]
+    covered = np.clip((lead_time_days[:, None] - month_start) / DAYS_PER_MONTH, 0, 1)
+    covered = np.where(np.arange(horizon)[None, :] < lengths[:, None], covered, 0.0)
+    # The last forecast month also stands in for everything after the horizon
+    rows = np.flatnonzero(lengths > 0)
+    last = lengths[rows] - 1
+    covered[rows, last] = np.maximum(lead_time_days[rows] - DAYS_PER_MONTH * last, 0) / DAYS_PER_MONTH
+    
+    in_lead_time = covered > 0
+    mean = np.where(in_lead_time, covered * forecast, 0.0).sum(axis=1)
+    variance = np.where(in_lead_time, covered * forecast_std ** 2, 0.0).sum(axis=1)
+    return mean, np.sqrt(variance)
+
+def _empirical_quantile(residuals: np.ndarray, service_level: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Per-row linear-interpolated quantile of NaN-padded residuals, and the residual count"""
+    if residuals.shape[1] == 0:
+        # No SKU has residuals: every row falls back to the normal approximation
+        return np.full(len(residuals), np.nan), np.zeros(len(residuals), dtype=int)
+    ordered = np.sort(residuals, axis=1)  # NaN sorts last
+    count = (~np.isnan(residuals)).sum(axis=1)
+    position = service_level * np.maximum(count - 1, 0)
+    below = np.floor(position).astype(int)
+    above = np.minimum(below + 1, np.maximum(count - 1, 0))
+    rows = np.arange(len(residuals))
+    low, high = ordered[rows, below], ordered[rows, above]
+    return low + (high - low) * (position - below), count
+
+def calculate_safety_stock_vectorized(forecast: np.ndarray, forecast_std: np.ndarray, lead_time_days,
+                                      service_level=0.95, lengths: Optional[np.ndarray] = None,
+                                      residuals: Optional[np.ndarray] = None,
+                                      method: str = 'normal') -> Dict[str, np.ndarray]:
+    """
+    Safety stock for a service level from the lead-time demand distribution of every SKU
+    
+    'normal' uses z(service_level) * lead-time std. 'empirical' uses the service-level
+    quantile of each SKU's holdout residuals (actual - forecast, per month) scaled to the
+    lead time, for rows with at least MIN_EMPIRICAL_RESIDUALS of them, and the normal
+    approximation for the rest.
+    
+    Args:
+        forecast: Monthly forecast matrix (n, h), NaN-padded
+        forecast_std: Forecast error std per month (n, h)
+        lead_time_days: Lead time per SKU (n,) or scalar
+        service_level: Probability of no stockout during the lead time, scalar or (n,)
+        lengths: Valid months per row (default: values before the first NaN)
+        residuals: Holdout residual matrix (n, k), NaN-padded (for method='empirical')
+        method: 'normal' or 'empirical'
+    
+    Returns:
+        Dictionary of arrays: lead_time_demand, lead_time_std, safety_stock and
+        reorder_level (lead_time_demand + safety_stock); NaN where the std is unknown
+    """
+    n = len(forecast)
+    mean, std = lead_time_demand(forecast, forecast_std, lead_time_days, lengths)
+    levels = np.broadcast_to(np.asarray(service_level, dtype=float), (n,))
+    safety_stock = service_level_z(levels) * std
+    
+    if method == 'empirical' and residuals is not None and n:
+        residuals = np.asarray(residuals, dtype=float)
+        quantile, count = _empirical_quantile(residuals, levels)
+        # Monthly residuals scale like the std: with the square root of the covered months
+        lead_time_days = np.broadcast_to(np.asarray(lead_time_days, dtype=float), (n,))
+        empirical = count >= MIN_EMPIRICAL_RESIDUALS
+        safety_stock = np.where(empirical, quantile * np.sqrt(lead_time_days / DAYS_PER_MONTH), safety_stock)
+    elif method not in ('normal', 'empirical'):
+        raise ValueError(f"unknown safety stock method: {method}")
+    
+    safety_stock = np.maximum(safety_stock, 0)
+    return {
+        'lead_time_demand': mean,
+        'lead_time_std': std,
+        'safety_stock': safety_stock,
+        'reorder_level': mean + safety_stock,
+    }
+
 def calculate_reorder_point(current_stock: int, daily_usage: float, 
                            lead_time_days: int, safety_stock: int) -> Tuple[int, int]:
     """
@@ -1,88 +1,23 @@
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+from collections import OrderedDict
 from datetime import datetime, timedelta
+import hashlib
+import io
 import os
-from typing import List, Dict
+import pickle
+from typing import List, Dict, Optional
 import pandas as pd
 import schedule
 import time
 import threading
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from config.database import ProductQueries
+from config.database import ProductQueries, MailQueries
+from utils.mail_outbox import get_mail_sender, smtp_settings
 
-class EmailAlertSystem:
-    def __init__(self):
-        # Email configuration - should be moved to environment variables
-        self.smtp_server = os.getenv('SMTP_SERVER', 'smtp.gmail.com')
-        self.smtp_port = int(os.getenv('SMTP_PORT', '587'))
-        self.sender_email = os.getenv('SENDER_EMAIL', '')
-        self.sender_password = os.getenv('SENDER_PASSWORD', '')
-        
-        # Check if email is properly configured
-        self.is_configured = bool(self.sender_email and self.sender_password)
-        
-    def send_inventory_alert(self, recipient_email: str, alerts: List[Dict]) -> bool:
-        """Send inventory shortage alert email"""
-        if not self.is_configured:
-            print("Email not configured. Please set SENDER_EMAIL and SENDER_PASSWORD in .env file")
-            return False
-            
-        try:
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = f'[PLAYAUTO] 재고 부족 알림 - {datetime.now().strftime("%Y-%m-%d")}'
-            msg['From'] = self.sender_email
-            msg['To'] = recipient_email
-            
-            # Create HTML content
-            html_content = self._create_inventory_alert_html(alerts)
-            
-            # Attach HTML content
-            html_part = MIMEText(html_content, 'html')
-            msg.attach(html_part)
-            
-            # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.sender_email, self.sender_password)
-                server.send_message(msg)
-                
-            return True
-            
-        except Exception as e:
-            print(f"Email sending error: {str(e)}")
-            return False
-    
-    def save_alert_preview(self, recipient_email: str, alerts: List[Dict]) -> str:
-        """Save alert preview as HTML file for testing without SMTP"""
-        try:
-            html_content = self._create_inventory_alert_html(alerts)
-            
-            # Save to file
-            filename = f"alert_preview_{datetime.now().strftime('%Y%m%d_%H%M%S')}.html"
-            filepath = os.path.join(os.path.dirname(__file__), '..', filename)
-            
-            with open(filepath, 'w', encoding='utf-8') as f:
-                f.write(html_content)
-            
-            return filepath
-        except Exception as e:
-            print(f"Error saving preview: {str(e)}")
-            return None
-    
-    def _create_inventory_alert_html(self, alerts: List[Dict]) -> str:
-        """Create HTML content for inventory alerts"""
-        
-        # Group alerts by type first
-        stock_alerts = [a for a in alerts if a.get('유형') == '재고 부족']
-        order_alerts = [a for a in alerts if a.get('유형') == '발주 시점']
-        expiry_alerts = [a for a in alerts if a.get('유형') == '소비기한 임박']
-        
-        # No need to group by urgency anymore - we'll handle them in unified tables
-        
-        html = f"""
+# Alert email template: constant chunks and str.format row templates, defined once per
+# process; render_inventory_alert_html streams one document per alert set into a
+# StringIO and keeps the last few documents by alert-set hash.
+_ALERT_HEAD = """
         <html>
         <head>
             <style>
@@ -102,18 +37,13 @@ class EmailAlertSystem:
         <body>
             <div class="header">
                 <h1>PLAYAUTO 재고 알림</h1>
-                <p>{datetime.now().strftime("%Y년 %m월 %d일")} 재고 현황</p>
+                <p>{date} 재고 현황</p>
             </div>
             
             <div class="content">
         """
-        
-        # # 발주 시점 알림
-        if order_alerts:
-            # Sort by status priority: 긴급 first, then 주의 (no 경고 for order alerts in main logic)
-            sorted_order_alerts = sorted(order_alerts, key=lambda x: 0 if x.get('상태') == '긴급' else 1)
-            
-            html += """
+
+_ORDER_SECTION = """
                 <div class="alert-section">
                     <h2 style="color: #2196F3;">📦 발주 시점 알림</h2>
                     <table>
@@ -126,120 +56,19 @@ class EmailAlertSystem:
                             <th>메시지</th>
                         </tr>
             """
-            
-            for alert in sorted_order_alerts:
-                status = alert.get('상태', '')
-                safety_stock = alert.get('안전재고량', 0)
-                current_stock = alert.get('현재 재고량', 0)
-                lead_time = alert.get('리드타임', 0)
-                
-                # Get daily usage for calculations (from 출고량/30 like in app.py)
-                outbound = alert.get('출고량', 0)
-                daily_usage = outbound / 30 if outbound > 0 else 0
-                
-                expected_consumption_days = alert.get('예상 소비일', 0)
-                # Only calculate if not provided
-                if expected_consumption_days == 0 and daily_usage > 0 and current_stock > 0:
-                    # Simple calculation based on constant daily usage
-                    expected_consumption_days = int(current_stock / daily_usage)
-                
-                if safety_stock > 0:
-                    # 주의: current_stock > safety_stock
-                    if current_stock > safety_stock:
-                        # Should be 주의 (if it's in the alert list)
-                        if status != '주의' and status in ['긴급', '경고']:
-                            status = '주의'
-                    # 긴급: current_stock <= safety_stock
-                    elif current_stock <= safety_stock:
-                        # Should be 긴급
-                        if status != '긴급':
-                            status = '긴급'
-                
-                # Generate messages following app.py main alert logic exactly
-                if status == '긴급':
-                    row_class = "urgent-row"
-                    status_emoji = "🚨"
-                    # 긴급: current_stock <= safety_stock
-                    # Calculate days until stockout (following app.py line 2049)
-                    if daily_usage > 0:
-                        days_until_stockout = int(current_stock / daily_usage)
-                        # Message format from app.py line 2071
-                        message = f'{days_until_stockout}일 후 재고 소진, 리드타임 {lead_time}일'
-                    else:
-                        # Fallback to original message if can't calculate
-                        message = alert.get('메시지', f'즉시 발주 필요 (리드타임 {lead_time}일)')
-                        
-                elif status == '주의':
-                    row_class = ""
-                    status_emoji = "📋"
-                    # Debug: Print values for 주의 status
-                    print(f"\n=== 주의 Product: {alert.get('제품')} ===")
-                    print(f"Current stock: {current_stock}")
-                    print(f"Outbound: {outbound}")
-                    print(f"Daily usage: {daily_usage}")
-                    print(f"Expected consumption days from alert: {alert.get('예상 소비일', 'Not provided')}")
-                    print(f"Expected consumption days calculated: {expected_consumption_days}")
-                    print(f"Lead time: {lead_time}")
-                    print(f"Condition met? {expected_consumption_days >= lead_time if expected_consumption_days > 0 else 'No (consumption=0)'}")
-                    
-                    # 주의: current_stock > safety_stock
-                    # Calculate days until below safety stock (following app.py line 2015)
-                    if daily_usage > 0 and current_stock > safety_stock:
-                        days_until_below_safety = int((current_stock - safety_stock) / daily_usage)
-                        # Message format from app.py line 2042 exactly:
-                        # if expected_consumption_days < lead_time: first message
-                        # else: second message
-                        if expected_consumption_days > 0:
-                            if expected_consumption_days < lead_time:
-                                message = f'{days_until_below_safety}일 후 안전재고(관리자 기준) 도달 예정 - 발주 필요'
-                            else:
-                                days_remaining = int(expected_consumption_days - lead_time)
-                                message = f'리드타임까지 {days_remaining}일 남았습니다.'
-                                # Debug: Add info to see values
-                                message += f' (소비:{expected_consumption_days}일, 리드:{lead_time}일)'
-                                print('발주 시점 메시지:\n', message)
-                        else:
-                            # If no expected_consumption_days, use the first format
-                            message = f'{days_until_below_safety}일 후 안전재고(관리자 기준) 도달 예정 - 발주 필요'
-                    else:
-                        # Fallback to original message if can't calculate
-                        message = alert.get('메시지', '발주 권장')
-                        
-                elif status == '경고':
-                    row_class = "warning-row" 
-                    status_emoji = "⚠️"
-                    # 경고 is from email alert logic, not main logic
-                    # Use the message from app.py email alerts (e.g., "X일 내 발주 필요")
-                    message = alert.get('메시지', '')
-                    
-                else:
-                    row_class = ""
-                    status_emoji = ""
-                    message = alert.get('메시지', '')
-                
-                html += f"""
+
+_ORDER_ROW = """
                         <tr class="{row_class}">
-                            <td><strong>{alert.get('제품', '')}</strong></td>
-                            <td>{safety_stock:,}개</td>
-                            <td>{current_stock:,}개</td>
+                            <td><strong>{product}</strong></td>
+                            <td>{safety_stock}개</td>
+                            <td>{current_stock}개</td>
                             <td>{lead_time}일</td>
-                            <td>{status_emoji} {status}</td>
+                            <td>{status}</td>
                             <td>{message}</td>
                         </tr>
                 """
-            
-            html += """
-                    </table>
-                </div>
-            """
-        
-        # # 재고 부족 현황
-        if stock_alerts:
-            # Filter out alerts with '경고' status and sort by priority: 긴급 first, then 주의
-            filtered_stock_alerts = [a for a in stock_alerts if a.get('상태') != '경고']
-            sorted_stock_alerts = sorted(filtered_stock_alerts, key=lambda x: 0 if x.get('상태') == '긴급' else 1)
-            
-            html += """
+
+_STOCK_SECTION = """
                 <div class="alert-section">
                     <h2 style="color: #ff6b6b;">📦 재고 부족 현황</h2>
                     <table>
@@ -251,53 +80,18 @@ class EmailAlertSystem:
                             <th>메시지</th>
                         </tr>
             """
-            
-            for alert in sorted_stock_alerts:
-                status = alert.get('상태', '')
-                current_stock = alert.get('현재 재고량', 0)
-                safety_stock = alert.get('안전재고량', alert.get('안전재고_관리자', 0))
-                
-                # Generate message following app.py logic exactly
-                if status == '긴급':
-                    row_class = "urgent-row"
-                    status_emoji = "🚨"
-                    # Same format as app.py: 재고 X개, 안전재고(Y개)의 50% 미만
-                    message = f'현재 재고 {current_stock:,}개, 안전재고({safety_stock:,}개)의 50% 미만'
-                elif status == '주의':
-                    row_class = ""
-                    status_emoji = "📋"
-                    # Same format as app.py: 재고 X개, 안전재고(Y개) 미만
-                    message = f'현재 재고 {current_stock:,}개, 안전재고({safety_stock:,}개) 미만'
-                else:
-                    row_class = ""
-                    status_emoji = ""
-                    message = alert.get('메시지', '')
-                
-                html += f"""
+
+_STOCK_ROW = """
                         <tr class="{row_class}">
-                            <td><strong>{alert.get('제품', '')}</strong></td>
-                            <td>{current_stock:,}개</td>
-                            <td>{safety_stock:,}개</td>
-                            <td>{status_emoji} {status}</td>
+                            <td><strong>{product}</strong></td>
+                            <td>{current_stock}개</td>
+                            <td>{safety_stock}개</td>
+                            <td>{status}</td>
                             <td>{message}</td>
                         </tr>
                 """
-            
-            html += """
-                    </table>
-                </div>
-            """
-        
-        # Add expiry alerts section
-        if expiry_alerts:
-            # Separate expired and non-expired products
-            expired_products = [a for a in expiry_alerts if a.get('남은 일수', 0) < 0]
-            non_expired_products = [a for a in expiry_alerts if a.get('남은 일수', 0) >= 0]
-            
-            # Sort non-expired by days remaining (urgent first)
-            non_expired_products.sort(key=lambda x: x.get('남은 일수', 999))
-            
-            html += """
+
+_EXPIRY_SECTION = """
                 <div class="alert-section">
                     <h2 style="color: #FF6B6B;">⏰ 소비기한 임박</h2>
                     <table>
@@ -309,73 +103,55 @@ class EmailAlertSystem:
                             <th>상태</th>
                         </tr>
             """
-            
-            # Add expired products first (if any)
-            for alert in expired_products:
-                html += f"""
-                        <tr class="urgent-row">
-                            <td><strong>{alert.get('제품', '')}</strong></td>
-                            <td>{alert.get('현재 재고량', 0):,}개</td>
-                            <td>{alert.get('소비기한', '')}</td>
-                            <td><strong style="color: #d32f2f;">{alert.get('남은 일수', 0)}일</strong></td>
-                            <td>🚨 긴급</td>
+
+_EXPIRY_ROW = """
+                        <tr class="{row_class}">
+                            <td><strong>{product}</strong></td>
+                            <td>{current_stock}개</td>
+                            <td>{expiry}</td>
+                            <td><strong{days_style}>{days_left}일</strong></td>
+                            <td>{status}</td>
                         </tr>
                 """
-            
-            # Add non-expired products
-            for alert in non_expired_products:
-                days_remaining = alert.get('남은 일수', 0)
-                
-                # Determine row class and emoji based on days remaining (matching app.py logic exactly)
-                # app.py logic: <=7 days: 긴급, <=14 days: 경고, <=21 days: 주의, >21 days: no specific status
-                if days_remaining <= 7:
-                    row_class = "urgent-row"
-                    status_emoji = "🚨"
-                    status_text = "긴급"
-                elif days_remaining <= 14:
-                    row_class = "warning-row"
-                    status_emoji = "⚠️"
-                    status_text = "경고"
-                elif days_remaining <= 21:
-                    row_class = ""
-                    status_emoji = "📋"
-                    status_text = "주의"
-                else:
-                    # More than 21 days - no specific status (monitoring only)
-                    row_class = ""
-                    status_emoji = ""
-                    status_text = ""
-                
-                # Only show status if it's within the alert threshold
-                status_display = f"{status_emoji} {status_text}" if status_text else ""
-                
-                html += f"""
-                        <tr class="{row_class}">
-                            <td><strong>{alert.get('제품', '')}</strong></td>
-                            <td>{alert.get('현재 재고량', 0):,}개</td>
-                            <td>{alert.get('소비기한', '')}</td>
-                            <td><strong>{alert.get('남은 일수', 0)}일</strong></td>
-                            <td>{status_display}</td>
+
+_RESOLVED_SECTION = """
+                <div class="alert-section">
+                    <h2 style="color: #2e7d32;">✅ 해소된 알림</h2>
+                    <table>
+                        <tr>
+                            <th>제품명</th>
+                            <th>유형</th>
+                            <th>마지막 상태</th>
+                            <th>마지막 메시지</th>
+                            <th>해소 시각</th>
+                        </tr>
+            """
+
+_RESOLVED_ROW = """
+                        <tr>
+                            <td><strong>{product}</strong></td>
+                            <td>{alert_type}</td>
+                            <td>{severity}</td>
+                            <td>{message}</td>
+                            <td>{resolved_at}</td>
                         </tr>
                 """
-            
-            html += """
+
+_SECTION_END = """
                     </table>
                 </div>
             """
-        
-        # Add summary
-        total_urgent = len([a for a in order_alerts if a.get('상태') == '긴급']) + len([a for a in stock_alerts if a.get('상태') == '긴급']) + len([a for a in expiry_alerts if a.get('상태') == '긴급'])
-        
-        html += f"""
+
+_ALERT_SUMMARY = """
                 <div class="alert-section">
                     <h3>📊 요약</h3>
                     <ul>
-                        <li>발주 필요: {len(order_alerts)}개 제품</li>
-                        <li>재고 부족: {len(stock_alerts)}개 제품</li>
-                        <li>소비기한 임박: {len(expiry_alerts)}개 제품</li>
-                        <li>긴급 처리 필요: {total_urgent}개 제품</li>
-                        <li>총 {len(alerts)}개 제품 주의 필요</li>
+                        <li>발주 필요: {order_count}개 제품</li>
+                        <li>재고 부족: {stock_count}개 제품</li>
+                        <li>소비기한 임박: {expiry_count}개 제품</li>
+                        <li>긴급 처리 필요: {urgent_count}개 제품</li>
+                        <li>총 {total_count}개 제품 주의 필요</li>
+                        {resolved_summary}
                     </ul>
                 </div>
                 
@@ -387,33 +163,232 @@ class EmailAlertSystem:
         </body>
         </html>
         """
+
+# 상태 -> (row class, status cell)
+_STATUS_CELLS = {
+    status: (row_class, f"{emoji} {status}")
+    for status, (row_class, emoji) in {'긴급': ('urgent-row', '🚨'), '경고': ('warning-row', '⚠️'), '주의': ('', '📋')}.items()
+}
+# html.escape as one translate call
+_HTML_ESCAPES = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#x27;'})
+
+# Alert-set hash -> rendered document, most recent last
+_rendered_alerts = OrderedDict()
+_rendered_lock = threading.Lock()
+_RENDERED_CACHE_SIZE = 8
+
+
+def _text(value) -> str:
+    return str(value).translate(_HTML_ESCAPES) if value is not None else ''
+
+
+def _count(value) -> str:
+    """Thousands-separated number (other values as text)"""
+    return f"{value:,}" if isinstance(value, (int, float)) else _text(value)
+
+
+def _status_cells(status) -> tuple:
+    cells = _STATUS_CELLS.get(status)
+    return cells if cells is not None else ('', _text(status))
+
+
+def alert_set_hash(alerts: List[Dict], resolved: Optional[List[Dict]] = None) -> str:
+    """Hash of an alert email's content (including the date in its header)"""
+    # Equal content pickles to equal bytes (an unequal pickle of equal content only costs a render)
+    payload = pickle.dumps([datetime.now().strftime("%Y-%m-%d"), alerts, resolved], protocol=4)
+    return hashlib.sha1(payload).hexdigest()
+
+
+def _write_inventory_alert_html(out, alerts: List[Dict], resolved: Optional[List[Dict]]) -> None:
+    # Group alerts by type in one pass
+    groups = {'발주 시점': [], '재고 부족': [], '소비기한 임박': []}
+    for alert in alerts:
+        group = groups.get(alert.get('유형'))
+        if group is not None:
+            group.append(alert)
+    order_alerts, stock_alerts, expiry_alerts = groups['발주 시점'], groups['재고 부족'], groups['소비기한 임박']
+    
+    out.write(_ALERT_HEAD.format_map({'date': datetime.now().strftime("%Y년 %m월 %d일")}))
+    
+    # 발주 시점 알림 (긴급 first; status and message come from utils.alert_engine)
+    if order_alerts:
+        out.write(_ORDER_SECTION)
+        for alert in sorted(order_alerts, key=lambda a: a.get('상태') != '긴급'):
+            row_class, status = _status_cells(alert.get('상태', ''))
+            out.write(_ORDER_ROW.format_map({
+                'row_class': row_class, 'product': _text(alert.get('제품', '')),
+                'safety_stock': _count(alert.get('안전재고량', 0)),
+                'current_stock': _count(alert.get('현재 재고량', 0)),
+                'lead_time': alert.get('리드타임', 0), 'status': status,
+                'message': _text(alert.get('메시지', '')),
+            }))
+        out.write(_SECTION_END)
+    
+    # 재고 부족 현황 (without 경고, 긴급 first)
+    if stock_alerts:
+        out.write(_STOCK_SECTION)
+        listed = [a for a in stock_alerts if a.get('상태') != '경고']
+        for alert in sorted(listed, key=lambda a: a.get('상태') != '긴급'):
+            row_class, status = _status_cells(alert.get('상태', ''))
+            out.write(_STOCK_ROW.format_map({
+                'row_class': row_class, 'product': _text(alert.get('제품', '')),
+                'current_stock': _count(alert.get('현재 재고량', 0)),
+                'safety_stock': _count(alert.get('안전재고량', alert.get('안전재고_관리자', 0))),
+                'status': status, 'message': _text(alert.get('메시지', '')),
+            }))
+        out.write(_SECTION_END)
+    
+    # 소비기한 임박: expired products first, then by days remaining
+    if expiry_alerts:
+        out.write(_EXPIRY_SECTION)
+        expired = [a for a in expiry_alerts if a.get('남은 일수', 0) < 0]
+        remaining = sorted((a for a in expiry_alerts if a.get('남은 일수', 0) >= 0),
+                           key=lambda a: a.get('남은 일수', 999))
+        for alert in expired + remaining:
+            is_expired = alert.get('남은 일수', 0) < 0
+            row_class, status = _status_cells('긴급' if is_expired else alert.get('상태', ''))
+            out.write(_EXPIRY_ROW.format_map({
+                'row_class': row_class, 'product': _text(alert.get('제품', '')),
+                'current_stock': _count(alert.get('현재 재고량', 0)),
+                'expiry': _text(alert.get('소비기한', '')),
+                'days_style': ' style="color: #d32f2f;"' if is_expired else '',
+                'days_left': alert.get('남은 일수', 0), 'status': status,
+            }))
+        out.write(_SECTION_END)
+    
+    # 해소된 알림 (digest only)
+    if resolved:
+        out.write(_RESOLVED_SECTION)
+        for row in resolved:
+            resolved_at = row.get('resolved_at')
+            out.write(_RESOLVED_ROW.format_map({
+                'product': _text((row.get('details') or {}).get('제품', row['마스터_sku'])),
+                'alert_type': _text(row['alert_type']), 'severity': _text(row['severity']),
+                'message': _text(row.get('message') or ''),
+                'resolved_at': resolved_at.strftime('%Y-%m-%d %H:%M') if resolved_at else '',
+            }))
+        out.write(_SECTION_END)
+    
+    out.write(_ALERT_SUMMARY.format_map({
+        'order_count': len(order_alerts), 'stock_count': len(stock_alerts), 'expiry_count': len(expiry_alerts),
+        'urgent_count': sum(a.get('상태') == '긴급' for group in groups.values() for a in group),
+        'total_count': len(alerts),
+        'resolved_summary': f"<li>해소: {len(resolved)}건</li>" if resolved is not None else "",
+    }))
+
+
+def render_inventory_alert_html(alerts: List[Dict], resolved: Optional[List[Dict]] = None) -> tuple:
+    """
+    Inventory alert email for an alert set, rendered once per alert-set hash
+    
+    Args:
+        alerts: Alert dicts (alert_engine.alert_records)
+        resolved: Alert state rows resolved since the last email (digest only)
+    
+    Returns:
+        Tuple of (alert-set hash, HTML); the same set gets the same document back for
+        preview, send and the outbox copy
+    """
+    key = alert_set_hash(alerts, resolved)
+    with _rendered_lock:
+        html = _rendered_alerts.get(key)
+        if html is not None:
+            _rendered_alerts.move_to_end(key)
+            return key, html
+    
+    out = io.StringIO()
+    _write_inventory_alert_html(out, alerts, resolved)
+    html = out.getvalue()
+    with _rendered_lock:
+        _rendered_alerts[key] = html
+        while len(_rendered_alerts) > _RENDERED_CACHE_SIZE:
+            _rendered_alerts.popitem(last=False)
+    return key, html
+
+
+class EmailAlertSystem:
+    def __init__(self):
+        # Email configuration from environment variables (sent by utils.mail_outbox)
+        settings = smtp_settings()
+        self.smtp_server = settings['server']
+        self.smtp_port = settings['port']
+        self.sender_email = settings['sender_email']
+        self.sender_password = settings['sender_password']
         
-        return html
+        # Check if email is properly configured (a plain local relay needs no password)
+        self.is_configured = bool(self.sender_email and (self.sender_password or not settings['starttls']))
+        
+    def send_inventory_alert(self, recipient_email: str, alerts: List[Dict]) -> bool:
+        """Send inventory shortage alert email"""
+        subject = f'[PLAYAUTO] 재고 부족 알림 - {datetime.now().strftime("%Y-%m-%d")}'
+        return self._send_html(recipient_email, subject, self._create_inventory_alert_html(alerts))
     
-    def send_order_reminder(self, recipient_email: str, order_list: List[Dict]) -> bool:
-        """Send order reminder email with recommended quantities"""
+    def send_alert_digest(self, recipient_email: str, digest: Dict[str, List[Dict]]) -> bool:
+        """
+        Send the alerts that changed since the last email (see alert_engine.alert_digest)
+        
+        New and escalated alerts are listed like send_inventory_alert; resolved ones get
+        their own section.
+        """
+        alerts = [row['details'] for row in digest['new']] + [
+            dict(row['details'], 메시지=f"⬆️ 상향: {row['details'].get('메시지', '')}")
+            for row in digest['escalated']
+        ]
+        subject = (f'[PLAYAUTO] 재고 알림 변경 - {datetime.now().strftime("%Y-%m-%d")} '
+                   f'(신규 {len(digest["new"])}, 상향 {len(digest["escalated"])}, 해소 {len(digest["resolved"])})')
+        html_content = self._create_inventory_alert_html(alerts, resolved=digest['resolved'])
+        return self._send_html(recipient_email, subject, html_content)
+    
+    def _send_html(self, recipient_email: str, subject: str, html_content: str) -> bool:
+        """
+        Queue one HTML email per recipient (comma-separated) in the outbox
+        
+        Returns immediately; the background sender delivers it and records the status
+        (MailQueries.get_recent_mail). True once every message is queued.
+        """
+        if not self.is_configured:
+            print("Email not configured. Please set SENDER_EMAIL and SENDER_PASSWORD in .env file")
+            return False
+        
+        recipients = [r.strip() for r in recipient_email.split(',') if r.strip()]
+        if not recipients:
+            return False
         try:
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = f'[PLAYAUTO] 발주 추천 - {datetime.now().strftime("%Y-%m-%d")}'
-            msg['From'] = self.sender_email
-            msg['To'] = recipient_email
+            for recipient in recipients:
+                MailQueries.queue_mail(recipient, subject, html_content)
+            get_mail_sender().wake()
+            return True
             
-            # Create HTML content for order list
-            html_content = self._create_order_list_html(order_list)
+        except Exception as e:
+            print(f"Email queueing error: {str(e)}")
+            return False
+    
+    def save_alert_preview(self, recipient_email: str, alerts: List[Dict]) -> str:
+        """Save alert preview as HTML file for testing without SMTP (written once per alert set)"""
+        try:
+            key, html_content = render_inventory_alert_html(alerts)
             
-            html_part = MIMEText(html_content, 'html')
-            msg.attach(html_part)
+            # Save to file
+            filename = f"alert_preview_{datetime.now().strftime('%Y%m%d')}_{key[:12]}.html"
+            filepath = os.path.join(os.path.dirname(__file__), '..', filename)
             
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.sender_email, self.sender_password)
-                server.send_message(msg)
-                
-            return True
+            if not os.path.exists(filepath):
+                with open(filepath, 'w', encoding='utf-8') as f:
+                    f.write(html_content)
             
+            return filepath
         except Exception as e:
-            print(f"Email sending error: {str(e)}")
-            return False
+            print(f"Error saving preview: {str(e)}")
+            return None
+    
+    def _create_inventory_alert_html(self, alerts: List[Dict], resolved: Optional[List[Dict]] = None) -> str:
+        """Create HTML content for inventory alerts (and alert rows resolved since the last email)"""
+        return render_inventory_alert_html(alerts, resolved)[1]
+    
+    def send_order_reminder(self, recipient_email: str, order_list: List[Dict]) -> bool:
+        """Send order reminder email with recommended quantities"""
+        subject = f'[PLAYAUTO] 발주 추천 - {datetime.now().strftime("%Y-%m-%d")}'
+        return self._send_html(recipient_email, subject, self._create_order_list_html(order_list))
     
     def _create_order_list_html(self, order_list: List[Dict]) -> str:
         """Create HTML content for order recommendations"""
@@ -1,3 +1,4 @@
+import re
 import pandas as pd
 import streamlit as st
 from io import BytesIO
@@ -6,6 +7,39 @@ from typing import Dict, List, Optional, Tuple
 import openpyxl
 from openpyxl.styles import Font, PatternFill, Alignment
 
+# Characters Excel does not allow in sheet names, and the name length limit
+INVALID_SHEET_CHARS = re.compile(r"[\\/?*:\[\]]")
+MAX_SHEET_NAME = 31
+
+def excel_sheet_names(names: List[str], reserved: Tuple[str, ...] = ()) -> List[str]:
+    """
+    Valid, unique Excel sheet names for a list of labels
+    
+    Forbidden characters become '_', names are cut to 31 characters, and a name that
+    collides (case-insensitively, as Excel compares them) with a reserved or earlier
+    one gets a " (2)", " (3)", ... suffix.
+    
+    Args:
+        names: Labels in sheet order
+        reserved: Sheet names already used in the workbook
+    
+    Returns:
+        One sheet name per label
+    """
+    used = {name.lower() for name in reserved}
+    result = []
+    for name in names:
+        base = INVALID_SHEET_CHARS.sub('_', str(name)).strip("' ") or 'Sheet'
+        candidate = base[:MAX_SHEET_NAME]
+        number = 1
+        while candidate.lower() in used:
+            number += 1
+            suffix = f" ({number})"
+            candidate = base[:MAX_SHEET_NAME - len(suffix)] + suffix
+        used.add(candidate.lower())
+        result.append(candidate)
+    return result
+
 def create_inventory_template(products_df: pd.DataFrame) -> BytesIO:
     """
     Create an Excel template for inventory management
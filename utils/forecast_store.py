@@ -0,0 +1,522 @@
+"""
+Forecast artifacts loaded once per file version
+
+Every model generation wrote a different per-SKU layout into future_predictions.pkl:
+    {'predictions': [...], 'forecast_months': [...], ...}          adaptive (current)
+    {'forecast_months': [...], 'adaptive_forecast': [...]}         adaptive (early)
+    {'forecast_months': [...], 'arima': [...]}                     improved
+    {'predictions': {'arima': [...]}}                              nested ARIMA
+    {30: {'arima': [weekly...]}, 90: {'arima': [...], 'last_date'}}  legacy weekly
+All of them are normalized into one SKU x month matrix (NaN-padded) plus a per-SKU info
+table and a metrics table, so pages look values up instead of probing dict shapes.
+
+The normalized arrays can be exported next to the pickles as plain .npy files
+(`{model_dir}/forecast_columns/`). Those are memory-mapped read-only, so every Streamlit
+worker and the scheduler share one copy through the page cache, and loading them runs no
+pickle code. load_forecasts prefers them while they match the pickles they were made from:
+
+    python -m utils.forecast_store                 # convert every model directory found
+    python -m utils.forecast_store models_adaptive
+"""
+import json
+import os
+import pickle
+import shutil
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+PREDICTIONS_FILE = 'future_predictions.pkl'
+RESULTS_FILE = 'model_results.pkl'
+COLUMNS_DIR = 'forecast_columns'
+COLUMNS_FORMAT = 1
+
+# Candidate model directories, first existing one wins
+DEFAULT_MODEL_DIRS = ('models_adaptive', 'models', 'models_improved')
+
+INFO_COLUMNS = ['layout', 'method', 'confidence', 'august_full_prediction', 'data_points', 'forecast_months']
+METRIC_COLUMNS = ['rmse', 'mae', 'mape', 'best_model', 'confidence']
+
+
+def _legacy_monthly(entry):
+    """Monthly totals of a legacy weekly forecast (calendar months of the 90-day horizon)"""
+    predictions_90 = entry.get(90, {})
+    weekly = list(predictions_90.get('arima', []))
+    if weekly:
+        last_date = pd.to_datetime(predictions_90.get('last_date', datetime.now()))
+        weeks = pd.date_range(start=last_date + pd.Timedelta(days=7), periods=len(weekly), freq='W')
+        return pd.Series(weekly, index=weeks).groupby(weeks.to_period('M')).sum().tolist()
+    forecast_30 = list(entry.get(30, {}).get('arima', []))
+    return [float(np.sum(forecast_30))] if forecast_30 else []
+
+
+def normalize_entry(entry):
+    """
+    Monthly forecast values and layout name of one SKU entry
+
+    Args:
+        entry: Per-SKU value of future_predictions.pkl (any generation)
+
+    Returns:
+        Tuple of (list of monthly values, layout name)
+    """
+    if not isinstance(entry, dict):
+        return [], 'unknown'
+
+    predictions = entry.get('predictions')
+    if isinstance(predictions, (list, tuple, np.ndarray)):
+        return list(predictions), 'adaptive'
+    if isinstance(predictions, dict) and isinstance(predictions.get('arima'), (list, tuple, np.ndarray)):
+        return list(predictions['arima']), 'nested_arima'
+    if 'adaptive_forecast' in entry:
+        return list(entry['adaptive_forecast']), 'adaptive_forecast'
+    if isinstance(entry.get('arima'), (list, tuple, np.ndarray)):
+        return list(entry['arima']), 'improved'
+    if 30 in entry or 90 in entry:
+        return _legacy_monthly(entry), 'legacy_weekly'
+    return [], 'unknown'
+
+
+def normalize_metrics(result):
+    """rmse/mae/mape of one model_results.pkl entry (direct, adaptive, arima or legacy 90-day layout)"""
+    if not isinstance(result, dict):
+        return dict.fromkeys(METRIC_COLUMNS)
+
+    metrics = {}
+    for nested in (result.get('adaptive'), result.get('arima'), result.get(90, {}).get('arima')):
+        if isinstance(nested, dict) and nested.get('metrics'):
+            metrics = nested['metrics']
+            break
+
+    rmse = result.get('rmse')
+    return {
+        'rmse': rmse if rmse is not None else metrics.get('RMSE'),
+        'mae': result.get('mae', metrics.get('MAE')),
+        'mape': result.get('mape', metrics.get('MAPE')),
+        'best_model': result.get('best_model'),
+        'confidence': result.get('confidence'),
+    }
+
+
+def _padded(rows, horizon, fill=np.nan, dtype=float):
+    matrix = np.full((len(rows), horizon), fill, dtype=dtype)
+    for i, values in enumerate(rows):
+        if values is not None and len(values):
+            matrix[i, :len(values)] = np.asarray(values, dtype=dtype)[:horizon]
+    return matrix
+
+
+class ForecastSet:
+    """Normalized forecasts of one model directory"""
+
+    def __init__(self, skus, matrix, lengths, info, metrics, lower=None, upper=None, std=None, source=None, entries=None,
+                 residuals=None):
+        self.skus = list(skus)
+        self.index = {sku: i for i, sku in enumerate(self.skus)}
+        self.matrix = matrix
+        self.lengths = np.asarray(lengths, dtype=int)
+        # Prediction interval bounds (NaN where the model did not provide one)
+        self.lower = lower if lower is not None else np.full(matrix.shape, np.nan)
+        self.upper = upper if upper is not None else np.full(matrix.shape, np.nan)
+        # Forecast error standard deviation per month (NaN where unknown)
+        self.std = std if std is not None else np.full(matrix.shape, np.nan)
+        # Holdout residuals (actual - forecast) per SKU, NaN-padded (n, k)
+        self.residuals = residuals if residuals is not None else np.full((len(self.skus), 0), np.nan)
+        self.info = info
+        self.metrics = metrics
+        self.source = source
+        self._entries = entries
+
+    @classmethod
+    def from_pickles(cls, entries=None, results=None, source=None):
+        """Normalize the dicts of future_predictions.pkl and model_results.pkl"""
+        entries = entries or {}
+        results = results or {}
+        skus = list(entries.keys())
+
+        monthly, lower, upper, std, residuals, info = [], [], [], [], [], []
+        for sku in skus:
+            values, layout = normalize_entry(entries[sku])
+            entry = entries[sku] if isinstance(entries[sku], dict) else {}
+            monthly.append(values)
+            lower.append(entry.get('lower'))
+            upper.append(entry.get('upper'))
+            std.append(entry.get('forecast_std'))
+            residuals.append(entry.get('holdout_residuals'))
+            category_info = entry.get('category_info') or {}
+            info.append({
+                'layout': layout,
+                'method': entry.get('method', ''),
+                'confidence': entry.get('confidence', ''),
+                'august_full_prediction': entry.get('august_full_prediction'),
+                'data_points': category_info.get('data_points', 'N/A'),
+                'forecast_months': entry.get('forecast_months'),
+            })
+
+        lengths = np.array([len(values) for values in monthly], dtype=int)
+        horizon = int(lengths.max()) if len(lengths) else 0
+        residual_width = max((len(r) for r in residuals if r is not None), default=0)
+        metrics = pd.DataFrame(
+            [normalize_metrics(results[sku]) for sku in results],
+            index=list(results.keys()), columns=METRIC_COLUMNS
+        )
+        return cls(
+            skus, _padded(monthly, horizon), lengths,
+            pd.DataFrame(info, index=skus, columns=INFO_COLUMNS), metrics,
+            lower=_padded(lower, horizon), upper=_padded(upper, horizon), std=_padded(std, horizon),
+            source=source, entries=entries, residuals=_padded(residuals, residual_width)
+        )
+
+    def __len__(self):
+        return len(self.skus)
+
+    def __contains__(self, sku):
+        return sku in self.index
+
+    @property
+    def entries(self):
+        """SKU -> entry dict (the original pickle entries, or dicts rebuilt from columns in their own layout)"""
+        if self._entries is None:
+            self._entries = {sku: self.entry(sku) for sku in self.skus}
+        return self._entries
+
+    def monthly(self, sku):
+        """Monthly forecast values of a SKU (empty array if it has none)"""
+        i = self.index.get(sku)
+        if i is None:
+            return np.array([])
+        return self.matrix[i, :self.lengths[i]]
+
+    def entry(self, sku):
+        """Pickle-style entry of a SKU (for fields not normalized here)"""
+        if self._entries is not None:
+            return self._entries.get(sku, {})
+        if sku not in self.index:
+            return {}
+        info = self.sku_info(sku)
+        i, length = self.index[sku], self.lengths[self.index[sku]]
+        residuals = np.asarray(self.residuals[i])
+        entry = {
+            'forecast_std': np.array(self.std[i, :length]),
+            'lower': np.array(self.lower[i, :length]),
+            'upper': np.array(self.upper[i, :length]),
+            'forecast_months': info['forecast_months'],
+            'method': info['method'],
+            'confidence': info['confidence'],
+            'august_full_prediction': info['august_full_prediction'],
+            'category_info': {'data_points': info['data_points']},
+            'holdout_residuals': [float(r) for r in residuals[~np.isnan(residuals)]],
+        }
+        # Monthly values go back under the key of their layout: readers such as
+        # order_timing.extract_monthly_predictions align months differently per layout
+        values = np.array(self.monthly(sku))
+        layout = info['layout']
+        if layout == 'nested_arima':
+            entry['predictions'] = {'arima': values}
+        elif layout == 'improved':
+            entry['arima'] = values
+        elif layout in ('adaptive_forecast', 'legacy_weekly'):
+            # Weekly legacy values are not exported; their monthly totals read as adaptive_forecast
+            entry['adaptive_forecast'] = values
+        else:
+            entry['predictions'] = values
+        return entry
+
+    def sku_info(self, sku):
+        """Info row (layout, method, confidence, ...) of a SKU as a dict"""
+        if sku not in self.index:
+            return {}
+        return self.info.loc[sku].to_dict()
+
+    def sku_metrics(self, sku):
+        """Metrics (rmse, mae, mape, ...) of a SKU; values are None when unknown"""
+        if sku not in self.metrics.index:
+            return dict.fromkeys(METRIC_COLUMNS)
+        return {k: (None if pd.isna(v) else v) for k, v in self.metrics.loc[sku].to_dict().items()}
+
+
+EMPTY_FORECASTS = ForecastSet.from_pickles()
+
+
+def _strings(values):
+    """Fixed-width unicode array ('' for missing), loadable without pickle"""
+    return np.array(['' if v is None or (isinstance(v, float) and np.isnan(v)) else str(v) for v in values], dtype=str)
+
+
+def _encode(values):
+    """Dictionary-encode strings into (int32 codes, vocabulary)"""
+    vocabulary, codes = np.unique(_strings(values), return_inverse=True)
+    return codes.astype(np.int32), vocabulary
+
+
+def _numbers(values):
+    return pd.to_numeric(pd.Series(list(values), dtype=object), errors='coerce').to_numpy(dtype=float)
+
+
+def export_columns(model_dir):
+    """
+    Write the normalized forecasts of `model_dir` as .npy columns in {model_dir}/forecast_columns
+
+    The directory is written under a temporary name and swapped in, so readers never see
+    a half-written export; processes that mapped the previous files keep reading them.
+
+    Args:
+        model_dir: Directory holding future_predictions.pkl (and optionally model_results.pkl)
+
+    Returns:
+        Path of the written directory
+    """
+    predictions_path = os.path.join(model_dir, PREDICTIONS_FILE)
+    results_path = os.path.join(model_dir, RESULTS_FILE)
+    predictions_version = _file_version(predictions_path)
+    results_version = _file_version(results_path)
+
+    with open(predictions_path, 'rb') as f:
+        entries = pickle.load(f)
+    results = {}
+    if results_version is not None:
+        with open(results_path, 'rb') as f:
+            results = pickle.load(f)
+
+    forecasts = ForecastSet.from_pickles(entries, results, source=model_dir)
+    info = forecasts.info
+    horizon = forecasts.matrix.shape[1]
+    months = [months if isinstance(months, (list, tuple)) else [] for months in info['forecast_months']]
+    layout_codes, layouts = _encode(info['layout'])
+    method_codes, methods = _encode(info['method'])
+    confidence_codes, confidences = _encode(info['confidence'])
+    metric_confidence_codes, metric_confidences = _encode(forecasts.metrics['confidence'])
+
+    columns = {
+        'skus': _strings(forecasts.skus),
+        'point': forecasts.matrix,
+        'lower': forecasts.lower,
+        'upper': forecasts.upper,
+        'std': forecasts.std,
+        'residuals': forecasts.residuals,
+        'lengths': forecasts.lengths.astype(np.int32),
+        'months': _padded([_strings(m) for m in months], horizon, fill='', dtype='<U32'),
+        'layout_codes': layout_codes, 'layouts': layouts,
+        'method_codes': method_codes, 'methods': methods,
+        'confidence_codes': confidence_codes, 'confidences': confidences,
+        'august_full_prediction': _numbers(info['august_full_prediction']),
+        'data_points': _numbers(info['data_points']),
+        'metric_skus': _strings(forecasts.metrics.index),
+        'metric_values': np.column_stack([_numbers(forecasts.metrics[c]) for c in ('rmse', 'mae', 'mape')]).reshape(-1, 3),
+        'metric_best_model': _strings(forecasts.metrics['best_model']),
+        'metric_confidence_codes': metric_confidence_codes, 'metric_confidences': metric_confidences,
+    }
+
+    target = os.path.join(model_dir, COLUMNS_DIR)
+    staging = f"{target}.tmp-{os.getpid()}"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name, values in columns.items():
+        np.save(os.path.join(staging, f"{name}.npy"), values, allow_pickle=False)
+    with open(os.path.join(staging, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'format': COLUMNS_FORMAT,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'predictions_version': predictions_version,
+            'results_version': results_version,
+            'skus': len(forecasts),
+            'horizon': horizon,
+        }, f, indent=2)
+
+    previous = f"{target}.old-{os.getpid()}"
+    if os.path.exists(target):
+        os.rename(target, previous)
+    os.rename(staging, target)
+    shutil.rmtree(previous, ignore_errors=True)
+    return target
+
+
+def _load_column(columns_dir, name):
+    path = os.path.join(columns_dir, f"{name}.npy")
+    try:
+        return np.load(path, mmap_mode='r', allow_pickle=False)
+    except ValueError:
+        # Zero-length arrays cannot be mapped
+        return np.load(path, allow_pickle=False)
+
+
+def load_columns(columns_dir, source=None):
+    """
+    Open a forecast_columns directory (memory-mapped, no pickle code is run)
+
+    Returns:
+        ForecastSet whose forecast matrices are read-only memory maps
+    """
+    c = {name[:-4]: _load_column(columns_dir, name[:-4]) for name in os.listdir(columns_dir) if name.endswith('.npy')}
+    skus = c['skus'].tolist()
+    lengths = np.asarray(c['lengths'])
+
+    info = pd.DataFrame({
+        'layout': c['layouts'][c['layout_codes']],
+        'method': c['methods'][c['method_codes']],
+        'confidence': c['confidences'][c['confidence_codes']],
+        'august_full_prediction': np.asarray(c['august_full_prediction']),
+        'data_points': [int(v) if not np.isnan(v) else 'N/A' for v in c['data_points']],
+        'forecast_months': [[str(m) for m in row if m] or None for row in c['months']],
+    }, index=skus, columns=INFO_COLUMNS)
+    info['august_full_prediction'] = info['august_full_prediction'].astype(object).where(info['august_full_prediction'].notna(), None)
+
+    metric_values = np.asarray(c['metric_values'])
+    metrics = pd.DataFrame({
+        'rmse': metric_values[:, 0],
+        'mae': metric_values[:, 1],
+        'mape': metric_values[:, 2],
+        'best_model': c['metric_best_model'],
+        'confidence': c['metric_confidences'][c['metric_confidence_codes']],
+    }, index=c['metric_skus'].tolist(), columns=METRIC_COLUMNS)
+    metrics[['best_model', 'confidence']] = metrics[['best_model', 'confidence']].replace('', None)
+
+    # Exports written before std (or residuals) was added have no such column
+    return ForecastSet(skus, c['point'], lengths, info, metrics, lower=c['lower'], upper=c['upper'], std=c.get('std'),
+                       source=source, residuals=c.get('residuals'))
+
+
+# path -> ((mtime_ns, size), loaded object)
+_file_cache = {}
+# (directory, file versions) -> ForecastSet
+_set_cache = {}
+_cache_lock = threading.Lock()
+
+
+def _file_version(path):
+    try:
+        stat = os.stat(path)
+        return [stat.st_mtime_ns, stat.st_size]
+    except OSError:
+        return None
+
+
+def _load_pickle(path):
+    """Unpickle `path`, reusing the previous result while the file is unchanged"""
+    version = _file_version(path)
+    with _cache_lock:
+        cached = _file_cache.get(path)
+        if cached and cached[0] == version:
+            return cached[1]
+
+    with open(path, 'rb') as f:
+        data = pickle.load(f)
+
+    with _cache_lock:
+        _file_cache[path] = (version, data)
+    return data
+
+
+def _columns_meta(model_dir, predictions_version, results_version):
+    """meta.json of the column export if it was made from the current pickles (or they are gone)"""
+    try:
+        with open(os.path.join(model_dir, COLUMNS_DIR, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('format') != COLUMNS_FORMAT:
+        return None
+    if predictions_version is not None and (meta.get('predictions_version') != predictions_version
+                                            or meta.get('results_version') != results_version):
+        return None  # pickles were retrained after the export
+    return meta
+
+
+def _cached_set(key, load):
+    with _cache_lock:
+        forecasts = _set_cache.get(key)
+    if forecasts is not None:
+        return forecasts
+
+    forecasts = load()
+    with _cache_lock:
+        # Keep only the current version of each directory
+        for old_key in [k for k in _set_cache if k[0] == key[0]]:
+            del _set_cache[old_key]
+        _set_cache[key] = forecasts
+    return forecasts
+
+
+def load_forecasts(model_dirs=DEFAULT_MODEL_DIRS):
+    """
+    Normalized forecasts from the first model directory that has forecasts
+
+    A current forecast_columns export is memory-mapped; otherwise the pickles are read.
+    Either is only re-read (and re-normalized) when the files change.
+
+    Args:
+        model_dirs: Candidate directories, in order of preference
+
+    Returns:
+        ForecastSet (EMPTY_FORECASTS if no directory could be loaded)
+    """
+    if isinstance(model_dirs, str):
+        model_dirs = (model_dirs,)
+
+    for model_dir in model_dirs:
+        model_dir = os.path.abspath(model_dir)
+        predictions_path = os.path.join(model_dir, PREDICTIONS_FILE)
+        results_path = os.path.join(model_dir, RESULTS_FILE)
+        predictions_version = _file_version(predictions_path)
+        results_version = _file_version(results_path)
+
+        try:
+            meta = _columns_meta(model_dir, predictions_version, results_version)
+            if meta is not None:
+                columns_dir = os.path.join(model_dir, COLUMNS_DIR)
+                key = (model_dir, 'columns', tuple(_file_version(os.path.join(columns_dir, 'meta.json')) or ()))
+                return _cached_set(key, lambda: load_columns(columns_dir, source=model_dir))
+
+            if predictions_version is None:
+                continue
+
+            key = (model_dir, 'pickle', tuple(predictions_version), tuple(results_version or ()))
+            return _cached_set(key, lambda: ForecastSet.from_pickles(
+                _load_pickle(predictions_path),
+                _load_pickle(results_path) if results_version is not None else {},
+                source=model_dir
+            ))
+        except Exception as e:
+            print(f"Failed to load forecasts from {model_dir}: {str(e)}")
+            continue
+
+    return EMPTY_FORECASTS
+
+
+# Converter: python -m utils.forecast_store [model_dir ...]
+if __name__ == "__main__":
+    import sys
+
+    from utils.order_timing import extract_forecast_std, extract_monthly_predictions
+
+    def same(left, right):
+        left, right = np.asarray(left, dtype=float), np.asarray(right, dtype=float)
+        return left.shape == right.shape and np.allclose(left, right, equal_nan=True)
+
+    model_dirs = sys.argv[1:] or [d for d in DEFAULT_MODEL_DIRS if os.path.exists(os.path.join(d, PREDICTIONS_FILE))]
+    failed = False
+    for model_dir in model_dirs:
+        target = export_columns(model_dir)
+        forecasts = load_columns(target)
+        print(f"{model_dir}: {len(forecasts)} SKUs x {forecasts.matrix.shape[1]} months -> {target}")
+
+        # Parity: what order_timing reads from the export must match what it reads from the pickle
+        with open(os.path.join(model_dir, PREDICTIONS_FILE), 'rb') as f:
+            entries = pickle.load(f)
+        horizons = sorted({1, 3, max(forecasts.matrix.shape[1], 1)})
+        mismatched = [
+            sku for sku in forecasts.skus
+            if forecasts.info.at[sku, 'layout'] != 'legacy_weekly'
+            and not all(same(extract_monthly_predictions(entries[sku], h), extract_monthly_predictions(forecasts.entry(sku), h))
+                        and same(extract_forecast_std(entries[sku], h), extract_forecast_std(forecasts.entry(sku), h))
+                        for h in horizons)
+        ]
+        if mismatched:
+            failed = True
+            print(f"  Pickle/export mismatch in {len(mismatched)} SKUs: {mismatched[:10]}")
+        else:
+            print("  Pickle/export parity: ok")
+    if failed:
+        sys.exit(1)
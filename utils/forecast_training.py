@@ -0,0 +1,690 @@
+"""
+Nightly demand-forecast training
+
+Pulls the monthly 출고 series of every SKU from the daily shipment rollup in one query,
+routes short and intermittent series to closed-form forecasters computed for all of them
+at once (see utils.baseline_forecasters), fits the rest in a process pool (ARIMA, Prophet
+when installed, and a moving-average baseline), and writes the artifacts the app reads:
+
+    future_predictions.pkl        current month + next 3 months per SKU, with error std,
+                                  80% interval and holdout residuals
+    model_results.pkl             holdout RMSE/MAE/MAPE per SKU
+    trained_models.pkl            per-SKU model metadata
+    sku_categories.pkl            data category / volatility per SKU
+    model_summary_with_metrics.csv
+    forecast_columns/             memory-mapped export (see utils.forecast_store)
+
+    python -m utils.forecast_training                          # all SKUs -> models/
+    python -m utils.forecast_training --output models_adaptive --workers 8 --timeout 30
+    python -m utils.forecast_training --skus BIOBAL PSBAL --models arima   # merged into models/
+    python -m utils.forecast_training --refresh                # only SKUs whose history changed
+    python -m utils.forecast_training --no-routing             # pool-fit every SKU
+
+Each SKU fit is bounded by --timeout seconds; a SKU that times out or fails gets the
+baseline forecast instead, so one pathological series cannot stall the run.
+"""
+import argparse
+import calendar
+import hashlib
+import multiprocessing
+import os
+import pickle
+import signal
+import time
+import warnings
+from datetime import date, timedelta
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+
+from config.database import db, ShipmentQueries
+from utils import baseline_forecasters
+from utils.forecast_store import PREDICTIONS_FILE, RESULTS_FILE, export_columns
+
+# Forecast horizon: current month + next 3 months
+HORIZON = 4
+AVAILABLE_MODELS = ('arima', 'prophet')
+ARIMA_ORDERS = [(1, 0, 0), (0, 1, 1), (1, 1, 0), (1, 1, 1)]
+
+# (minimum months of history, category, method, confidence); first match wins
+DATA_CATEGORIES = [
+    (24, 'RICH_DATA', 'rich_data_ensemble', 'medium-high'),
+    (9, 'MODERATE_DATA', 'moderate_data_autoarima_ensemble', 'medium'),
+    (6, 'LIMITED_DATA', 'limited_data_ensemble', 'low-medium'),
+    (3, 'SPARSE_DATA', 'baseline_limited_data', 'low'),
+    (0, 'INSUFFICIENT_DATA', 'baseline_insufficient_data', 'very_low'),
+]
+# Categories below this many months only get the baseline
+MIN_MONTHS_FOR_MODELS = 6
+# Coverage of the lower/upper prediction interval written with each forecast
+INTERVAL_COVERAGE = 0.8
+
+
+class FitTimeout(Exception):
+    pass
+
+
+def _raise_timeout(signum, frame):
+    raise FitTimeout()
+
+
+def _with_timeout(seconds, func, *args):
+    """Run func(*args), raising FitTimeout after `seconds` (main thread, POSIX only)"""
+    if not seconds or not hasattr(signal, 'SIGALRM'):
+        return func(*args)
+    previous = signal.signal(signal.SIGALRM, _raise_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        return func(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def load_monthly_series(current_month: date, skus=None):
+    """
+    Monthly 출고 series of every SKU up to the last complete month (one query)
+
+    Months without shipments inside a SKU's history count as 0.
+
+    Args:
+        current_month: First day of the month being forecast first (excluded from training)
+        skus: Optional list of SKUs to keep
+
+    Returns:
+        Tuple of (DataFrame SKU x month of out_qty, DataFrame SKU x month of out_days)
+    """
+    last_day = current_month - timedelta(days=1)
+    rows = ShipmentQueries.get_monthly_shipments(end_date=last_day)
+    monthly = pd.DataFrame(rows, columns=['마스터_sku', 'month', 'in_qty', 'out_qty', 'out_days'])
+    if skus:
+        monthly = monthly[monthly['마스터_sku'].isin(skus)]
+    monthly = monthly[monthly['out_qty'] > 0]
+    if monthly.empty:
+        return pd.DataFrame(), pd.DataFrame()
+
+    months = pd.period_range(pd.Period(monthly['month'].min(), 'M'), pd.Period(last_day, 'M'), freq='M')
+    monthly['period'] = pd.PeriodIndex(pd.to_datetime(monthly['month']), freq='M')
+    quantities = monthly.pivot_table(index='마스터_sku', columns='period', values='out_qty', aggfunc='sum')
+    days = monthly.pivot_table(index='마스터_sku', columns='period', values='out_days', aggfunc='sum')
+    return (quantities.reindex(columns=months).fillna(0).astype(float),
+            days.reindex(columns=months).fillna(0).astype(int))
+
+
+def series_for_sku(row: pd.Series) -> pd.Series:
+    """History of one SKU from its first month with shipments"""
+    nonzero = np.flatnonzero(row.to_numpy() > 0)
+    return row.iloc[nonzero[0]:] if len(nonzero) else row.iloc[0:0]
+
+
+def categorize(y: np.ndarray, active_days: int = 0) -> dict:
+    """Data category, volatility and trend of a monthly series"""
+    data_points = len(y)
+    category = next(c for c in DATA_CATEGORIES if data_points >= c[0])
+    mean = float(np.mean(y)) if data_points else 0.0
+    std = float(np.std(y)) if data_points else 0.0
+    cv = std / mean if mean > 0 else 0.0
+    slope = float(np.polyfit(np.arange(data_points), y, 1)[0]) if data_points >= 2 else 0.0
+    trend_strength = abs(slope) / mean if mean > 0 else 0.0
+    return {
+        'category': category[1],
+        'volatility': 'LOW' if cv < 0.3 else 'MEDIUM' if cv < 0.6 else 'HIGH',
+        'trend_type': _trend_type(slope, trend_strength),
+        'trend_strength': trend_strength,
+        'data_points': data_points,
+        'avg_monthly_quantity': mean,
+        'std_monthly_quantity': std,
+        'cv': cv,
+        'total_days_data': int(active_days),
+        'total_weeks_data': int(np.ceil(data_points * 30.44 / 7)),
+    }
+
+
+def _trend_type(slope, strength, threshold=0.05):
+    if strength < threshold:
+        return 'STABLE'
+    return 'INCREASING' if slope > 0 else 'DECREASING'
+
+
+def future_trend(predictions) -> dict:
+    """Trend summary of the forecast months"""
+    predictions = np.asarray(predictions, dtype=float)
+    mean = predictions.mean() if len(predictions) else 0.0
+    slope = np.polyfit(np.arange(len(predictions)), predictions, 1)[0] if len(predictions) >= 2 else 0.0
+    strength = abs(slope) / mean if mean > 0 else 0.0
+    previous = predictions[:-1]
+    month_changes = [float(c) for c in np.where(previous > 0, (predictions[1:] - previous) / np.where(previous > 0, previous, 1) * 100, 0.0)]
+    trend_type = _trend_type(slope, strength)
+    avg_change_rate = float(np.mean(month_changes)) if month_changes else 0.0
+    return {
+        'type': trend_type,
+        'strength': float(strength),
+        'slope': float(slope),
+        'avg_change_rate': avg_change_rate,
+        'month_changes': month_changes,
+        'order_alert': trend_type == 'INCREASING' and avg_change_rate > 10,
+    }
+
+
+def forecast_baseline(y: np.ndarray, horizon: int) -> np.ndarray:
+    """Flat forecast at the mean of the last 3 months"""
+    if len(y) == 0:
+        return np.zeros(horizon)
+    return np.full(horizon, float(np.mean(y[-3:])))
+
+
+def forecast_arima(y: np.ndarray, horizon: int) -> np.ndarray:
+    """ARIMA forecast with the order picked by AIC from ARIMA_ORDERS"""
+    from statsmodels.tsa.arima.model import ARIMA
+
+    best = None
+    for order in ARIMA_ORDERS:
+        try:
+            with warnings.catch_warnings():
+                # Convergence / start parameter warnings are expected on short series
+                warnings.simplefilter('ignore')
+                fitted = ARIMA(y, order=order).fit()
+        except Exception:
+            continue
+        if best is None or fitted.aic < best.aic:
+            best = fitted
+    if best is None:
+        raise ValueError("no ARIMA order could be fitted")
+    return np.asarray(best.forecast(horizon), dtype=float)
+
+
+def forecast_prophet(y: np.ndarray, horizon: int, months: pd.PeriodIndex) -> np.ndarray:
+    """Prophet forecast on month-start dates (yearly seasonality once 2 years are available)"""
+    from prophet import Prophet
+
+    history = pd.DataFrame({'ds': months.to_timestamp(), 'y': y})
+    model = Prophet(yearly_seasonality=len(y) >= 24, weekly_seasonality=False, daily_seasonality=False)
+    model.fit(history)
+    future = model.make_future_dataframe(periods=horizon, freq='MS', include_history=False)
+    return model.predict(future)['yhat'].to_numpy(dtype=float)
+
+
+def _model_forecast(model, y, horizon, months):
+    if model == 'arima':
+        return forecast_arima(y, horizon)
+    if model == 'prophet':
+        return forecast_prophet(y, horizon, months)
+    return forecast_baseline(y, horizon)
+
+
+def _error_metrics(actual, predicted):
+    errors = np.asarray(predicted) - np.asarray(actual)
+    nonzero = np.asarray(actual) != 0
+    return {
+        'rmse': float(np.sqrt(np.mean(errors ** 2))),
+        'mae': float(np.mean(np.abs(errors))),
+        'mape': float(np.mean(np.abs(errors[nonzero] / np.asarray(actual)[nonzero])) * 100) if nonzero.any() else None,
+    }
+
+
+def fit_sku(sku, y, months, models, horizon=HORIZON):
+    """
+    Evaluate candidate models on a holdout, then forecast with their inverse-RMSE ensemble
+
+    Args:
+        sku: Master SKU (only used in the result)
+        y: Monthly history (oldest first)
+        months: PeriodIndex of y
+        models: Model names to try besides the baseline
+
+    Returns:
+        Dictionary with predictions, ensemble holdout metrics and residuals, weights and test_periods
+    """
+    n = len(y)
+    candidates = list(models) if n >= MIN_MONTHS_FOR_MODELS else []
+    candidates.append('baseline')
+    test_periods = min(3, max(1, n // 4)) if n >= 5 else 0
+
+    holdout = {}
+    if test_periods:
+        train, actual = y[:-test_periods], y[-test_periods:]
+        for model in candidates:
+            try:
+                holdout[model] = np.clip(_model_forecast(model, train, test_periods, months[:-test_periods]), 0, None)
+            except FitTimeout:
+                raise
+            except Exception:
+                continue
+
+    if holdout:
+        errors = {model: _error_metrics(actual, forecast)['rmse'] for model, forecast in holdout.items()}
+        weights = {model: 1 / max(rmse, 1e-6) for model, rmse in errors.items()}
+    else:
+        weights = {'baseline': 1.0}
+    total = sum(weights.values())
+    weights = {model: weight / total for model, weight in weights.items()}
+
+    forecasts = {}
+    for model in weights:
+        try:
+            forecasts[model] = np.clip(_model_forecast(model, y, horizon, months), 0, None)
+        except FitTimeout:
+            raise
+        except Exception:
+            continue
+    if not forecasts:
+        forecasts = {'baseline': forecast_baseline(y, horizon)}
+    used_total = sum(weights.get(model, 0) for model in forecasts) or 1.0
+    used_weights = {model: weights.get(model, 0) / used_total for model in forecasts}
+    predictions = sum(forecasts[model] * used_weights[model] for model in forecasts)
+
+    metrics = dict.fromkeys(['rmse', 'mae', 'mape'])
+    residuals = []
+    if holdout:
+        ensemble_holdout = sum(holdout[model] * weights[model] for model in holdout)
+        metrics = _error_metrics(actual, ensemble_holdout)
+        residuals = [float(r) for r in actual - ensemble_holdout]
+
+    return {
+        'sku': sku,
+        'predictions': predictions,
+        'models': list(forecasts),
+        'weights': used_weights,
+        'test_periods': test_periods if holdout else 0,
+        'residuals': residuals,
+        **metrics,
+    }
+
+
+# (method, confidence) of SKUs routed to a closed-form forecaster despite enough history
+# for fitted models (shorter ones keep their DATA_CATEGORIES method and confidence)
+ROUTED_METHODS = {
+    'croston': ('intermittent_croston_sba', 'low-medium'),
+}
+
+
+def fit_routed(skus, Y, methods, horizon=HORIZON):
+    """
+    Closed-form forecasts and holdout metrics for SKUs routed away from the model pool
+
+    Args:
+        skus: SKUs of the rows of Y
+        Y: History matrix (see baseline_forecasters.history_matrix)
+        methods: baseline_forecasters.route() result per row
+
+    Returns:
+        Dictionary of SKU -> fit result, same shape as fit_sku()
+    """
+    lengths = baseline_forecasters.history_lengths(Y)
+    # Same holdout length rule as fit_sku
+    test_periods = np.where(lengths >= 5, np.minimum(3, np.maximum(1, lengths // 4)), 0)
+    predictions = np.zeros((len(Y), horizon))
+    metrics = {name: np.full(len(Y), np.nan) for name in ('rmse', 'mae', 'mape')}
+    residuals = np.full((len(Y), 3), np.nan)
+    for method in np.unique(methods):
+        rows = methods == method
+        predictions[rows] = baseline_forecasters.forecast(Y[rows], method, horizon)
+        for periods in np.unique(test_periods[rows]):
+            group = rows & (test_periods == periods)
+            if periods:
+                errors = baseline_forecasters.holdout_errors(Y[group], method, periods)
+                residuals[group, :periods] = errors.pop('residuals')
+                for name, values in errors.items():
+                    metrics[name][group] = values
+
+    results = {}
+    for i, sku in enumerate(skus):
+        method = str(methods[i])
+        result = {
+            'sku': sku,
+            'predictions': predictions[i],
+            'models': [method],
+            'weights': {method: 1.0},
+            'test_periods': int(test_periods[i]),
+            'residuals': [float(r) for r in residuals[i] if not np.isnan(r)],
+            **{name: None if np.isnan(values[i]) else float(values[i]) for name, values in metrics.items()},
+        }
+        if method in ROUTED_METHODS and lengths[i] >= MIN_MONTHS_FOR_MODELS:
+            result['method'], result['confidence'] = ROUTED_METHODS[method]
+        results[sku] = result
+    return results
+
+
+def _train_one(task, models, timeout):
+    sku, y, months = task
+    try:
+        return _with_timeout(timeout, fit_sku, sku, y, months, models)
+    except FitTimeout:
+        reason = 'timeout'
+    except Exception as e:
+        reason = f"error: {str(e)}"
+    return {
+        'sku': sku, 'predictions': forecast_baseline(y, HORIZON), 'models': ['baseline'],
+        'weights': {'baseline': 1.0}, 'test_periods': 0, 'rmse': None, 'mae': None, 'mape': None,
+        'residuals': [], 'fallback': reason,
+    }
+
+
+def _train_chunk(tasks, models, timeout):
+    """Worker entry point: fit a chunk of SKUs sequentially"""
+    return [_train_one(task, models, timeout) for task in tasks]
+
+
+def init_worker_process():
+    """
+    Pool initializer for CPU-bound workers (training, backtests, simulation)
+
+    One BLAS thread per process, since the pool already uses every core; warnings off;
+    SIGINT ignored so the parent handles Ctrl+C. Never call it in the parent process.
+    """
+    for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[variable] = '1'
+    try:
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    except ImportError:
+        pass
+    warnings.filterwarnings('ignore')
+    # Let the parent handle Ctrl+C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def train_all(tasks, models, workers=None, timeout=60, chunk_size=8):
+    """
+    Fit every (sku, y, months) task in a process pool
+
+    Args:
+        tasks: List of (sku, history array, PeriodIndex)
+        models: Model names to try besides the baseline
+        workers: Worker processes (default: all cores)
+        timeout: Seconds allowed per SKU
+        chunk_size: SKUs per pool task
+
+    Returns:
+        Dictionary of SKU -> fit result
+    """
+    workers = workers or os.cpu_count() or 1
+    chunks = [tasks[i:i + chunk_size] for i in range(0, len(tasks), chunk_size)]
+    results = {}
+
+    if workers == 1:
+        # In process: silence fit warnings for this run only; Ctrl+C and BLAS threads stay as they are
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            for chunk in chunks:
+                for result in _train_chunk(chunk, models, timeout):
+                    results[result['sku']] = result
+        return results
+
+    pool = multiprocessing.Pool(workers, initializer=init_worker_process)
+    try:
+        pending = [(chunk, pool.apply_async(_train_chunk, (chunk, models, timeout))) for chunk in chunks]
+        for chunk, async_result in pending:
+            try:
+                # Per-SKU alarms normally fire first; this catches workers stuck outside Python code
+                chunk_results = async_result.get(timeout=timeout * len(chunk) + 60 if timeout else None)
+            except multiprocessing.TimeoutError:
+                chunk_results = [_train_one((sku, y, months), [], None) for sku, y, months in chunk]
+                for result in chunk_results:
+                    result['fallback'] = 'timeout'
+            for result in chunk_results:
+                results[result['sku']] = result
+    finally:
+        # terminate() also kills any worker still stuck on a timed-out chunk
+        pool.terminate()
+        pool.join()
+    return results
+
+
+def compute_watermarks(series, current_month: date):
+    """
+    Per-SKU watermark of the training data as of now
+
+    Combines a fingerprint of the monthly series (catches late or back-dated receipts and
+    applied edits) with the last 시점/inv_code and count of the receipts behind it and a
+    hash of decided edit requests in playauto_inNout_adjust.
+
+    Returns:
+        Dictionary of SKU -> watermark dict (values are strings, comparable across runs)
+    """
+    ledger = {row['마스터_sku']: row for row in ShipmentQueries.get_training_watermarks(current_month)}
+    last_month = str(pd.Period(current_month, 'M') - 1)
+    watermarks = {}
+    for sku in series.index:
+        history = series_for_sku(series.loc[sku])
+        fingerprint = hashlib.sha1(str(history.index[0] if len(history) else '').encode())
+        fingerprint.update(history.to_numpy(dtype=float).tobytes())
+        row = ledger.get(sku, {})
+        watermarks[sku] = {
+            'last_month': last_month,
+            'series_hash': fingerprint.hexdigest(),
+            'last_time': str(row.get('last_time')),
+            'last_inv_code': str(row.get('last_inv_code')),
+            'receipt_count': str(row.get('receipt_count')),
+            'adjust_hash': str(row.get('adjust_hash')),
+        }
+    return watermarks
+
+
+def load_previous_artifacts(output_dir):
+    """Artifacts of the last run in `output_dir` (None if any is missing)"""
+    artifacts = {}
+    try:
+        for name in (PREDICTIONS_FILE, RESULTS_FILE, 'trained_models.pkl', 'sku_categories.pkl'):
+            with open(os.path.join(output_dir, name), 'rb') as f:
+                artifacts[name] = pickle.load(f)
+        artifacts['model_summary_with_metrics.csv'] = pd.read_csv(os.path.join(output_dir, 'model_summary_with_metrics.csv'))
+    except (OSError, ValueError, pickle.UnpicklingError):
+        return None
+    return artifacts
+
+
+def changed_skus(watermarks, previous):
+    """SKUs that are new or whose watermark differs from the one stored with their forecast"""
+    if not previous:
+        return set(watermarks)
+    trained = previous['trained_models.pkl']
+    return {
+        sku for sku, watermark in watermarks.items()
+        if sku not in previous[PREDICTIONS_FILE] or (trained.get(sku) or {}).get('watermark') != watermark
+    }
+
+
+def merge_artifacts(refreshed, previous, carried_skus):
+    """Refreshed artifacts plus the previous entries of `carried_skus`, unchanged"""
+    merged = {}
+    for name, content in refreshed.items():
+        if isinstance(content, pd.DataFrame):
+            kept = previous[name][previous[name]['SKU'].isin(carried_skus)]
+            merged[name] = pd.concat([kept, content], ignore_index=True) if len(kept) else content
+        else:
+            merged[name] = {sku: previous[name][sku] for sku in carried_skus if sku in previous[name]}
+            merged[name].update(content)
+    return merged
+
+
+def forecast_error_std(result, history):
+    """
+    Per-month forecast error std: the holdout RMSE of the fit, or the spread of the
+    history when there was no holdout
+    """
+    if result.get('rmse') is not None and 'fallback' not in result:
+        return float(result['rmse'])
+    return float(np.std(history)) if len(history) else 0.0
+
+
+def build_artifacts(results, series, out_days, current_month: date, today: date, watermarks=None):
+    """Artifacts in the layout the app reads (see utils.forecast_store)"""
+    forecast_periods = pd.period_range(pd.Period(current_month, 'M'), periods=HORIZON, freq='M')
+    forecast_months = [calendar.month_name[p.month].lower() for p in forecast_periods]
+    days_in_month = calendar.monthrange(today.year, today.month)[1]
+    days_remaining = days_in_month - today.day + 1
+    last_date = (forecast_periods[0] - 1).to_timestamp()
+    interval_z = NormalDist().inv_cdf(0.5 + INTERVAL_COVERAGE / 2)
+
+    future_predictions, model_results, trained_models, sku_categories, summary = {}, {}, {}, {}, []
+    for sku, result in results.items():
+        history = series_for_sku(series.loc[sku])
+        category_info = categorize(history.to_numpy(), out_days.loc[sku].sum())
+        category = next(c for c in DATA_CATEGORIES if len(history) >= c[0])
+        method = result.get('method', category[2])
+        if 'fallback' in result:
+            method = f"baseline_{result['fallback'].split(':')[0]}"
+        confidence = result.get('confidence', category[3]) if 'fallback' not in result else 'low'
+        predictions = np.asarray(result['predictions'], dtype=float)
+        forecast_std = np.full(len(predictions), forecast_error_std(result, history.to_numpy()))
+
+        # Key names kept from the first (August) model run; they hold the current month
+        future_predictions[sku] = {
+            'predictions': predictions,
+            'august_full_prediction': predictions[0],
+            'august_remainder_prediction': predictions[0] * days_remaining / days_in_month,
+            'method': method,
+            'confidence': confidence,
+            'last_date': last_date,
+            'forecast_months': forecast_months,
+            'august_days_included': days_remaining,
+            'prediction_start_date': today,
+            'models_count': len(result['models']),
+            'model_weights': result['weights'] if len(result['models']) > 1 else None,
+            'future_trend': future_trend(predictions),
+            'category_info': category_info,
+            'forecast_std': forecast_std,
+            'lower': np.clip(predictions - interval_z * forecast_std, 0, None),
+            'upper': predictions + interval_z * forecast_std,
+            'interval_coverage': INTERVAL_COVERAGE,
+            'holdout_residuals': result.get('residuals', []),
+        }
+        model_results[sku] = {
+            'best_model': method,
+            'rmse': result['rmse'],
+            'mae': result['mae'],
+            'mape': result['mape'],
+            'confidence': confidence,
+            'test_periods': result['test_periods'],
+            'models_used': len(result['models']),
+        }
+        trained_models[sku] = {
+            'method': method,
+            'confidence': confidence,
+            'category_info': category_info,
+            'models_count': len(result['models']),
+            'models': result['models'],
+            'weights': result['weights'],
+            'RMSE': result['rmse'],
+            'MAE': result['mae'],
+            'test_periods': result['test_periods'],
+            'watermark': (watermarks or {}).get(sku),
+        }
+        sku_categories[sku] = category_info
+
+        row = {'SKU': sku, 'RMSE': result['rmse'], 'MAE': result['mae'], 'MAPE': result['mape']}
+        for period, value in zip(forecast_periods[1:], predictions[1:]):
+            row[f"{calendar.month_abbr[period.month]}_Prediction"] = value
+        row['Total_3M'] = float(predictions[1:].sum())
+        summary.append(row)
+
+    return {
+        PREDICTIONS_FILE: future_predictions,
+        RESULTS_FILE: model_results,
+        'trained_models.pkl': trained_models,
+        'sku_categories.pkl': sku_categories,
+        'model_summary_with_metrics.csv': pd.DataFrame(summary),
+    }
+
+
+def write_artifacts(artifacts, output_dir):
+    """Write every artifact atomically (temp file + rename), then refresh the column export"""
+    os.makedirs(output_dir, exist_ok=True)
+    for name, content in artifacts.items():
+        path = os.path.join(output_dir, name)
+        staging = f"{path}.tmp-{os.getpid()}"
+        if isinstance(content, pd.DataFrame):
+            content.to_csv(staging, index=False)
+        else:
+            with open(staging, 'wb') as f:
+                pickle.dump(content, f)
+        os.replace(staging, path)
+    export_columns(output_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train per-SKU demand forecasts from the shipment rollup")
+    parser.add_argument('--output', default='models', help="Model directory to write (default: models)")
+    parser.add_argument('--models', nargs='+', default=list(AVAILABLE_MODELS), choices=AVAILABLE_MODELS,
+                        help="Models to try besides the moving-average baseline")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--timeout', type=float, default=60, help="Seconds allowed per SKU (0 = no limit)")
+    parser.add_argument('--chunk-size', type=int, default=8, help="SKUs per pool task")
+    parser.add_argument('--skus', nargs='+', help="Only train these SKUs")
+    parser.add_argument('--no-routing', action='store_true',
+                        help="Pool-fit every SKU instead of routing short/intermittent series to closed-form forecasters")
+    parser.add_argument('--refresh', action='store_true',
+                        help="Refit only SKUs whose training data changed since the last run; carry over the rest")
+    args = parser.parse_args()
+
+    models = list(args.models)
+    if 'prophet' in models:
+        try:
+            import prophet  # noqa: F401
+        except ImportError:
+            print("prophet is not installed; training without it")
+            models.remove('prophet')
+
+    started = time.time()
+    today = date.today()
+    current_month = today.replace(day=1)
+    series, out_days = load_monthly_series(current_month, args.skus)
+    watermarks = compute_watermarks(series, current_month) if not series.empty else {}
+    # The pool forks after this point; workers must not share the parent's connections
+    db.close_pool()
+    if series.empty:
+        print("No shipment history found")
+        return
+    print(f"Loaded {len(series)} SKUs x {len(series.columns)} months in {time.time() - started:.1f}s")
+
+    # A partial run (--skus or --refresh) is merged into the previous artifacts: every SKU
+    # it does not refit keeps its forecast, whether or not it is in this run's series
+    partial = args.refresh or bool(args.skus)
+    previous = load_previous_artifacts(args.output) if partial else None
+    if partial and previous is None:
+        if args.skus and os.path.exists(os.path.join(args.output, PREDICTIONS_FILE)):
+            print(f"Cannot read the previous artifacts in {args.output}; refusing to overwrite them with "
+                  f"{len(series)} SKUs (use another --output)")
+            return
+        print(f"No previous artifacts in {args.output}; training every SKU")
+    to_fit = changed_skus(watermarks, previous) if args.refresh else set(series.index)
+    carried = [sku for sku in (previous or {}).get(PREDICTIONS_FILE, {}) if sku not in to_fit]
+    if partial:
+        print(f"{len(to_fit)} SKUs to train, {len(carried)} carried over")
+    if not to_fit:
+        return
+
+    fitting = series[series.index.isin(to_fit)]
+    Y = baseline_forecasters.history_matrix(fitting)
+    methods = baseline_forecasters.route(Y, MIN_MONTHS_FOR_MODELS)
+    if args.no_routing:
+        methods[:] = 'model'
+    routed = methods != 'model'
+
+    fitted_at = time.time()
+    results = fit_routed(fitting.index[routed], Y[routed], methods[routed])
+    counts = ', '.join(f"{name} {count}" for name, count in zip(*np.unique(methods[routed], return_counts=True)))
+    print(f"Routed {len(results)} SKUs to closed-form forecasters in {time.time() - fitted_at:.2f}s ({counts or 'none'})")
+
+    tasks = []
+    for sku in fitting.index[~routed]:
+        history = series_for_sku(series.loc[sku])
+        tasks.append((sku, history.to_numpy(), history.index))
+
+    fitted_at = time.time()
+    fitted = train_all(tasks, models, args.workers, args.timeout, args.chunk_size) if tasks else {}
+    fallbacks = sum('fallback' in result for result in fitted.values())
+    print(f"Fitted {len(fitted)} SKUs in {time.time() - fitted_at:.1f}s ({fallbacks} fell back to the baseline)")
+    results.update(fitted)
+
+    artifacts = build_artifacts(results, series, out_days, current_month, today, watermarks)
+    if carried:
+        artifacts = merge_artifacts(artifacts, previous, carried)
+    write_artifacts(artifacts, args.output)
+    print(f"Artifacts written to {args.output} ({time.time() - started:.1f}s total)")
+
+
+if __name__ == "__main__":
+    main()
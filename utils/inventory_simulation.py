@@ -0,0 +1,351 @@
+"""
+Monte Carlo evaluation of reorder policies
+
+Simulates thousands of daily demand paths per SKU from the forecast distribution (monthly
+forecast + forecast_std, see utils.forecast_store; set demand exploded onto components,
+see utils.bom) starting from the current stock snapshot, and replays each reorder policy on the same paths: continuous review of the
+inventory position, an order up to reorder point + lead-time demand when the position
+falls to the reorder point, rounded up to the MOQ, arriving after the supplier lead time.
+Unmet demand is lost.
+
+Policies (same rules as utils.order_timing):
+    buffer:10      reorder point = daily demand x (lead time + 10 days)   (current rule)
+    service:0.95   lead-time demand + safety stock for a 95% service level
+    manual         안전재고 + lead-time demand
+
+    python -m utils.inventory_simulation                                   # default policies
+    python -m utils.inventory_simulation --policies buffer:0 buffer:10 service:0.9 service:0.99
+    python -m utils.inventory_simulation --paths 5000 --days 365 --workers 8 --output simulation.csv
+
+SKUs are simulated in chunks sized so that one chunk's state stays under --max-cells
+values, optionally across a process pool. Every SKU draws from its own random streams
+(seeded by --seed and the SKU code), so its results depend on neither the number of workers
+nor --max-cells.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from config.database import db, ProductQueries
+from config.settings import DEFAULT_LEAD_TIMES
+from utils.calculations import DAYS_PER_MONTH, calculate_safety_stock_vectorized
+from utils.bom import load_component_forecasts
+from utils.forecast_training import init_worker_process
+from utils.order_timing import (
+    PROACTIVE_BUFFER_DAYS, _product_column, _stack_rows, build_forecast_matrix, extract_forecast_std
+)
+
+DEFAULT_POLICIES = (f'buffer:{PROACTIVE_BUFFER_DAYS}', 'buffer:0', 'service:0.95', 'manual')
+# Lead time when neither the product nor its supplier has one (same as batch_calculate_reorder_points)
+FALLBACK_LEAD_TIME = 7
+# Values of per-path state (SKUs x paths x pipeline days) allowed per chunk
+DEFAULT_MAX_CELLS = 8_000_000
+METRIC_COLUMNS = ['fill_rate', 'stockout_days', 'stockout_probability', 'avg_inventory', 'orders']
+
+
+def parse_policy(text):
+    """'buffer:10' / 'service:0.95' / 'manual' -> policy dict"""
+    kind, _, value = text.partition(':')
+    if kind == 'buffer':
+        return {'name': text, 'kind': kind, 'buffer_days': float(value or PROACTIVE_BUFFER_DAYS)}
+    if kind == 'service':
+        level = float(value or 0.95)
+        if not 0 < level < 1:
+            raise ValueError(f"service level must be between 0 and 1: {text}")
+        return {'name': text, 'kind': kind, 'service_level': level}
+    if kind == 'manual':
+        return {'name': text, 'kind': kind}
+    raise ValueError(f"unknown policy: {text}")
+
+
+def product_lead_times(products_df):
+    """리드타임 of each product, else its supplier's DEFAULT_LEAD_TIMES entry, else FALLBACK_LEAD_TIME"""
+    lead_time = _product_column(products_df, '리드타임', np.nan).astype(float)
+    suppliers = _product_column(products_df, '제조사', '')
+    supplier_default = np.array([DEFAULT_LEAD_TIMES.get(s, FALLBACK_LEAD_TIME) for s in suppliers], dtype=float)
+    lead_time = np.where(np.isnan(lead_time) | (lead_time <= 0), supplier_default, lead_time)
+    return np.maximum(np.round(lead_time), 1)
+
+
+def policy_levels(policy, forecast, forecast_std, lengths, lead_time, safety_stock):
+    """
+    Reorder point and order-up-to level per SKU under one policy
+
+    Returns:
+        Tuple of (reorder_point (n,), order_up_to (n,))
+    """
+    # Daily demand of the next 3 months, as in calculate_reorder_point
+    daily = np.where(lengths >= 3, np.nan_to_num(forecast[:, :3]).sum(axis=1) / 90, 0.0)
+    if policy['kind'] == 'buffer':
+        reorder_point = daily * (lead_time + policy['buffer_days'])
+    elif policy['kind'] == 'manual':
+        reorder_point = safety_stock + daily * lead_time
+    else:
+        levels = calculate_safety_stock_vectorized(
+            forecast, forecast_std, lead_time, policy['service_level'], lengths
+        )['reorder_level']
+        # SKUs without a forecast std keep the current buffer rule
+        reorder_point = np.where(np.isfinite(levels), levels, daily * (lead_time + PROACTIVE_BUFFER_DAYS))
+    return reorder_point, reorder_point + daily * lead_time
+
+
+def daily_demand_moments(forecast, forecast_std, lengths, days):
+    """
+    Mean and variance of daily demand for each simulated day (SKUs, days)
+
+    Month m of the forecast covers days [30m, 30m + 30); the last forecast month continues
+    after the horizon. Months without a std get Poisson-like variance (= mean).
+    """
+    month = np.minimum(np.arange(days)[None, :] // DAYS_PER_MONTH, np.maximum(lengths - 1, 0)[:, None])
+    rows = np.arange(len(forecast))[:, None]
+    mean = np.nan_to_num(forecast[rows, month]) / DAYS_PER_MONTH
+    variance = forecast_std[rows, month] ** 2 / DAYS_PER_MONTH
+    variance = np.where(np.isnan(variance), mean, variance)
+    return np.maximum(mean, 0), np.maximum(variance, 0)
+
+
+def sku_seeds(skus):
+    """Stable per-SKU seed keys (CRC32 of the SKU code), independent of row order and chunking"""
+    return np.array([zlib.crc32(str(sku).encode('utf-8')) for sku in skus], dtype=np.int64)
+
+
+def simulate_chunk(mean, variance, lead_time, moq, stock, keys, reorder_points, order_up_to, paths, lead_time_cv, seed):
+    """
+    Simulate every policy on one chunk of SKUs
+
+    Args:
+        mean, variance: Daily demand moments (SKUs, days)
+        lead_time, moq, stock: Per-SKU arrays
+        keys: Per-SKU seed keys (see sku_seeds)
+        reorder_points, order_up_to: Policy levels (policies, SKUs)
+        paths: Demand paths per SKU
+        lead_time_cv: Coefficient of variation of each order's lead time (0 = fixed)
+        seed: Simulation seed; each SKU draws from its own streams (seed, key), so its
+            results do not depend on the chunk it lands in, and every policy sees the
+            same demand and lead time draws
+
+    Returns:
+        Dictionary of METRIC_COLUMNS -> array (policies, SKUs)
+    """
+    n, days = mean.shape
+    # Gamma daily demand with the given mean and variance (0 where there is no demand)
+    has_demand = (mean > 0) & (variance > 0)
+    shape = np.where(has_demand, mean ** 2 / np.where(has_demand, variance, 1), 1.0)
+    scale = np.where(has_demand, variance / np.where(has_demand, mean, 1), 0.0)
+    # Longest delay per SKU (its own bound, so the chunk's longest lead time does not clip it)
+    max_delay = np.maximum(np.ceil(lead_time * (1 + 4 * lead_time_cv)), 1)
+    pipeline = int(max_delay.max()) + 1 if n else 1
+    moq = np.maximum(moq, 1)[:, None]
+
+    # Draws come in blocks of `pipeline` days (no more values than the pipeline state);
+    # within a SKU they are consumed day by day, so the block size does not change them
+    block = pipeline
+    k = 1 / lead_time_cv ** 2 if lead_time_cv else None
+
+    results = {name: np.zeros((len(reorder_points), n)) for name in METRIC_COLUMNS}
+    for p in range(len(reorder_points)):
+        demand_rngs = [np.random.default_rng([seed, int(key), 0]) for key in keys]
+        lead_rngs = [np.random.default_rng([seed, int(key), 1]) for key in keys]
+        reorder_point, up_to = reorder_points[p][:, None], order_up_to[p][:, None]
+        on_hand = np.repeat(np.maximum(stock, 0).astype(float)[:, None], paths, axis=1)
+        position = on_hand.copy()
+        arrivals = np.zeros((n, paths, pipeline))
+        demand_total, served_total = np.zeros((n, paths)), np.zeros((n, paths))
+        stockout_days, inventory_total, orders = np.zeros((n, paths)), np.zeros((n, paths)), np.zeros((n, paths))
+
+        for day in range(days):
+            slot = day % pipeline
+            on_hand += arrivals[:, :, slot]
+            arrivals[:, :, slot] = 0
+
+            if day % block == 0:
+                span = min(block, days - day)
+                demand_block = np.stack([
+                    rng.gamma(shape[i, day:day + span, None], size=(span, paths)) for i, rng in enumerate(demand_rngs)
+                ]) * scale[:, day:day + span, None]
+                if k:
+                    # Drawn every day so all policies see the same lead times
+                    delay_block = np.stack([rng.standard_gamma(k, size=(span, paths)) for rng in lead_rngs]) \
+                        * (lead_time / k)[:, None, None]
+            demand = demand_block[:, day % block]
+            served = np.minimum(on_hand, demand)
+            on_hand -= served
+            position -= served
+            demand_total += demand
+            served_total += served
+            stockout_days += demand > served + 1e-9
+            inventory_total += on_hand
+
+            if k:
+                delay = delay_block[:, day % block]
+            else:
+                delay = np.broadcast_to(lead_time[:, None], (n, paths))
+
+            # Continuous review of the inventory position (on hand + on order)
+            reorder = position <= reorder_point
+            if reorder.any():
+                quantity = np.maximum(moq, up_to - position)
+                quantity = np.ceil(quantity / moq) * moq
+                delay = np.clip(np.round(delay), 1, max_delay[:, None]).astype(int)
+                sku_index, path_index = np.nonzero(reorder)
+                arrival_slot = (day + delay[sku_index, path_index]) % pipeline
+                arrivals[sku_index, path_index, arrival_slot] += quantity[sku_index, path_index]
+                position = np.where(reorder, position + quantity, position)
+                orders += reorder
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            fill_rate = np.where(demand_total.sum(axis=1) > 0, served_total.sum(axis=1) / demand_total.sum(axis=1), 1.0)
+        results['fill_rate'][p] = fill_rate
+        results['stockout_days'][p] = stockout_days.mean(axis=1)
+        results['stockout_probability'][p] = (stockout_days > 0).mean(axis=1)
+        results['avg_inventory'][p] = inventory_total.mean(axis=1) / days
+        results['orders'][p] = orders.mean(axis=1)
+    return results
+
+
+def _simulate_task(chunk, arrays, policy_arrays, paths, lead_time_cv, seed):
+    index, rows = chunk
+    return index, rows, simulate_chunk(
+        *(a[rows] for a in arrays), *(a[:, rows] for a in policy_arrays), paths, lead_time_cv, seed
+    )
+
+
+def simulate_policies(products_df, predictions_dict, policies, paths=1000, days=180, lead_time_cv=0.0,
+                      seed=0, workers=1, max_cells=DEFAULT_MAX_CELLS):
+    """
+    Evaluate reorder policies on every product that has a forecast
+
+    Args:
+        products_df: Product snapshot (마스터_sku, 현재재고, 안전재고, 리드타임, 최소주문수량, 제조사)
+        predictions_dict: SKU -> forecast entry (e.g. ForecastSet.entries)
+        policies: Policy dicts (see parse_policy)
+        paths: Demand paths per SKU
+        days: Simulated days
+        lead_time_cv: Coefficient of variation of supplier lead times
+        seed: Random seed
+        workers: Worker processes (1 = in process)
+        max_cells: Bound on per-chunk state (SKUs x paths x pipeline days)
+
+    Returns:
+        DataFrame with one row per (policy, SKU): reorder_point, order_up_to and METRIC_COLUMNS
+    """
+    skus = _product_column(products_df, '마스터_sku', '')
+    forecast, lengths = build_forecast_matrix(skus, predictions_dict)
+    keep = lengths > 0
+    products_df, skus, forecast, lengths = products_df[keep], skus[keep], forecast[keep], lengths[keep]
+    forecast_std = _stack_rows([extract_forecast_std(predictions_dict.get(sku)) for sku in skus], forecast.shape[1])
+
+    lead_time = product_lead_times(products_df)
+    moq = _product_column(products_df, '최소주문수량', 1).astype(float)
+    stock = _product_column(products_df, '현재재고', 0).astype(float)
+    safety_stock = _product_column(products_df, '안전재고', 0).astype(float)
+    levels = [policy_levels(p, forecast, forecast_std, lengths, lead_time, safety_stock) for p in policies]
+    reorder_points = np.array([level[0] for level in levels]).reshape(len(policies), len(skus))
+    order_up_to = np.array([level[1] for level in levels]).reshape(len(policies), len(skus))
+    mean, variance = daily_demand_moments(forecast, forecast_std, lengths, days)
+
+    # Chunks of SKUs with similar lead times, so the pipeline dimension stays small; the
+    # last (longest) lead time of a chunk sets its size
+    order = np.argsort(lead_time, kind='stable')
+    pipeline = np.ceil(lead_time[order] * (1 + 4 * lead_time_cv)) + 1
+    chunks, start = [], 0
+    for end in range(1, len(order) + 1):
+        if end - 1 > start and (end - start) * paths * pipeline[end - 1] > max_cells:
+            chunks.append((len(chunks), order[start:end - 1]))
+            start = end - 1
+    if start < len(order):
+        chunks.append((len(chunks), order[start:]))
+
+    arrays = (mean, variance, lead_time, moq, stock, sku_seeds(skus))
+    policy_arrays = (reorder_points, order_up_to)
+    metrics = {name: np.zeros((len(policies), len(skus))) for name in METRIC_COLUMNS}
+
+    def collect(index, rows, result):
+        for name, values in result.items():
+            metrics[name][:, rows] = values
+
+    if workers == 1 or len(chunks) <= 1:
+        for chunk in chunks:
+            collect(*_simulate_task(chunk, arrays, policy_arrays, paths, lead_time_cv, seed))
+    else:
+        pool = multiprocessing.Pool(workers, initializer=init_worker_process)
+        try:
+            pending = [pool.apply_async(_simulate_task, (chunk, arrays, policy_arrays, paths, lead_time_cv, seed))
+                       for chunk in chunks]
+            for async_result in pending:
+                collect(*async_result.get())
+        finally:
+            pool.terminate()
+            pool.join()
+
+    frames = []
+    for p, policy in enumerate(policies):
+        frame = pd.DataFrame({
+            'policy': policy['name'],
+            '마스터_sku': skus,
+            '리드타임': lead_time,
+            'reorder_point': reorder_points[p],
+            'order_up_to': order_up_to[p],
+            **{name: metrics[name][p] for name in METRIC_COLUMNS},
+        })
+        frames.append(frame)
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def summarize(results):
+    """Catalog totals per policy: mean fill rate, stockout days per SKU, total average inventory, orders"""
+    return results.groupby('policy', sort=False).agg(
+        skus=('마스터_sku', 'count'),
+        fill_rate=('fill_rate', 'mean'),
+        worst_fill_rate=('fill_rate', 'min'),
+        stockout_days=('stockout_days', 'mean'),
+        stockout_probability=('stockout_probability', 'mean'),
+        avg_inventory=('avg_inventory', 'sum'),
+        orders=('orders', 'sum'),
+    ).reset_index()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate reorder policies on the current stock and forecasts")
+    parser.add_argument('--policies', nargs='+', default=list(DEFAULT_POLICIES),
+                        help="buffer:<days>, service:<level> or manual (default: %(default)s)")
+    parser.add_argument('--models', nargs='+', default=None, help="Model directories to read forecasts from")
+    parser.add_argument('--paths', type=int, default=1000, help="Demand paths per SKU")
+    parser.add_argument('--days', type=int, default=180, help="Simulated days")
+    parser.add_argument('--lead-time-cv', type=float, default=0.0, help="Lead time variability (0 = fixed)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes (0 = all cores)")
+    parser.add_argument('--max-cells', type=int, default=DEFAULT_MAX_CELLS, help="Per-chunk state bound")
+    parser.add_argument('--output', help="Write per-SKU results to this CSV")
+    args = parser.parse_args()
+
+    policies = [parse_policy(text) for text in args.policies]
+    products = ProductQueries.get_all_products()
+    forecasts = load_component_forecasts(tuple(args.models)) if args.models else load_component_forecasts()
+    # The pool forks after this point; workers must not share the parent's connections
+    db.close_pool()
+    if not products or not len(forecasts):
+        print("No products or forecasts found")
+        return
+
+    started = time.time()
+    results = simulate_policies(
+        pd.DataFrame(products), forecasts.entries, policies, args.paths, args.days,
+        args.lead_time_cv, args.seed, args.workers or os.cpu_count() or 1, args.max_cells
+    )
+    print(f"Simulated {results['마스터_sku'].nunique() if len(results) else 0} SKUs x {len(policies)} policies x "
+          f"{args.paths} paths x {args.days} days in {time.time() - started:.1f}s")
+    if len(results):
+        print(summarize(results).to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    if args.output:
+        results.to_csv(args.output, index=False)
+        print(f"Per-SKU results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
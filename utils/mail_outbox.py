@@ -0,0 +1,211 @@
+"""
+Outbound email queue with a background sender
+
+EmailAlertSystem only writes messages to playauto_mail_outbox and returns; a MailSender
+thread claims due messages in batches and sends each batch over one SMTP session
+(one connect + STARTTLS + login), so neither a page render nor the scheduler waits on
+SMTP, and mail to many recipients costs one handshake:
+
+    queued  ->  'sending' (claimed)  ->  'sent'
+                                     ->  'pending' again after RETRY_BASE_SECONDS x 2^n
+                                     ->  'failed' after MAX_ATTEMPTS (or a permanent 5xx)
+
+Claims use FOR UPDATE SKIP LOCKED, so senders in several processes never send a
+message twice; one left in 'sending' by a crashed process is retried after
+STALE_CLAIM_SECONDS. Settings come from the environment (SMTP_SERVER, SMTP_PORT,
+SMTP_STARTTLS, SENDER_EMAIL, SENDER_PASSWORD); with SMTP_STARTTLS=false and no
+password it talks plain SMTP, e.g. to a local stand-in for testing:
+
+    python -m aiosmtpd -n -l localhost:8025
+    SMTP_SERVER=localhost SMTP_PORT=8025 SMTP_STARTTLS=false SENDER_EMAIL=playauto@localhost \\
+        python -m utils.mail_outbox         # send everything due now and print the queue
+"""
+import os
+import smtplib
+import threading
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from config.database import MailQueries
+
+# Messages sent per SMTP session
+BATCH_SIZE = 20
+# Attempts before a message is marked 'failed'
+MAX_ATTEMPTS = 5
+# Retry delay after the n-th failed attempt: RETRY_BASE_SECONDS * 2^(n-1), capped
+RETRY_BASE_SECONDS = 60
+RETRY_MAX_SECONDS = 3600
+# Seconds between outbox checks while idle (messages queued by this process wake it at once)
+POLL_INTERVAL = 30
+# A 'sending' claim older than this is assumed abandoned
+STALE_CLAIM_SECONDS = 600
+SMTP_TIMEOUT = 30
+
+
+def smtp_settings():
+    """SMTP settings from the environment"""
+    return {
+        'server': os.getenv('SMTP_SERVER', 'smtp.gmail.com'),
+        'port': int(os.getenv('SMTP_PORT', '587')),
+        'starttls': os.getenv('SMTP_STARTTLS', 'true').lower() != 'false',
+        'sender_email': os.getenv('SENDER_EMAIL', ''),
+        'sender_password': os.getenv('SENDER_PASSWORD', ''),
+    }
+
+
+def retry_delay(attempts):
+    """Seconds to wait after `attempts` failed attempts (None = give up)"""
+    if attempts >= MAX_ATTEMPTS:
+        return None
+    return min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+
+
+def _is_permanent(error):
+    """5xx replies about the message or recipient will not succeed on a retry"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    if isinstance(error, (smtplib.SMTPSenderRefused, smtplib.SMTPDataError)):
+        return error.smtp_code >= 500
+    return False
+
+
+class MailSender:
+    """Background thread draining the outbox"""
+
+    def __init__(self, settings=None, batch_size=BATCH_SIZE, poll_interval=POLL_INTERVAL):
+        self.settings = settings or smtp_settings()
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._stats = {'sessions': 0, 'sent': 0, 'retried': 0, 'failed': 0}
+
+    def start(self):
+        """Start the sender thread (no-op if already running)"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='mail-sender', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=SMTP_TIMEOUT + 5)
+
+    def wake(self):
+        """Check the outbox now instead of at the next poll"""
+        self._wake.set()
+
+    def stats(self):
+        return dict(self._stats)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                # A full batch probably left more behind; go again right away
+                if self.send_due() == self.batch_size:
+                    continue
+            except Exception as e:
+                print(f"Mail sender error: {str(e)}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _connect(self):
+        settings = self.settings
+        server = smtplib.SMTP(settings['server'], settings['port'], timeout=SMTP_TIMEOUT)
+        try:
+            if settings['starttls']:
+                server.starttls()
+            if settings['sender_password']:
+                server.login(settings['sender_email'], settings['sender_password'])
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _message(self, row):
+        msg = MIMEMultipart('alternative')
+        msg['Subject'] = row['subject']
+        msg['From'] = self.settings['sender_email']
+        msg['To'] = row['recipient']
+        msg.attach(MIMEText(row['html'], 'html'))
+        return msg
+
+    def send_due(self):
+        """
+        Send one batch of due messages over a single SMTP session
+
+        Returns:
+            Number of messages claimed
+        """
+        rows = MailQueries.claim_mail(self.batch_size, STALE_CLAIM_SECONDS)
+        if not rows:
+            return 0
+
+        sent, failed = [], []
+        try:
+            server = self._connect()
+        except Exception as e:
+            print(f"SMTP connection error: {str(e)}")
+            failed = [(row, e) for row in rows]
+        else:
+            self._stats['sessions'] += 1
+            try:
+                for k, row in enumerate(rows):
+                    try:
+                        server.send_message(self._message(row))
+                        sent.append(row['id'])
+                    except smtplib.SMTPServerDisconnected as e:
+                        # The session is gone: everything not sent yet is retried
+                        failed.extend((rest, e) for rest in rows[k:])
+                        break
+                    except smtplib.SMTPException as e:
+                        # Refused message; the session stays usable
+                        failed.append((row, e))
+                    except OSError as e:
+                        failed.extend((rest, e) for rest in rows[k:])
+                        break
+            finally:
+                try:
+                    server.quit()
+                except Exception:
+                    server.close()
+
+        MailQueries.mark_mail_sent(sent)
+        retries = [(row['id'], str(e)[:1000], None if _is_permanent(e) else retry_delay(row['attempts']))
+                   for row, e in failed]
+        MailQueries.mark_mail_failed(retries)
+        self._stats['sent'] += len(sent)
+        self._stats['retried'] += sum(delay is not None for _, _, delay in retries)
+        self._stats['failed'] += sum(delay is None for _, _, delay in retries)
+        for mail_id, error, delay in retries:
+            print(f"Mail {mail_id} failed ({error}); " + ("giving up" if delay is None else f"retrying in {delay}s"))
+        return len(rows)
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_mail_sender():
+    """The process-wide MailSender (started on first use)"""
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = MailSender()
+        _sender.start()
+        return _sender
+
+
+if __name__ == "__main__":
+    sender = MailSender()
+    while sender.send_due() == sender.batch_size:
+        pass
+    print(f"Sender: {sender.stats()}")
+    print(f"Outbox: {MailQueries.get_outbox_counts()}")
+    for row in MailQueries.get_recent_mail(10):
+        print(f"  #{row['id']:<6} {row['status']:<8} {row['attempts']} {row['recipient']:<30} {row['subject']}"
+              + (f"  ({row['last_error']})" if row['last_error'] else ""))
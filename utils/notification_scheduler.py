@@ -1,9 +1,12 @@
 import schedule
 import time
 import threading
-from datetime import datetime, timedelta
-from config.database import ProductQueries, db
+from datetime import datetime
+from config.database import AlertQueries, db
+from utils.alert_engine import EMAIL_ALERT_TYPES, alert_digest
+from utils.alert_worker import alert_thresholds, get_alert_worker
 from utils.email_alerts import EmailAlertSystem
+from utils.mail_outbox import get_mail_sender
 import os
 from dotenv import load_dotenv
 
@@ -17,121 +20,71 @@ class NotificationScheduler:
         self.notification_time = os.getenv('NOTIFICATION_TIME', '09:00')
         
         # Default alert thresholds (can be overridden from settings)
-        def safe_int_env(key, default):
-            val = os.getenv(key, str(default))
-            if val:
-                # Clean any formatting characters
-                val = str(val).replace('│', '').replace('|', '').replace('\n', '').replace('\r', '').strip()
-                try:
-                    return int(val)
-                except:
-                    return default
-            return default
+        thresholds = alert_thresholds()
+        self.stock_alert_days = thresholds['stock_alert_days']
+        self.order_alert_days = thresholds['order_alert_days']
+        self.expiry_alert_days = thresholds['expiry_alert_days']
         
-        self.stock_alert_days = safe_int_env('STOCK_ALERT_DAYS', 7)
-        self.order_alert_days = safe_int_env('ORDER_ALERT_DAYS', 10)
-        self.expiry_alert_days = safe_int_env('EXPIRY_ALERT_DAYS', 30)
+        # Shared with the alert tab: re-evaluates changed SKUs as stock moves (started with
+        # the scheduler); new and escalated alerts are emailed right away
+        self.alert_worker = None
         
         self.is_running = False
         self.thread = None
         
+    def send_transition_alerts(self, transitions, skus):
+        """
+        Email the alerts of a batch's SKUs that are new or escalated since they were last
+        emailed (called by the alert worker after every batch)
+        
+        Picked from the stored state rather than this process's transitions: the app's
+        worker may have stored them first.
+        """
+        if not self.notification_email:
+            return
+        with db.transaction():
+            # Under the alert state lock, so concurrent schedulers email each alert once
+            AlertQueries.lock_alert_states()
+            rows = [row for row in AlertQueries.get_alert_states(None if skus is None else list(skus))
+                    if row['alert_type'] in EMAIL_ALERT_TYPES]
+            digest = alert_digest(rows)
+            raised = digest['new'] + digest['escalated']
+            if not raised:
+                return
+            print(f"[{datetime.now()}] {len(raised)} new or escalated alerts. Sending email to {self.notification_email}")
+            if not self.email_system.send_inventory_alert(self.notification_email, [row['details'] for row in raised]):
+                print("Failed to send alert email")
+                return
+            # Already sent: left out of the next digest
+            AlertQueries.mark_notified([(row['마스터_sku'], row['alert_type']) for row in raised])
+        # The message is only visible to the sender once the transaction committed
+        get_mail_sender().wake()
+    
     def check_and_send_alerts(self):
-        """Check inventory status and send alerts if needed"""
+        """Re-evaluate every product and email the alerts that changed since the last email"""
         print(f"[{datetime.now()}] Checking for alerts...")
         
         try:
-            alerts_list = []
-            products = ProductQueries.get_all_products()
+            # Full run so nothing missed by the listener is left out; its transitions go
+            # into the digest instead of separate emails
+            self.alert_worker.process(notify=False)
+            rows = [row for row in AlertQueries.get_alert_states() if row['alert_type'] in EMAIL_ALERT_TYPES]
+            digest = alert_digest(rows)
+            changes = len(digest['new']) + len(digest['escalated']) + len(digest['resolved'])
             
-            if products:
-                for product in products:
-                    current_stock = product['현재재고'] or 0
-                    safety_stock = product['안전재고'] or 0
-                    product_name = product['상품명']
-                    lead_time = product['리드타임'] or 30
-                    outbound = product['출고량'] or 0
-                    expiration = product.get('소비기한')
-                    
-                    daily_usage = outbound / 30 if outbound > 0 else 0
-                    
-                    # Check stock depletion
-                    if daily_usage > 0:
-                        days_until_stockout = current_stock / daily_usage
-                        
-                        # Stock depletion alert
-                        if days_until_stockout <= self.stock_alert_days:
-                            stockout_date = (datetime.now() + timedelta(days=days_until_stockout)).strftime('%Y-%m-%d')
-                            
-                            # Determine status based on how critical the stock level is
-                            if current_stock < safety_stock * 0.5:
-                                status = '긴급'
-                            elif current_stock < safety_stock:
-                                status = '경고'
-                            else:
-                                status = '주의'
-                            
-                            alerts_list.append({
-                                '제품': product_name,
-                                '유형': '재고 부족',
-                                '현재 재고량': current_stock,
-                                '안전재고량': safety_stock,
-                                '예상 소진일': stockout_date,
-                                '리드타임': lead_time,
-                                '상태': status,
-                                '메시지': f'{int(days_until_stockout)}일 후 재고 소진 예상'
-                            })
-                        
-                        # Order timing alert - only add if we need to order considering lead time
-                        days_until_reorder = days_until_stockout - lead_time
-                        if days_until_reorder <= self.order_alert_days and days_until_reorder <= lead_time:
-                            # Determine urgency based on how soon we need to order
-                            if days_until_reorder <= 0:
-                                order_status = '긴급'
-                                order_message = '즉시 발주 필요'
-                            elif days_until_reorder <= 3:
-                                order_status = '경고'
-                                order_message = f'{int(days_until_reorder)}일 내 발주 필요'
-                            else:
-                                order_status = '주의'
-                                order_message = f'{int(days_until_reorder)}일 내 발주 권장'
-                                
-                            alerts_list.append({
-                                '제품': product_name,
-                                '유형': '발주 시점',
-                                '현재 재고량': current_stock,
-                                '안전재고량': safety_stock,
-                                '예상 소진일': stockout_date,
-                                '리드타임': lead_time,
-                                '상태': order_status,
-                                '메시지': order_message
-                            })
-                    
-                    # Expiration alert
-                    if expiration:
-                        days_until_expiry = (expiration - datetime.now().date()).days
-                        if days_until_expiry <= self.expiry_alert_days:
-                            status = '긴급' if days_until_expiry <= 7 else ('경고' if days_until_expiry <= 14 else '주의')
-                            
-                            alerts_list.append({
-                                '제품': product_name,
-                                '유형': '소비기한 임박',
-                                '현재 재고량': current_stock,
-                                '소비기한': expiration.strftime('%Y-%m-%d'),
-                                '남은 일수': days_until_expiry,
-                                '상태': status,
-                                '권장 조치': '판촉 진행 또는 폐기 준비'
-                            })
-            
-            # Send email if there are alerts
-            if alerts_list and self.notification_email:
-                print(f"Found {len(alerts_list)} alerts. Sending email to {self.notification_email}")
-                success = self.email_system.send_inventory_alert(self.notification_email, alerts_list)
-                if success:
-                    print("Alert email sent successfully")
+            if changes and self.notification_email:
+                print(f"New {len(digest['new'])}, escalated {len(digest['escalated'])}, "
+                      f"resolved {len(digest['resolved'])} alerts. Sending digest to {self.notification_email}")
+                if self.email_system.send_alert_digest(self.notification_email, digest):
+                    AlertQueries.mark_notified(digest['notified'])
+                    print("Alert digest queued")
                 else:
-                    print("Failed to send alert email")
+                    print("Failed to queue alert digest")
             else:
-                print("No alerts to send")
+                if not changes:
+                    # Alerts raised and resolved between digests are done with
+                    AlertQueries.mark_notified(digest['notified'])
+                print("No alert changes to send")
                 
         except Exception as e:
             print(f"Error checking alerts: {str(e)}")
@@ -148,6 +101,14 @@ class NotificationScheduler:
             print("Scheduler is already running")
             return
         
+        self.alert_worker = get_alert_worker()
+        self.alert_worker.configure(
+            stock_alert_days=self.stock_alert_days,
+            order_alert_days=self.order_alert_days,
+            expiry_alert_days=self.expiry_alert_days
+        )
+        self.alert_worker.subscribe(self.send_transition_alerts)
+        
         # Schedule daily check at specified time
         schedule.every().day.at(self.notification_time).do(self.check_and_send_alerts)
         
@@ -155,6 +116,12 @@ class NotificationScheduler:
         if os.getenv('RUN_IMMEDIATELY', 'false').lower() == 'true':
             self.check_and_send_alerts()
         
+        # Shared product caches stay valid between runs while the listener is up; the
+        # alert worker is fed by the same listener
+        db.start_change_listener()
+        # Alert emails are queued; the sender also picks up mail left over from earlier runs
+        get_mail_sender()
+        
         self.is_running = True
         self.thread = threading.Thread(target=self.run_schedule, daemon=True)
         self.thread.start()
@@ -167,6 +134,9 @@ class NotificationScheduler:
         self.is_running = False
         if self.thread:
             self.thread.join()
+        if self.alert_worker:
+            # The worker keeps the alert tab current; only the emails stop
+            self.alert_worker.unsubscribe(self.send_transition_alerts)
         schedule.clear()
         print("Scheduler stopped")
 
@@ -0,0 +1,268 @@
+"""
+Supplier-consolidated purchase order planning
+
+Every supplier (제조사) gets one purchase order at a time covering all of its SKUs, so
+the fixed cost of an order (paperwork, freight, inspection) is paid once per shipment
+rather than once per product. The plan is a Wagner-Whitin lot-sizing problem per
+supplier over weekly periods that start when an order placed today would arrive:
+
+    requirement[i, t]  units SKU i must receive for period t to keep its stock at or
+                       above its floor (safety stock) given its forecast
+    cost(j -> k)       order_cost + holding_cost x days each unit of periods j..k-1
+                       waits in stock when ordered together at period j
+
+The DP runs over suppliers x periods as array operations (no per-SKU loop), and a
+forward pass then rounds every line up to its MOQ and carries the excess into the next
+order. The whole catalog is planned in milliseconds, so the order sheet recomputes it
+on every click.
+
+    python -m utils.order_planning                                # plan on the current stock
+    python -m utils.order_planning --order-cost 500000 --holding-cost 3 --periods 26
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from config.database import ProductQueries
+from utils.bom import load_component_forecasts
+from utils.calculations import calculate_safety_stock_vectorized, lead_time_demand
+from utils.inventory_simulation import product_lead_times
+from utils.order_timing import _product_column, _stack_rows, build_forecast_matrix, extract_forecast_std
+
+# Fixed cost of one purchase order (원)
+DEFAULT_ORDER_COST = 300_000
+# Cost of keeping one unit in stock for one day (원)
+DEFAULT_HOLDING_COST = 5
+# Planning periods: PERIOD_DAYS days each, PLANNING_PERIODS after the first possible arrival
+PERIOD_DAYS = 7
+PLANNING_PERIODS = 13
+
+
+def period_requirements(forecast, lengths, lead_time, stock, floor, period_days=PERIOD_DAYS,
+                        periods=PLANNING_PERIODS):
+    """
+    Units each SKU must receive per planning period
+
+    Period t covers days [lead_time + t x period_days, lead_time + (t + 1) x period_days).
+    Stock left at the first arrival is the current stock minus the lead-time demand (unmet
+    demand is lost, not backordered); the first period also restores the floor.
+
+    Args:
+        forecast: Monthly forecast matrix (n, h), NaN-padded
+        lengths: Valid months per row
+        lead_time: Days until an order placed today arrives (n,)
+        stock: Current stock (n,)
+        floor: Stock to keep at all times, e.g. safety stock (n,)
+
+    Returns:
+        Requirement matrix (n, periods)
+    """
+    n = len(forecast)
+    no_std = np.zeros_like(forecast)
+    # Cumulative demand from today to every period boundary
+    bounds = lead_time[:, None] + period_days * np.arange(periods + 1)[None, :]
+    cumulative = np.column_stack([
+        lead_time_demand(forecast, no_std, bounds[:, k], lengths)[0] for k in range(periods + 1)
+    ]) if n else np.zeros((0, periods + 1))
+
+    on_hand = np.maximum(stock - cumulative[:, 0], 0)
+    needed = np.maximum(cumulative[:, 1:] - cumulative[:, :1] + floor[:, None] - on_hand[:, None], 0)
+    return np.diff(needed, axis=1, prepend=0.0)
+
+
+def lot_sizing(requirements, order_cost, holding_cost, period_days=PERIOD_DAYS):
+    """
+    Wagner-Whitin order periods for every group of SKUs at once
+
+    Args:
+        requirements: Group requirement matrix (groups, periods); units per period
+        order_cost: Fixed cost per order, scalar or (groups,)
+        holding_cost: Holding cost per unit per day, scalar or (groups,)
+
+    Returns:
+        Tuple of (list per group of (first period, end period) segments, optimal cost (groups,))
+    """
+    groups, periods = requirements.shape
+    order_cost = np.broadcast_to(np.asarray(order_cost, dtype=float), (groups,))
+    holding_cost = np.broadcast_to(np.asarray(holding_cost, dtype=float), (groups,))
+    t = np.arange(periods)
+    units = np.concatenate([np.zeros((groups, 1)), np.cumsum(requirements, axis=1)], axis=1)
+    unit_periods = np.concatenate([np.zeros((groups, 1)), np.cumsum(requirements * t, axis=1)], axis=1)
+
+    # cost[g, j, k]: one order at period j covering periods j..k-1 (free if nothing is needed)
+    j = np.arange(periods + 1)[:, None]
+    covered = units[:, None, :] - units[:, :, None]
+    waiting = unit_periods[:, None, :] - unit_periods[:, :, None] - j[None] * covered
+    cost = (np.where(covered > 1e-9, order_cost[:, None, None], 0.0)
+            + holding_cost[:, None, None] * period_days * waiting)
+
+    best = np.full((groups, periods + 1), np.inf)
+    best[:, 0] = 0.0
+    choice = np.zeros((groups, periods + 1), dtype=int)
+    for k in range(1, periods + 1):
+        total = best[:, :k] + cost[:, :k, k]
+        choice[:, k] = np.argmin(total, axis=1)
+        best[:, k] = total[np.arange(groups), choice[:, k]]
+
+    segments = []
+    for g in range(groups):
+        plan, k = [], periods
+        while k > 0:
+            plan.append((choice[g, k], k))
+            k = choice[g, k]
+        segments.append([(int(start), int(end)) for start, end in reversed(plan)])
+    return segments, best[:, periods]
+
+
+def plan_orders(products_df, predictions_dict, order_cost=DEFAULT_ORDER_COST, holding_cost=DEFAULT_HOLDING_COST,
+                period_days=PERIOD_DAYS, periods=PLANNING_PERIODS, service_level=0.95, consolidate=True, now=None):
+    """
+    Purchase orders per supplier over the planning window
+
+    SKUs of one supplier share every order and its fixed cost; a shipment arrives after
+    the longest lead time among them. Products without a 제조사 are planned alone. The
+    stock floor is the safety stock for `service_level` where the forecast has an error
+    std, else 안전재고.
+
+    Args:
+        products_df: Product snapshot (마스터_sku, 상품명, 현재재고, 안전재고, 리드타임, 최소주문수량, 제조사)
+        predictions_dict: SKU -> forecast entry (e.g. ForecastSet.entries)
+        order_cost: Fixed cost per purchase order
+        holding_cost: Cost per unit per day in stock
+        period_days, periods: Planning grid
+        service_level: Service level of the stock floor (None = 안전재고 only)
+        consolidate: False plans every SKU on its own (the per-product baseline)
+        now: Reference time for order dates (default: datetime.now())
+
+    Returns:
+        Tuple of (order lines DataFrame: one row per SKU and order, 발주차수 1 = next order;
+        supplier summary DataFrame: orders, fixed / holding / total cost)
+    """
+    now = now or datetime.now()
+    skus = _product_column(products_df, '마스터_sku', '')
+    suppliers = _product_column(products_df, '제조사', '').astype(str)
+    names = _product_column(products_df, '상품명', '')
+    stock = _product_column(products_df, '현재재고', 0).astype(float)
+    moq = np.maximum(_product_column(products_df, '최소주문수량', 1).astype(float), 1)
+    floor = np.maximum(_product_column(products_df, '안전재고', 0).astype(float), 0)
+    forecast, lengths = build_forecast_matrix(skus, predictions_dict)
+
+    keys = np.where((suppliers != '') & consolidate, suppliers, '#' + skus.astype(str))
+    codes, groups = pd.factorize(keys)
+    # A consolidated shipment waits for its slowest line
+    lead_time = product_lead_times(products_df)
+    if len(codes):
+        group_lead_time = np.zeros(len(groups))
+        np.maximum.at(group_lead_time, codes, lead_time)
+        lead_time = group_lead_time[codes]
+
+    if service_level is not None and len(skus):
+        forecast_std = _stack_rows([extract_forecast_std(predictions_dict.get(sku)) for sku in skus], forecast.shape[1])
+        safety = calculate_safety_stock_vectorized(forecast, forecast_std, lead_time, service_level, lengths)
+        floor = np.where(np.isfinite(safety['safety_stock']), safety['safety_stock'], floor)
+
+    requirements = period_requirements(forecast, lengths, lead_time, stock, floor, period_days, periods)
+    group_requirements = np.zeros((len(groups), periods))
+    np.add.at(group_requirements, codes, requirements)
+    segments, _ = lot_sizing(group_requirements, order_cost, holding_cost, period_days)
+
+    # Forward pass: round lines up to the MOQ, carrying the excess into later orders
+    receipts = np.zeros_like(requirements)
+    placed = np.zeros(len(groups), dtype=int)
+    lines = []
+    for g, plan in enumerate(segments):
+        rows = np.flatnonzero(codes == g)
+        carry = np.zeros(len(rows))
+        number = 0
+        for start, end in plan:
+            covered = requirements[rows, start:end].sum(axis=1)
+            need = covered - carry
+            quantity = np.where(need > 1e-9, np.ceil(np.ceil(need - 1e-9) / moq[rows]) * moq[rows], 0.0)
+            carry = carry + quantity - covered
+            if not quantity.any():
+                continue
+            number += 1
+            placed[g] = number
+            receipts[rows, start] = quantity
+            order_date = now + timedelta(days=start * period_days)
+            for r, q in zip(rows, quantity):
+                if q > 0:
+                    lines.append({
+                        '공급업체': suppliers[r],
+                        '발주차수': number,
+                        '발주일': order_date.strftime('%Y-%m-%d'),
+                        '입고예정일': (order_date + timedelta(days=float(lead_time[r]))).strftime('%Y-%m-%d'),
+                        '커버일수': (end - start) * period_days,
+                        '마스터_sku': skus[r],
+                        '상품명': names[r],
+                        '현재재고': int(stock[r]),
+                        '발주량': int(q),
+                        'MOQ': int(moq[r]),
+                    })
+
+    # Realized cost: fixed cost per order placed, holding of stock above the requirement path
+    excess = np.cumsum(receipts, axis=1) - np.cumsum(requirements, axis=1)
+    group_holding = np.zeros(len(groups))
+    np.add.at(group_holding, codes, holding_cost * period_days * np.maximum(excess, 0).sum(axis=1))
+    orders = pd.DataFrame(lines, columns=['공급업체', '발주차수', '발주일', '입고예정일', '커버일수',
+                                          '마스터_sku', '상품명', '현재재고', '발주량', 'MOQ'])
+    first = np.unique(codes, return_index=True)[1]
+    summary = pd.DataFrame({
+        '공급업체': suppliers[first],
+        '품목수': np.bincount(codes, minlength=len(groups)),
+        '리드타임': lead_time[first],
+        '발주횟수': placed,
+        '고정비': placed * float(order_cost),
+        '보관비': group_holding,
+    })
+    summary['총비용'] = summary['고정비'] + summary['보관비']
+    return orders, summary
+
+
+def next_purchase_orders(orders):
+    """The next purchase order of every supplier (발주차수 1 lines)"""
+    return orders[orders['발주차수'] == 1].reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan supplier-consolidated purchase orders")
+    parser.add_argument('--models', nargs='+', default=None, help="Model directories to read forecasts from")
+    parser.add_argument('--order-cost', type=float, default=DEFAULT_ORDER_COST, help="Fixed cost per order (원)")
+    parser.add_argument('--holding-cost', type=float, default=DEFAULT_HOLDING_COST, help="Cost per unit per day (원)")
+    parser.add_argument('--period-days', type=int, default=PERIOD_DAYS)
+    parser.add_argument('--periods', type=int, default=PLANNING_PERIODS)
+    parser.add_argument('--service-level', type=float, default=0.95)
+    parser.add_argument('--output', help="Write all planned order lines to this CSV")
+    args = parser.parse_args()
+
+    products = ProductQueries.get_all_products()
+    forecasts = load_component_forecasts(tuple(args.models)) if args.models else load_component_forecasts()
+    if not products:
+        print("No products found")
+        return
+    products_df = pd.DataFrame(products)
+    options = dict(order_cost=args.order_cost, holding_cost=args.holding_cost, period_days=args.period_days,
+                   periods=args.periods, service_level=args.service_level)
+
+    started = time.perf_counter()
+    orders, summary = plan_orders(products_df, forecasts.entries, **options)
+    elapsed = time.perf_counter() - started
+    _, baseline = plan_orders(products_df, forecasts.entries, consolidate=False, **options)
+
+    print(f"Planned {len(products_df)} SKUs over {args.periods} x {args.period_days} days in {elapsed * 1000:.1f}ms")
+    print(summary.to_string(index=False, float_format=lambda v: f"{v:,.0f}"))
+    print(f"Total cost: {summary['총비용'].sum():,.0f} consolidated vs {baseline['총비용'].sum():,.0f} "
+          f"per product ({summary['발주횟수'].sum()} vs {baseline['발주횟수'].sum()} orders)")
+    upcoming = next_purchase_orders(orders)
+    if len(upcoming):
+        print(upcoming.to_string(index=False))
+    if args.output:
+        orders.to_csv(args.output, index=False)
+        print(f"Order lines written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
+import sys
 import numpy as np
 from datetime import datetime, timedelta
 import pandas as pd
 
+from utils.calculations import calculate_safety_stock_vectorized
+
+# Days of demand on top of the lead time in the reorder point (10일 전에는 발주 알림이 발생해야 함)
+PROACTIVE_BUFFER_DAYS = 10
 
 def calculate_reorder_point(current_stock, safety_stock, lead_time, monthly_predictions, moq=1, confidence_level=1.0):  # AI 예측 결과로 발주점(예측 기반 안전재고량)계산
     """
@@ -19,8 +24,7 @@ def calculate_reorder_point(current_stock, safety_stock, lead_time, monthly_pred
         avg_daily_consumption = 0
     
     # 예측 기반 안전재고량
-    proactive_buffer_days = 10  # 10일 전에는 발주 알림이 발생해야 함
-    reorder_point = avg_daily_consumption * (lead_time + proactive_buffer_days)
+    reorder_point = avg_daily_consumption * (lead_time + PROACTIVE_BUFFER_DAYS) * confidence_level
     
     # 재고소진일
     if avg_daily_consumption > 0:
@@ -152,10 +156,319 @@ def get_order_priority(urgency, current_stock, safety_stock, days_until_stockout
     
     return min(10, max(1, score))
 
-def batch_calculate_reorder_points(products_df, predictions_dict, confidence_level=1.0):
+def extract_monthly_predictions(pred_data, horizon=3):
+    """
+    First `horizon` monthly predictions of one SKU's prediction entry
+    
+    Args:
+        pred_data: Entry of the predictions dict (None if the SKU has no predictions)
+    
+    Returns:
+        list: Monthly predictions (empty if the structure is not recognised)
+    """
+    if not pred_data:
+        return []
+    
+    # Extract monthly predictions based on model structure
+    if isinstance(pred_data.get('predictions'), (list, np.ndarray)):
+        return list(pred_data['predictions'][_adaptive_offset(pred_data, horizon):][:horizon])
+    if 'arima' in pred_data and isinstance(pred_data['arima'], (list, np.ndarray)):
+        return list(pred_data['arima'][:horizon])
+    elif 'forecast_months' in pred_data:
+        # Adaptive model structure
+        if 'adaptive_forecast' in pred_data:
+            return list(pred_data['adaptive_forecast'][:horizon])
+        return list(pred_data.get('arima', [])[:horizon])
+    return []
+
+def _adaptive_offset(pred_data, horizon):
+    # Adaptive predictions start with the current month; skip it when the months after it cover the horizon
+    return 1 if len(pred_data['predictions']) > horizon else 0
+
+def extract_forecast_std(pred_data, horizon=3):
+    """
+    Forecast error std of the months extract_monthly_predictions returns (empty if the entry has none)
+    """
+    if not pred_data or not isinstance(pred_data.get('predictions'), (list, np.ndarray)):
+        return []
+    std = pred_data.get('forecast_std')
+    if std is None:
+        return []
+    return list(std[_adaptive_offset(pred_data, horizon):][:horizon])
+
+def build_forecast_matrix(skus, predictions_dict, horizon=3):
+    """
+    Stack monthly predictions of many SKUs into a NaN-padded matrix
+    
+    Args:
+        skus: Sequence of master SKUs (row order of the result)
+        predictions_dict: Dictionary of predictions by SKU
+        horizon: Number of months (columns)
+    
+    Returns:
+        Tuple of (forecast matrix (n, horizon), lengths (n,))
+    """
+    forecast = np.full((len(skus), horizon), np.nan)
+    lengths = np.zeros(len(skus), dtype=int)
+    for i, sku in enumerate(skus):
+        values = extract_monthly_predictions(predictions_dict.get(sku), horizon)
+        if values:
+            forecast[i, :len(values)] = np.asarray(values, dtype=float)
+            lengths[i] = len(values)
+    return forecast, lengths
+
+def _forecast_lengths(forecast, lengths):
+    if lengths is None:
+        # Padded matrix: count values before the first NaN
+        return np.argmax(np.hstack([np.isnan(forecast), np.ones((len(forecast), 1), dtype=bool)]), axis=1)
+    return np.asarray(lengths, dtype=int)
+
+def calculate_reorder_points_vectorized(current_stock, safety_stock, lead_time, forecast, lengths=None, moq=1, now=None,
+                                        confidence_level=1.0, reorder_level=None):
+    """
+    Array version of calculate_reorder_point for many SKUs at once
+    
+    Args:
+        current_stock, safety_stock, lead_time, moq: Arrays (n,) or scalars
+        forecast: Monthly predictions matrix (n, h), NaN-padded
+        lengths: Number of valid predictions per row (default: values before the first NaN)
+        now: Reference time for expected_stockout_date (default: datetime.now())
+        confidence_level: Multiplier for safety, scalar or (n,)
+        reorder_level: Optional reorder point per row (e.g. from a service level) replacing
+            the buffer-days rule where it is finite
+    
+    Returns:
+        dict of arrays with the same keys as calculate_reorder_point
+    """
+    forecast = np.asarray(forecast, dtype=float)
+    n = len(forecast)
+    lengths = _forecast_lengths(forecast, lengths)
+    current_stock = np.broadcast_to(np.asarray(current_stock, dtype=float), (n,))
+    safety_stock = np.broadcast_to(np.asarray(safety_stock, dtype=float), (n,))
+    lead_time = np.broadcast_to(np.asarray(lead_time, dtype=float), (n,))
+    moq = np.broadcast_to(np.asarray(moq, dtype=float), (n,))
+    
+    # Average daily consumption from the first 3 months (needs all 3)
+    has_forecast = lengths >= 3
+    if forecast.shape[1] >= 3:
+        total_3month_forecast = forecast[:, 0] + forecast[:, 1] + forecast[:, 2]
+    else:
+        total_3month_forecast = np.zeros(n)
+    avg_daily_consumption = np.where(has_forecast, total_3month_forecast / 90, 0.0)
+    
+    # 예측 기반 안전재고량
+    reorder_point = avg_daily_consumption * (lead_time + PROACTIVE_BUFFER_DAYS) * np.asarray(confidence_level, dtype=float)
+    if reorder_level is not None:
+        reorder_level = np.broadcast_to(np.asarray(reorder_level, dtype=float), (n,))
+        reorder_point = np.where(np.isfinite(reorder_level) & has_forecast, reorder_level, reorder_point)
+    
+    # 재고소진일
+    consuming = avg_daily_consumption > 0
+    safe_divisor = np.where(consuming, avg_daily_consumption, 1.0)
+    days_until_safety_stock = np.where(consuming, (current_stock - safety_stock) / safe_divisor, np.inf)
+    days_until_reorder = np.where(consuming, (current_stock - reorder_point) / safe_divisor, np.inf)
+    days_until_stockout = np.where(consuming, current_stock / safe_divisor, np.inf)
+    
+    # 상태
+    is_urgent = current_stock <= reorder_point
+    is_caution = ~is_urgent & (days_until_safety_stock <= 10)
+    is_prepare = ~is_urgent & ~is_caution & (days_until_safety_stock <= 20)
+    urgency = np.where(is_urgent, "긴급", np.where(is_caution, "주의", "정상")).astype(object)
+    
+    order_status = np.full(n, "", dtype=object)
+    order_status[is_urgent] = "즉시 발주 필요"
+    for mask, suffix in ((is_caution, "일 전 - 발주 필요"), (is_prepare, "일 전 - 발주 준비")):
+        if mask.any():
+            days = np.trunc(days_until_safety_stock[mask]).astype(np.int64).astype(str).astype(object)
+            order_status[mask] = "안전재고 도달 " + days + suffix
+    
+    # 권장발주량 (same arithmetic as the scalar version, including its MOQ rounding)
+    recommended_qty = reorder_point + (avg_daily_consumption * lead_time) - current_stock
+    recommended_qty = np.maximum(moq, recommended_qty)
+    round_up = (moq > 1) & (recommended_qty > moq)
+    safe_moq = np.where(round_up, moq, 1.0)
+    recommended_qty = np.where(round_up, ((recommended_qty + safe_moq - 1) // safe_moq) * safe_moq, recommended_qty)
+    
+    # Expected stockout date (timedelta rounds to whole microseconds, half to even)
+    now = now or datetime.now()
+    base = np.datetime64(now, 'us')
+    max_days = (np.datetime64('9999-12-31T23:59:59', 'us') - base) / np.timedelta64(1, 'D')
+    finite = np.isfinite(days_until_stockout) & (np.abs(days_until_stockout) < max_days)
+    offsets = np.round(np.where(finite, days_until_stockout, 0.0) * 86400 * 1e6).astype(np.int64)
+    dates = np.datetime_as_string(base + offsets.astype('timedelta64[us]'), unit='D').astype(object)
+    expected_stockout_date = np.where(finite, dates, 'N/A').astype(object)
+    
+    return {
+        'reorder_point': reorder_point,
+        'avg_daily_consumption': avg_daily_consumption,
+        'days_until_safety_stock': days_until_safety_stock,
+        'days_until_reorder': days_until_reorder,
+        'days_until_stockout': days_until_stockout,
+        'order_status': order_status,
+        'urgency': urgency,
+        'recommended_qty': recommended_qty,
+        'expected_stockout_date': expected_stockout_date
+    }
+
+def calculate_demand_trend_vectorized(forecast, lengths=None):
+    """
+    Array version of calculate_demand_trend
+    
+    Args:
+        forecast: Monthly predictions matrix (n, h), NaN-padded
+        lengths: Number of valid predictions per row (default: values before the first NaN)
+    
+    Returns:
+        Object array of trend indicators (n,)
+    """
+    forecast = np.asarray(forecast, dtype=float)
+    n, horizon = forecast.shape
+    lengths = _forecast_lengths(forecast, lengths)
+    
+    if horizon < 2:
+        return np.full(n, "데이터 부족", dtype=object)
+    
+    # Month-over-month changes where the previous month is positive
+    previous = forecast[:, :-1]
+    current = forecast[:, 1:]
+    in_range = np.arange(1, horizon)[None, :] < lengths[:, None]
+    valid = in_range & (np.nan_to_num(previous, nan=0.0) > 0)
+    safe_previous = np.where(valid, previous, 1.0)
+    changes = np.where(valid, ((current - safe_previous) / safe_previous) * 100, 0.0)
+    
+    count = valid.sum(axis=1)
+    avg_change = changes.sum(axis=1) / np.maximum(count, 1)
+    all_increasing = np.all(~valid | (changes > 0), axis=1)
+    all_decreasing = np.all(~valid | (changes < 0), axis=1)
+    
+    trend = np.select(
+        [
+            avg_change > 15, (avg_change > 10) & all_increasing,
+            avg_change > 7,
+            avg_change > 3,
+            avg_change < -15, (avg_change < -10) & all_decreasing,
+            avg_change < -7,
+            avg_change < -3,
+        ],
+        ["급상승 ⬆️", "급상승 ⬆️", "상승 📈", "소폭상승 ↗️", "급하락 ⬇️", "급하락 ⬇️", "하락 📉", "소폭하락 ↘️"],
+        default="안정 ➡️"
+    ).astype(object)
+    trend[count == 0] = "안정 ➡️"
+    trend[lengths < 2] = "데이터 부족"
+    return trend
+
+def get_order_priority_vectorized(urgency, current_stock, safety_stock, days_until_stockout):
+    """
+    Array version of get_order_priority
+    
+    Returns:
+        Integer array of priority scores (10 = highest priority)
+    """
+    urgency = np.asarray(urgency, dtype=object)
+    current_stock = np.asarray(current_stock, dtype=float)
+    safety_stock = np.asarray(safety_stock, dtype=float)
+    days_until_stockout = np.asarray(days_until_stockout, dtype=float)
+    
+    score = np.full(len(urgency), 5)
+    score += np.where(urgency == "긴급", 3, np.where(urgency == "주의", 1, 0))
+    score += np.where(current_stock < safety_stock * 0.5, 2, np.where(current_stock < safety_stock, 1, 0))
+    score += np.where(days_until_stockout < 7, 2, np.where(days_until_stockout < 14, 1, 0))
+    return np.clip(score, 1, 10)
+
+def _product_column(products_df, column, default):
+    """Column as an array, with `default` where the column or a value is missing"""
+    if column not in products_df.columns:
+        return np.full(len(products_df), default)
+    values = products_df[column]
+    if isinstance(default, str):
+        return values.where(values.notna(), default).to_numpy()
+    return pd.to_numeric(values, errors='coerce').fillna(default).to_numpy()
+
+def batch_calculate_reorder_points(products_df, predictions_dict, confidence_level=1.0, now=None,
+                                   service_level=None, safety_method='normal'):
     """
     Calculate reorder points for multiple products
     
+    Column-wise over a forecast matrix; gives the same results as calling
+    calculate_reorder_point, calculate_demand_trend and get_order_priority per product.
+    
+    With a service level, SKUs whose forecasts carry an error std get the reorder point
+    lead-time demand + safety stock for that service level (see
+    utils.calculations.calculate_safety_stock_vectorized) instead of the buffer-days rule,
+    and the result gains lead_time_demand / forecast_safety_stock columns.
+    
+    Args:
+        products_df: DataFrame with product information
+        predictions_dict: Dictionary of predictions by SKU
+        confidence_level: Safety multiplier
+        now: Reference time for expected_stockout_date (default: datetime.now())
+        service_level: Optional probability of no stockout during the lead time (e.g. 0.95)
+        safety_method: 'normal' or 'empirical' (quantile of holdout residuals)
+    
+    Returns:
+        DataFrame with reorder calculations
+    """
+    skus = _product_column(products_df, '마스터_sku', '')
+    current_stock = _product_column(products_df, '현재재고', 0)
+    safety_stock = _product_column(products_df, '안전재고', 0)
+    lead_time = _product_column(products_df, '리드타임', 7)
+    moq = _product_column(products_df, '최소주문수량', 1)
+    
+    forecast, lengths = build_forecast_matrix(skus, predictions_dict)
+    
+    reorder_level = None
+    if service_level is not None:
+        forecast_std = _stack_rows([extract_forecast_std(predictions_dict.get(sku)) for sku in skus], forecast.shape[1])
+        residuals = _stack_rows([(predictions_dict.get(sku) or {}).get('holdout_residuals') for sku in skus])
+        safety = calculate_safety_stock_vectorized(
+            forecast, forecast_std, lead_time, service_level, lengths, residuals, method=safety_method
+        )
+        reorder_level = safety['reorder_level']
+    
+    results = calculate_reorder_points_vectorized(
+        current_stock, safety_stock, lead_time, forecast, lengths, now=now,
+        confidence_level=confidence_level, reorder_level=reorder_level
+    )
+    
+    # Add product info
+    results['마스터_sku'] = skus
+    results['상품명'] = _product_column(products_df, '상품명', '')
+    results['현재재고'] = current_stock
+    results['안전재고'] = safety_stock
+    results['리드타임'] = lead_time
+    results['MOQ'] = moq
+    results['demand_trend'] = calculate_demand_trend_vectorized(forecast, lengths)
+    results['priority'] = get_order_priority_vectorized(
+        results['urgency'], current_stock, safety_stock, results['days_until_stockout']
+    )
+    
+    if service_level is not None:
+        results['lead_time_demand'] = safety['lead_time_demand']
+        results['forecast_safety_stock'] = safety['safety_stock']
+    
+    # Adjust recommended quantity to MOQ
+    safe_moq = np.where(moq > 1, moq, 1)
+    results['recommended_qty'] = np.where(
+        moq > 1,
+        ((results['recommended_qty'] + safe_moq - 1) // safe_moq) * safe_moq,
+        results['recommended_qty']
+    )
+    
+    return pd.DataFrame(results)
+
+def _stack_rows(rows, width=None):
+    """NaN-padded matrix of variable-length rows (None rows stay NaN)"""
+    width = width if width is not None else max((len(row) for row in rows if row is not None), default=0)
+    matrix = np.full((len(rows), width), np.nan)
+    for i, row in enumerate(rows):
+        if row is not None and len(row):
+            matrix[i, :min(len(row), width)] = np.asarray(row, dtype=float)[:width]
+    return matrix
+
+def _batch_calculate_reorder_points_reference(products_df, predictions_dict, confidence_level=1.0):
+    """
+    Row-by-row version of batch_calculate_reorder_points (parity reference, see __main__)
+    
     Args:
         products_df: DataFrame with product information
         predictions_dict: Dictionary of predictions by SKU
@@ -170,22 +483,7 @@ def batch_calculate_reorder_points(products_df, predictions_dict, confidence_lev
         sku = product.get('마스터_sku', '')
         
         # Get predictions for this SKU
-        if sku in predictions_dict:
-            pred_data = predictions_dict[sku]
-            
-            # Extract monthly predictions based on model structure
-            if 'arima' in pred_data and isinstance(pred_data['arima'], (list, np.ndarray)):
-                monthly_predictions = list(pred_data['arima'][:3])
-            elif 'forecast_months' in pred_data:
-                # Adaptive model structure
-                if 'adaptive_forecast' in pred_data:
-                    monthly_predictions = list(pred_data['adaptive_forecast'][:3])
-                else:
-                    monthly_predictions = list(pred_data.get('arima', [])[:3])
-            else:
-                monthly_predictions = []
-        else:
-            monthly_predictions = []
+        monthly_predictions = extract_monthly_predictions(predictions_dict.get(sku))
         
         # Calculate reorder point
         reorder_info = calculate_reorder_point(
@@ -219,3 +517,68 @@ def batch_calculate_reorder_points(products_df, predictions_dict, confidence_lev
         results.append(reorder_info)
     
     return pd.DataFrame(results)
+
+
+# Parity check and benchmark of the vectorized engine against the row-by-row version:
+#     python -m utils.order_timing [n_products]
+if __name__ == "__main__":
+    import time
+    
+    n_products = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rng = np.random.default_rng(42)
+    skus = [f"SKU{i:06d}" for i in range(n_products)]
+    products_df = pd.DataFrame({
+        '마스터_sku': skus,
+        '상품명': [f"상품 {i}" for i in range(n_products)],
+        '현재재고': rng.integers(0, 2000, n_products),
+        '안전재고': rng.integers(0, 300, n_products),
+        '리드타임': rng.integers(1, 60, n_products),
+        '최소주문수량': rng.choice([1, 1, 10, 50, 100], n_products),
+    })
+    
+    # Mix of model layouts, short and missing forecasts, zero and falling demand
+    predictions_dict = {}
+    for i, sku in enumerate(skus):
+        kind = i % 6
+        values = rng.integers(0, 1500, 4).astype(float)
+        if kind == 0:
+            predictions_dict[sku] = {'arima': values}
+        elif kind == 1:
+            predictions_dict[sku] = {'forecast_months': [], 'adaptive_forecast': list(values)}
+        elif kind == 2:
+            predictions_dict[sku] = {'arima': list(values[:rng.integers(0, 3)])}
+        elif kind == 3:
+            predictions_dict[sku] = {'arima': [0.0, values[1], 0.0, values[3]]}
+        elif kind == 4:
+            predictions_dict[sku] = {'predictions': list(values)}
+    
+    started = time.perf_counter()
+    expected = _batch_calculate_reorder_points_reference(products_df, predictions_dict)
+    reference_time = time.perf_counter() - started
+    
+    started = time.perf_counter()
+    actual = batch_calculate_reorder_points(products_df, predictions_dict)
+    vectorized_time = time.perf_counter() - started
+    
+    mismatches = {}
+    for column in expected.columns:
+        left, right = expected[column].to_numpy(), actual[column].to_numpy()
+        if column == 'expected_stockout_date':
+            # The reference reads the clock per row, so a date may roll over mid-run
+            left_dates = pd.to_datetime(pd.Series(left), errors='coerce')
+            right_dates = pd.to_datetime(pd.Series(right), errors='coerce')
+            same = ((left == right) | ((left_dates - right_dates).abs() <= pd.Timedelta(days=1))).to_numpy()
+        elif left.dtype.kind in 'fiu':
+            same = np.isclose(left.astype(float), right.astype(float), rtol=1e-12, atol=0, equal_nan=True)
+        else:
+            same = left.astype(str) == right.astype(str)
+        if not same.all():
+            mismatches[column] = int((~same).sum())
+    
+    print(f"Products: {n_products}")
+    print(f"Row-by-row: {reference_time:.3f}s, vectorized: {vectorized_time:.3f}s "
+          f"({reference_time / max(vectorized_time, 1e-9):.0f}x)")
+    print(f"Column order matches: {list(expected.columns) == list(actual.columns)}")
+    print(f"Mismatches: {mismatches or 'none'}")
+    if mismatches or list(expected.columns) != list(actual.columns):
+        sys.exit(1)
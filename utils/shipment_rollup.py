@@ -0,0 +1,36 @@
+"""
+Backfill / repair the daily shipment rollup (playauto_shipment_daily)
+
+The rollup is kept up to date by triggers on playauto_copy_shipment_receipt and is
+filled automatically when it is first created. Run this after loading receipts with
+the triggers disabled, or to repair a date range:
+
+    python -m utils.shipment_rollup                      # whole history
+    python -m utils.shipment_rollup --start 2025-01-01   # from a date
+    python -m utils.shipment_rollup --start 2025-01-01 --end 2025-03-31
+"""
+import argparse
+import time
+from datetime import datetime
+
+from config.database import db, ShipmentQueries
+
+
+def _parse_date(value: str):
+    return datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild the daily shipment rollup from the receipt ledger")
+    parser.add_argument('--start', type=_parse_date, help="First day to rebuild (YYYY-MM-DD)")
+    parser.add_argument('--end', type=_parse_date, help="Last day to rebuild (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    started = time.time()
+    rows = ShipmentQueries.rebuild_daily_rollup(args.start, args.end)
+    print(f"Rebuilt {rows} SKU-day rows in {time.time() - started:.1f}s")
+    db.close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+import io
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from typing import Dict, Any
+
+from config.database import db, ShipmentQueries
+
+# Columns of a stock movement frame
+MOVEMENT_COLUMNS = ['line_no', '마스터_SKU', '입출고_여부', '수량', '배수', '시점']
+REJECTION_COLUMNS = ['line_no', '마스터_SKU', '입출고_여부', '수량', '사유', '메시지']
+
+
+def build_movements_from_upload(df: pd.DataFrame, transaction_datetime: datetime = None) -> Dict[str, pd.DataFrame]:
+    """
+    Convert rows of the inventory upload template into stock movements
+
+    Each template row becomes up to two movements (입고 first, then 출고), in file order.
+
+    Args:
+        df: Uploaded template (마스터 SKU, 입고량, 출고량, 세트 유무, 배수)
+        transaction_datetime: Time recorded on every movement (None = DB current time)
+
+    Returns:
+        Dictionary with 'movements' and 'rejections' (rows that could not be parsed)
+    """
+    line_no = np.arange(len(df))
+    sku = df['마스터 SKU'].astype(str).to_numpy() if '마스터 SKU' in df.columns else np.full(len(df), '')
+
+    def numeric_column(name):
+        if name not in df.columns:
+            return pd.Series(0, index=df.index, dtype=float)
+        return pd.to_numeric(df[name], errors='coerce')
+
+    incoming = numeric_column('입고량')
+    outgoing = numeric_column('출고량')
+    multiple = numeric_column('배수').fillna(0)
+    is_set = df['세트 유무'].to_numpy() if '세트 유무' in df.columns else np.full(len(df), '단품')
+
+    # Apply multiple for 세트 products only
+    effective_multiple = np.where((is_set == '세트') & (multiple.to_numpy() > 0), multiple.to_numpy(), 1).astype(int)
+
+    invalid = (incoming.isna() | outgoing.isna()).to_numpy()
+    rejections = pd.DataFrame({
+        'line_no': line_no[invalid],
+        '마스터_SKU': sku[invalid],
+        '입출고_여부': '',
+        '수량': 0,
+        '사유': '형식 오류',
+        '메시지': [f"오류 발생 (SKU: {s}): 입고량/출고량이 숫자가 아닙니다." for s in sku[invalid]],
+    }, columns=REJECTION_COLUMNS)
+
+    valid = ~invalid
+    incoming = incoming.fillna(0).to_numpy().astype(int)
+    outgoing = outgoing.fillna(0).to_numpy().astype(int)
+
+    frames = []
+    for direction, quantity, multiples in (('입고', incoming, np.ones(len(df), dtype=int)),
+                                           ('출고', outgoing, effective_multiple)):
+        mask = valid & (quantity > 0)
+        frames.append(pd.DataFrame({
+            'line_no': line_no[mask],
+            '마스터_SKU': sku[mask],
+            '입출고_여부': direction,
+            '수량': quantity[mask],
+            '배수': multiples[mask],
+            '시점': transaction_datetime,
+        }, columns=MOVEMENT_COLUMNS))
+
+    movements = pd.concat(frames, ignore_index=True)
+    # Same order as processing the file row by row: 입고 before 출고 within a row
+    movements = movements.sort_values(['line_no', '입출고_여부'], kind='stable').reset_index(drop=True)
+
+    return {'movements': movements, 'rejections': rejections}
+
+
+def _find_rejections(movements: pd.DataFrame, opening_stock: Dict[str, int]) -> np.ndarray:
+    """
+    Decide which movements cannot be applied
+
+    Outgoing movements are checked against the running stock of their SKU in input order,
+    exactly as applying them one by one with process_inventory_out would.
+
+    Returns:
+        Array of reasons ('' = accepted)
+    """
+    n = len(movements)
+    reasons = np.full(n, '', dtype=object)
+    sku = movements['마스터_SKU'].to_numpy()
+    actual_qty = movements['실제수량'].to_numpy()
+    is_out = (movements['입출고_여부'] == '출고').to_numpy()
+
+    known = np.array([s in opening_stock for s in sku], dtype=bool)
+    reasons[~known] = '등록되지 않은 SKU'
+
+    # Running balance assuming every movement is accepted
+    signed = np.where(is_out, -actual_qty, actual_qty)
+    balance = pd.Series(signed).groupby(sku).cumsum().to_numpy()
+    opening = np.array([opening_stock.get(s, 0) for s in sku])
+
+    # Only SKUs that would dip below zero need the sequential check
+    short_skus = set(sku[known & ((opening + balance) < 0)])
+    for s in short_skus:
+        stock = opening_stock[s]
+        for i in np.flatnonzero(sku == s):
+            if not is_out[i]:
+                stock += actual_qty[i]
+            elif stock >= actual_qty[i]:
+                stock -= actual_qty[i]
+            else:
+                reasons[i] = '재고 부족'
+
+    return reasons
+
+
+def apply_stock_movements(movements: pd.DataFrame, worker_id: str) -> Dict[str, Any]:
+    """
+    Apply a whole batch of stock movements with a handful of set-based statements
+
+    The batch is staged with COPY into a temp table, stock rows are locked once, and all
+    stock updates and receipt inserts run as single UPDATE/INSERT statements in one
+    transaction. Movements that would take stock below zero (or reference an unknown SKU)
+    are skipped and returned as rejections.
+
+    Args:
+        movements: DataFrame with MOVEMENT_COLUMNS (see build_movements_from_upload)
+        worker_id: Member ID recorded on the receipts
+
+    Returns:
+        Dictionary with 'applied' (movement count), 'products_updated' and 'rejections' DataFrame
+    """
+    empty_rejections = pd.DataFrame(columns=REJECTION_COLUMNS)
+    if movements is None or movements.empty:
+        return {'applied': 0, 'products_updated': 0, 'rejections': empty_rejections}
+
+    staged = movements.reset_index(drop=True).copy()
+    staged['seq'] = np.arange(len(staged))
+    staged['배수'] = pd.to_numeric(staged['배수'], errors='coerce').fillna(1).astype(int)
+    staged['실제수량'] = np.where(staged['입출고_여부'] == '출고', staged['수량'] * staged['배수'], staged['수량']).astype(int)
+
+    buffer = io.StringIO()
+    staged[['seq', 'line_no', '마스터_SKU', '입출고_여부', '실제수량', '시점']].to_csv(
+        buffer, index=False, header=False, date_format='%Y-%m-%d %H:%M:%S.%f'
+    )
+    buffer.seek(0)
+
+    with db.transaction():
+        with db.get_cursor() as cursor:
+            cursor.execute("""
+            CREATE TEMP TABLE tmp_stock_movements (
+                seq INTEGER PRIMARY KEY,
+                line_no INTEGER,
+                마스터_sku TEXT,
+                입출고_여부 TEXT,
+                수량 INTEGER,
+                시점 TIMESTAMP
+            ) ON COMMIT DROP
+            """)
+            cursor.copy_expert(
+                "COPY tmp_stock_movements (seq, line_no, 마스터_sku, 입출고_여부, 수량, 시점) FROM STDIN WITH (FORMAT csv)",
+                buffer
+            )
+
+            # Lock the affected stock rows for the rest of the transaction
+            cursor.execute("""
+            SELECT pi.마스터_sku, pi.현재재고
+            FROM playauto_product_inventory pi
+            WHERE pi.마스터_sku IN (SELECT DISTINCT 마스터_sku FROM tmp_stock_movements)
+            ORDER BY pi.마스터_sku
+            FOR UPDATE
+            """)
+            opening_stock = {row['마스터_sku']: int(row['현재재고'] or 0) for row in cursor.fetchall()}
+
+            reasons = _find_rejections(staged, opening_stock)
+            rejected = reasons != ''
+            if rejected.any():
+                cursor.execute(
+                    "DELETE FROM tmp_stock_movements WHERE seq = ANY(%s)",
+                    (staged.loc[rejected, 'seq'].tolist(),)
+                )
+
+            cursor.execute("""
+            UPDATE playauto_product_inventory pi
+            SET 입고량 = pi.입고량 + m.in_qty,
+                출고량 = pi.출고량 + m.out_qty,
+                현재재고 = pi.현재재고 + m.in_qty - m.out_qty
+            FROM (
+                SELECT 마스터_sku,
+                       SUM(CASE WHEN 입출고_여부 = '입고' THEN 수량 ELSE 0 END) AS in_qty,
+                       SUM(CASE WHEN 입출고_여부 = '출고' THEN 수량 ELSE 0 END) AS out_qty
+                FROM tmp_stock_movements
+                GROUP BY 마스터_sku
+            ) m
+            WHERE pi.마스터_sku = m.마스터_sku
+            """)
+            products_updated = cursor.rowcount
+
+            # inv_code suffixes come from the sequence, one nextval per row in this statement
+            cursor.execute(f"""
+            INSERT INTO playauto_copy_shipment_receipt
+            (마스터_SKU, 입출고_여부, 수량, 시점, 작업자_id, inv_code)
+            SELECT m.마스터_sku, m.입출고_여부, m.수량, m.시점, %s,
+                   {ShipmentQueries.inv_code_sql('m.마스터_sku', 'm.입출고_여부', 'm.시점')}
+            FROM (
+                SELECT seq, 마스터_sku, 입출고_여부, 수량,
+                       COALESCE(시점, CURRENT_TIMESTAMP AT TIME ZONE 'Asia/Seoul') AS 시점
+                FROM tmp_stock_movements
+                ORDER BY seq
+            ) m
+            """, (worker_id,))
+            applied = cursor.rowcount
+
+    rejected_rows = staged[rejected]
+    messages = []
+    for (_, row), reason in zip(rejected_rows.iterrows(), reasons[rejected]):
+        if reason == '재고 부족' and row['배수'] > 1:
+            messages.append(f"재고 부족: {row['마스터_SKU']} - 세트 상품 출고량 {row['수량']} x 배수 {row['배수']} = {row['실제수량']}개가 현재 재고보다 많습니다.")
+        elif reason == '재고 부족':
+            messages.append(f"재고 부족: {row['마스터_SKU']} (요청 수량: {row['실제수량']})")
+        else:
+            messages.append(f"{reason}: {row['마스터_SKU']}")
+
+    rejections = pd.DataFrame({
+        'line_no': rejected_rows['line_no'].to_numpy(),
+        '마스터_SKU': rejected_rows['마스터_SKU'].to_numpy(),
+        '입출고_여부': rejected_rows['입출고_여부'].to_numpy(),
+        '수량': rejected_rows['실제수량'].to_numpy(),
+        '사유': reasons[rejected],
+        '메시지': messages,
+    }, columns=REJECTION_COLUMNS)
+
+    return {'applied': applied, 'products_updated': products_updated, 'rejections': rejections}